@@ -0,0 +1,360 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _child_pids():
+    """Laufende Kindprozesse dieses Prozesses laut /proc (leer, falls unbekannt)."""
+    pids = []
+    try:
+        tasks = os.listdir("/proc/self/task")
+    except OSError:
+        return pids
+    for task in tasks:
+        try:
+            with open(f"/proc/self/task/{task}/children", "r") as children:
+                pids.extend(children.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _subprocess_count():
+    # Gestartete ffmpeg/ffprobe-Aufrufe, gezählt von run_tool/popen_tool
+
+    return sum(METRICS.report()["subprocesses"].values())
+
+
+def _rss_bytes(pid="self"):
+    """Aktueller Arbeitsspeicher eines Prozesses laut /proc (0, falls unbekannt)."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StageMeter:
+    """
+    Misst Stufen eines Laufs: Laufzeit, CPU-Zeit (eigener Prozess und
+    beendete Kindprozesse), höchsten Arbeitsspeicher (eigener Prozess plus
+    laufende Kindprozesse, alle interval Sekunden abgetastet), Anzahl
+    gestarteter Prozesse und geschriebene Bytes im Arbeitsverzeichnis.
+    """
+
+    def __init__(self, work_dir, interval=0.02):
+        self.work_dir = work_dir
+        self.interval = interval
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name):
+        first_count = _subprocess_count()
+        bytes_before = _directory_bytes(self.work_dir)
+        peak = [_rss_bytes()]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                running = _child_pids()
+                peak[0] = max(peak[0], _rss_bytes() + sum(_rss_bytes(p) for p in running))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        times_before = os.times()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            times_after = os.times()
+            stop.set()
+            sampler.join()
+            spawned = _subprocess_count() - first_count
+            cpu = sum(
+                getattr(times_after, field) - getattr(times_before, field)
+                for field in ("user", "system", "children_user", "children_system")
+            )
+            self.results[name] = {
+                "wall_s": round(wall, 4),
+                "cpu_s": round(cpu, 4),
+                "peak_rss_mb": round(peak[0] / 2**20, 1),
+                "subprocesses": spawned,
+                "bytes_written": _directory_bytes(self.work_dir) - bytes_before,
+            }
+
+
+# Module, deren Importzeit gemessen wird: der Einstieg der Kommandozeile, was
+# ein Prozess im Pool lädt, und das Pipeline-Modul selbst
+IMPORT_MODULES = ["wordvideo", "ingest", "cut_youtube_to_word_video"]
+# Bibliotheken, die ein Lauf ohne Bildschirm nicht laden sollte
+HEAVY_MODULES = ["tkinter", "cv2", "PIL.ImageTk", "pytube", "moviepy", "google.cloud"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps([seconds, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def measure_import_times(modules=None, repeats=5):
+    """
+    Misst die Importzeit jedes Moduls in einem frischen Interpreter (bester
+    von repeats Versuchen, wie beim Start eines Worker-Prozesses) und welche
+    schweren Bibliotheken dabei geladen werden.
+    :return: Dict "import_<modul>" -> {"wall_s", "heavy_modules"}.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in modules or IMPORT_MODULES:
+        probe = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+        best = None
+        heavy = []
+        for _ in range(repeats):
+            output = subprocess.run(
+                [sys.executable, "-c", probe],
+                cwd=package_dir,
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            ).stdout
+            seconds, heavy = json.loads(output.strip().splitlines()[-1])
+            best = seconds if best is None else min(best, seconds)
+        results[f"import_{module}"] = {
+            "wall_s": round(best, 4),
+            "heavy_modules": heavy,
+        }
+    return results
+
+
+def make_synthetic_source(
+    path, duration=60.0, width=1280, height=720, fps=30, word_length=0.35, gap=0.15
+):
+    """
+    Erzeugt ein Testvideo ohne Netzwerk: ffmpeg-Testbild und ein Ton aus
+    Tonstößen von word_length Sekunden mit Pausen von gap Sekunden und etwas
+    Rauschen, damit Segmentierung und Grenzverfeinerung Pausen finden.
+    """
+    from instrumentation import run_tool
+
+    period = word_length + gap
+    audio = (
+        f"aevalsrc=0.5*sin(2*PI*(180+40*mod(floor(t/{period})\\,8))*t)"
+        f"*lt(mod(t\\,{period})\\,{word_length})+0.01*(random(0)-0.5)"
+        f":s=44100:d={duration}"
+    )
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f",
+        "lavfi",
+        "-i",
+        audio,
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        "aac",
+        "-shortest",
+        path,
+    ]
+    run_tool(command, check=True)
+    return path
+
+
+def run_benchmark(
+    work_dir, duration=60.0, width=1280, height=720, fps=30, sentence_length=5
+):
+    """
+    Führt alle Stufen einmal auf einer synthetischen Quelle aus und misst sie.
+    Läuft im Arbeitsverzeichnis work_dir, da die Stufen relative Pfade
+    (clips/, downloads/, word_videos.db) verwenden.
+    :return: Dict Stufe -> Messwerte.
+    """
+    import cut_youtube_to_word_video as pipeline
+    from create_video import create_video_from_sentence
+    from instrumentation import METRICS
+    from occurrence_store import plan_cuts, record_occurrences
+    from recognizers import FakeRecognizer
+    from segmentation import decode_audio_pcm, segment_audio
+    from transcription import transcribe_segments
+    from verification import verify_clips_batched
+    from word_index import VocabularyIndex
+
+    previous_dir = os.getcwd()
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    meter = StageMeter(".")
+    try:
+        os.makedirs("downloads", exist_ok=True)
+        with meter.stage("source"):
+            video_path = make_synthetic_source(
+                os.path.join("downloads", "synthetic.mp4"), duration, width, height, fps
+            )
+        pipeline.initialize_db()
+        recognizer = FakeRecognizer()
+
+        with meter.stage("extract"):
+            audio_path = pipeline.convert_audio_to_mono(video_path)
+        with meter.stage("split"):
+            pipeline.split_audio_mono_ffmpeg(audio_path)
+        with meter.stage("recognize"):
+            samples = decode_audio_pcm(video_path, 16000)
+            segment_ids = []
+            for segment, segment_words, _ in transcribe_segments(
+                segment_audio(None, overlap=0.5, samples=samples), recognizer
+            ):
+                record_occurrences(video_path, segment.index, segment_words)
+                segment_ids.append(segment.index)
+        with meter.stage("cut"):
+            clips = []
+            for segment_id in segment_ids:
+                clips.extend(
+                    pipeline.cut_video_by_words(
+                        video_path, plan_cuts(video_path, segment_id)
+                    )
+                )
+        with meter.stage("verify"):
+            verify_clips_batched(clips, samples, 16000, recognizer)
+        with meter.stage("render"):
+            index = VocabularyIndex.load()
+            sentence = " ".join(index.words()[:sentence_length])
+            create_video_from_sentence(sentence, index)
+    finally:
+        os.chdir(previous_dir)
+
+    meter.results["total"] = {
+        "peak_rss_mb": round(
+            max(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            )
+            / 1024,
+            1,
+        ),
+        "wall_s": round(sum(r["wall_s"] for r in meter.results.values()), 4),
+    }
+    return meter.results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2, min_delta=0.05):
+    """
+    Vergleicht Laufzeit, CPU-Zeit und Speicher jeder Stufe mit der Basislinie.
+    Eine Regression liegt vor, wenn ein Wert um mehr als tolerance (relativ)
+    und min_delta (absolut, in Sekunden bzw. MB) darüber liegt. Beim Import
+    zählt außerdem jede neu geladene schwere Bibliothek als Regression.
+    :return: Liste von (Stufe, Messwert, Basiswert, neuer Wert).
+    """
+    regressions = []
+    for stage, measured in results.items():
+        reference = baseline.get(stage, {})
+        for metric in ("wall_s", "cpu_s", "peak_rss_mb"):
+            if metric not in measured or metric not in reference:
+                continue
+            before, after = reference[metric], measured[metric]
+            if after > before * (1 + tolerance) and after - before > min_delta:
+                regressions.append((stage, metric, before, after))
+        added = sorted(
+            set(measured.get("heavy_modules", ())) - set(reference.get("heavy_modules", ()))
+        )
+        if reference and added:
+            regressions.append(
+                (stage, "heavy_modules", reference.get("heavy_modules", []), added)
+            )
+    return regressions
+
+
+def print_report(results):
+    columns = ("wall_s", "cpu_s", "peak_rss_mb", "subprocesses", "bytes_written")
+    width = max([10] + [len(stage) + 2 for stage in results])
+    print(f"{'Stufe':<{width}}" + "".join(f"{c:>16}" for c in columns))
+    for stage, measured in results.items():
+        print(
+            f"{stage:<{width}}"
+            + "".join(f"{str(measured.get(c, '')):>16}" for c in columns)
+        )
+    for stage, measured in results.items():
+        if measured.get("heavy_modules"):
+            print(f"{stage} lädt: {', '.join(measured['heavy_modules'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline-Benchmark aller Stufen mit synthetischer Quelle"
+    )
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--work-dir", default=None, help="Standard: temporäres Verzeichnis")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Ergebnis als neue Basislinie speichern"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--report", default=None, help="Ergebnis zusätzlich als JSON")
+    parser.add_argument(
+        "--imports-only",
+        action="store_true",
+        help="Nur die Importzeiten messen (ohne ffmpeg)",
+    )
+    args = parser.parse_args()
+
+    results = measure_import_times()
+    if not args.imports_only:
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            results.update(
+                run_benchmark(work_dir, args.duration, args.width, args.height, args.fps)
+            )
+        finally:
+            if args.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Basislinie gespeichert: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        for stage, metric, before, after in regressions:
+            print(f"Regression in '{stage}': {metric} {before} -> {after}")
+        if regressions:
+            raise SystemExit(1)
+        print("Keine Regressionen gegenüber der Basislinie.")
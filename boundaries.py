@@ -0,0 +1,91 @@
+import numpy as np
+
+
+def frame_features(samples, sample_rate, window=0.01):
+    """
+    Berechnet in einem vektorisierten Durchlauf pro Fenster von window
+    Sekunden die RMS-Energie und die Nulldurchgangsrate (Anteil der
+    Vorzeichenwechsel zwischen benachbarten Samples).
+    :return: (energy, zcr) als float32-Arrays mit einem Wert pro Fenster.
+    """
+    frame = max(2, int(sample_rate * window))
+    num_frames = len(samples) // frame
+    if num_frames == 0:
+        empty = np.zeros(0, dtype=np.float32)
+        return empty, empty
+    frames = np.asarray(samples[: num_frames * frame], dtype=np.float32).reshape(
+        num_frames, frame
+    )
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1).astype(np.float32)
+    return energy, zcr
+
+
+class BoundaryRefiner:
+    """
+    Verschiebt die Wortgrenzen des Erkenners auf die nächstgelegene Pause.
+    Die Hüllkurven werden einmal pro Quelle (oder Segment) berechnet; als
+    Pause gilt ein lokales Minimum, das nah am Grundpegel liegt. Zischlaute
+    haben wenig Energie, aber viele Nulldurchgänge, und werden über die
+    Nulldurchgangsrate nicht als Pause gewertet, damit Konsonanten am Rand
+    erhalten bleiben.
+    :param offset: Zeitpunkt in der Quelle (Sekunden), an dem samples beginnt.
+    :param level: Anteil zwischen Grundpegel und Spitzenpegel, unter dem ein
+        Minimum als Pause zählt.
+    """
+
+    def __init__(self, samples, sample_rate, offset=0.0, window=0.01, level=0.2):
+        self.offset = offset
+        self.window = window
+        energy, zcr = frame_features(samples, sample_rate, window)
+        # Energie mit viel Rauschanteil (Zischlaute) wird aufgewertet
+        score = energy * (1.0 + 2.0 * zcr)
+        self.valleys = np.zeros(len(score), dtype=bool)
+        if len(score) >= 3:
+            floor = float(np.percentile(score, 10))
+            peak = float(np.percentile(score, 95))
+            threshold = floor + level * (peak - floor)
+            inner = score[1:-1]
+            self.valleys[1:-1] = (
+                (inner <= score[:-2]) & (inner <= score[2:]) & (inner <= threshold)
+            )
+
+    def _snap(self, times, tolerance):
+        times = np.asarray(times, dtype=np.float64)
+        if not len(self.valleys) or not len(times):
+            return times
+        reach = max(1, int(round(tolerance / self.window)))
+        steps = np.arange(-reach, reach + 1)
+        frames = np.round((times - self.offset) / self.window - 0.5).astype(np.int64)
+        candidates = frames[:, None] + steps[None, :]
+        inside = (candidates >= 0) & (candidates < len(self.valleys))
+        is_valley = inside & self.valleys[np.clip(candidates, 0, len(self.valleys) - 1)]
+        # Die Pause mit dem kleinsten Abstand zur ursprünglichen Grenze
+        distance = np.where(is_valley, np.abs(steps)[None, :], reach + 1)
+        best = np.argmin(distance, axis=1)
+        snapped = (candidates[np.arange(len(times)), best] + 0.5) * self.window
+        return np.where(is_valley.any(axis=1), snapped + self.offset, times)
+
+    def refine(self, words, tolerance=0.1, min_duration=0.08):
+        """
+        Verfeinert die Grenzen vieler Wörter auf einmal.
+        :param words: Liste von (word, start_time, end_time) mit absoluten Zeiten.
+        :param tolerance: Maximale Verschiebung einer Grenze in Sekunden.
+        :return: Liste von (word, start_time, end_time, raw_start, raw_end) mit
+            den verfeinerten Zeiten vorne und den ursprünglichen dahinter.
+            Würde ein Wort kürzer als min_duration, bleibt es unverändert.
+        """
+        if not words:
+            return []
+        raw_start = np.array([w[1] for w in words], dtype=np.float64)
+        raw_end = np.array([w[2] for w in words], dtype=np.float64)
+        start = self._snap(raw_start, tolerance)
+        end = self._snap(raw_end, tolerance)
+        keep = end - start >= min_duration
+        start = np.round(np.where(keep, start, raw_start), 3)
+        end = np.round(np.where(keep, end, raw_end), 3)
+        return [
+            (w[0], float(s), float(e), w[1], w[2])
+            for w, s, e in zip(words, start, end)
+        ]
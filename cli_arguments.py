@@ -0,0 +1,43 @@
+"""
+Argumente der Kommandozeilen (wordvideo.py, ingest.py). Das Modul lädt nur
+die Standardbibliothek, damit das Aufbauen des Parsers keinen Unterbefehl
+verlangsamt; die Backend-Namen stehen deshalb hier und nicht als Import aus
+recognizers.py (ein Test hält beide Listen gleich).
+"""
+
+# Schlüssel von recognizers.BACKENDS
+BACKEND_NAMES = ["google", "whisper", "vosk", "fake"]
+
+
+def add_backend_arguments(parser, cache=True):
+    """Wahl des Erkennungs-Backends und seines Modells."""
+    parser.add_argument("--backend", choices=BACKEND_NAMES, default="google")
+    parser.add_argument(
+        "--model", default=None, help="Modell für whisper (Größe) oder vosk (Pfad)"
+    )
+    if cache:
+        parser.add_argument(
+            "--no-cache", action="store_true", help="Transkript-Cache nicht verwenden"
+        )
+
+
+def add_ingest_arguments(parser):
+    """Argumente des Stapellaufs (ingest.py und Unterbefehl ingest in wordvideo.py)."""
+    parser.add_argument("locations", help="Datei mit einer URL (oder einem Pfad) pro Zeile")
+    parser.add_argument("--local", action="store_true", help="Lokale Dateien statt YouTube")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    parser.add_argument("--video-workers", type=int, default=2)
+    parser.add_argument("--recognition-in-flight", type=int, default=None)
+    add_backend_arguments(parser, cache=False)
+    parser.add_argument("--verification", choices=["local", "batched"], default="local")
+
+
+def backend_options_from_args(args):
+    """Konstruktorargumente des gewählten Backends aus --model."""
+    backend_options = {}
+    if args.model and args.backend == "whisper":
+        backend_options["model_size"] = args.model
+    elif args.backend == "vosk":
+        backend_options["model_path"] = args.model or "vosk-model-de-0.21"
+    return backend_options
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import re
+
+from storage import get_repository
+
+
+# Wurzel der Clipablage. Clips liegen nicht mehr in einem Ordner pro Wort,
+# sondern in SHARD_LEVELS Ebenen mit je 16**SHARD_WIDTH Unterordnern, die
+# sich aus dem Hash des Dateinamens ergeben: Auch häufige Wörter wie "und"
+# verteilen sich so gleichmäßig, und kein Verzeichnis wird groß.
+CLIP_ROOT = "clips"
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+# Frühere Ablage Wörter/<word>/<file_name> mit den Prüfordnern
+LEGACY_ROOT = "Wörter"
+_LEGACY_STATUS_FOLDERS = {"geprüft": 1, "fehlerhaft": 0}
+_LEGACY_NAME = re.compile(r"^(?P<hash>[0-9a-f]{12})_(?P<start>\d+)_(?P<end>\d+)\.mp4$")
+
+
+def clip_key(word, source_hash, start_time, end_time):
+    """
+    Deterministischer Schlüssel eines Schnitts aus Wort, Quelle und
+    Zeitbereich (in Millisekunden): derselbe Schnitt erhält bei jedem Lauf
+    denselben Namen, unabhängig davon, welche Clips es schon gibt.
+    """
+    identity = (
+        f"{word}\0{source_hash[:12]}\0"
+        f"{int(round(start_time * 1000))}\0{int(round(end_time * 1000))}"
+    )
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+
+def clip_file_name(word, source_hash, start_time, end_time):
+    return clip_key(word, source_hash, start_time, end_time) + ".mp4"
+
+
+def shard_dir(file_name, root=CLIP_ROOT):
+    """Unterordner eines Clips; hängt nur vom Dateinamen ab."""
+    digest = hashlib.sha256(file_name.encode("utf-8")).hexdigest()
+    parts = [
+        digest[level * SHARD_WIDTH : (level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_LEVELS)
+    ]
+    return os.path.join(root, *parts)
+
+
+def clip_path(file_name, root=CLIP_ROOT):
+    return os.path.join(shard_dir(file_name, root), file_name)
+
+
+def prepare_clip_path(file_name, root=CLIP_ROOT):
+    """Wie clip_path, legt aber den Unterordner an."""
+    directory = shard_dir(file_name, root)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, file_name)
+
+
+def partial_path(path):
+    """
+    Temporäre Datei neben dem Ziel, die erst fertig umbenannt wird; ein
+    abgebrochener Lauf hinterlässt so keine halben Clips.
+    """
+    return path[: -len(".mp4")] + ".part.mp4"
+
+
+def manifest(word, db_path="word_videos.db", root=CLIP_ROOT):
+    """
+    Alle Clips eines Wortes laut Tabelle videos.
+    :return: Liste von (id, file_name, path, verified) mit verified None
+        (ungeprüft), 1 (bestätigt) oder 0 (fehlerhaft).
+    """
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            "SELECT id, file_name, verified FROM videos WHERE word = ? ORDER BY id",
+            (word,),
+        )
+        .fetchall()
+    )
+    return [
+        (clip_id, file_name, clip_path(file_name, root), verified)
+        for clip_id, file_name, verified in rows
+    ]
+
+
+def faulty_clip_names(file_names, db_path="word_videos.db"):
+    """
+    Die Dateinamen unter file_names, deren Clip als fehlerhaft geprüft ist
+    (verified = 0). Die Zeile bleibt nach dem Löschen der Datei erhalten,
+    damit ein erneuter Lauf denselben Schnitt nicht wieder anlegt.
+    """
+    file_names = list(file_names)
+    if not file_names:
+        return set()
+    placeholders = ", ".join("?" * len(file_names))
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            f"SELECT file_name FROM videos WHERE verified = 0 "
+            f"AND file_name IN ({placeholders})",
+            file_names,
+        )
+        .fetchall()
+    )
+    return {row[0] for row in rows}
+
+
+def mark_verified(results, db_path="word_videos.db"):
+    """
+    Speichert das Prüfergebnis vieler Clips als Metadaten.
+    :param results: Liste von (clip, bestätigt) wie von verify_clips_batched
+        bzw. verify_clips_locally, clip = (word, file_name, path, start, end).
+        Clips mit bestätigt None (Prüfung fehlgeschlagen) bleiben ungeprüft.
+    """
+    get_repository(db_path).set_verified(
+        [
+            (clip[0], clip[1], int(verified))
+            for clip, verified in results
+            if verified is not None
+        ]
+    )
+
+
+def _legacy_files(legacy_root):
+    # (word, Pfad, verified) aller Clips der alten Ablage
+    for entry in sorted(os.listdir(legacy_root)):
+        folder = os.path.join(legacy_root, entry)
+        if not os.path.isdir(folder):
+            continue
+        if entry in _LEGACY_STATUS_FOLDERS:
+            for word in sorted(os.listdir(folder)):
+                word_folder = os.path.join(folder, word)
+                if os.path.isdir(word_folder):
+                    for name in sorted(os.listdir(word_folder)):
+                        path = os.path.join(word_folder, name)
+                        yield word, path, _LEGACY_STATUS_FOLDERS[entry]
+        else:
+            for name in sorted(os.listdir(folder)):
+                yield entry, os.path.join(folder, name), None
+
+
+def migrate_legacy_clips(
+    legacy_root=LEGACY_ROOT,
+    db_path="word_videos.db",
+    root=CLIP_ROOT,
+    snapshot_path="word_index.json",
+):
+    """
+    Verschiebt die Clips der alten Ablage (Wörter/<word>/, geprüft/,
+    fehlerhaft/) in die Ablage mit Unterordnern. Deterministisch benannte
+    Clips (<word>_<hash>_<start>_<end>.mp4) erhalten ihren neuen Namen aus
+    clip_key, ältere Namen bleiben erhalten. Der Prüfordner wird zu
+    videos.verified. Dateien ohne Eintrag in videos bleiben liegen.
+    Der Schnappschuss des Wortverzeichnisses wird verworfen, da sich
+    Dateinamen ändern.
+    :return: Dict mit moved, unknown und skipped.
+    """
+    counts = {"moved": 0, "unknown": 0, "skipped": 0}
+    if not os.path.isdir(legacy_root):
+        return counts
+    repository = get_repository(db_path)
+    for word, path, verified in _legacy_files(legacy_root):
+        file_name = os.path.basename(path)
+        if not file_name.endswith(".mp4") or file_name.endswith(".part.mp4"):
+            continue
+        row = (
+            repository.connection()
+            .execute(
+                "SELECT id FROM videos WHERE word = ? AND file_name = ?", (word, file_name)
+            )
+            .fetchone()
+        )
+        if row is None:
+            counts["unknown"] += 1
+            continue
+
+        new_name = file_name
+        prefix = word + "_"
+        match = None
+        if file_name.startswith(prefix):
+            match = _LEGACY_NAME.match(file_name[len(prefix) :])
+        if match:
+            new_name = clip_file_name(
+                word,
+                match.group("hash"),
+                int(match.group("start")) / 1000,
+                int(match.group("end")) / 1000,
+            )
+        target = prepare_clip_path(new_name, root)
+        if os.path.exists(target):
+            counts["skipped"] += 1
+            continue
+        # Datei und Eintrag gemeinsam: schlägt das Verschieben fehl, bleibt
+        # auch der Eintrag unverändert
+        with repository.transaction() as conn:
+            conn.execute(
+                """
+                UPDATE videos SET file_name = ?, size_bytes = ?,
+                    verified = COALESCE(?, verified)
+                WHERE id = ?
+            """,
+                (new_name, os.path.getsize(path), verified, row[0]),
+            )
+            os.replace(path, target)
+        counts["moved"] += 1
+
+    if counts["moved"] and snapshot_path and os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+    return counts
@@ -1,17 +1,22 @@
 import os
-import moviepy.editor as mp
+import json
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from clip_store import CLIP_ROOT, clip_path
+from instrumentation import run_tool
+from storage import get_repository
+from word_index import VocabularyIndex
+from normalization import NormalizedClipCache
+from render_cache import RenderCache
 
-def list_available_words():
-    input_dir = "Wörter"  # Pfad zum Hauptordner
+def list_available_words(index=None):
+    if index is None:
+        index = VocabularyIndex.load()
 
-    # Überprüfen, ob es verfügbare Wörter (Unterordner) mit Videodateien gibt
-    available_words = []
-    for folder in os.listdir(input_dir):
-        folder_path = os.path.join(input_dir, folder)
-        if os.path.isdir(folder_path):
-            video_files = [f for f in os.listdir(folder_path) if f.endswith('.mp4')]
-            if video_files:
-                available_words.append(folder)
+    # Überprüfen, ob es verfügbare Wörter mit Videodateien gibt
+    available_words = index.words()
 
     if available_words:
         print("Verfügbare Wörter mit Videodateien:")
@@ -20,39 +25,295 @@ def list_available_words():
     else:
         print("Es wurden keine verfügbaren Wörter mit Videodateien gefunden.")
 
-def create_video_from_sentence(sentence):
-    input_dir = "Wörter"  # Pfad zum Hauptordner
-    output_dir = "output"  # Ausgabeordner
+def probe_clip(video_path, db_path="word_videos.db"):
+    """
+    Ermittelt die für eine verlustfreie Verkettung relevanten Parameter eines
+    Clips (Codec, Auflösung, Bildrate, Zeitbasis, Tonformat). Das Ergebnis wird
+    pro Datei (Pfad, Änderungszeit, Größe) in der Tabelle clip_params gespeichert.
+    """
+    stat = os.stat(video_path)
+    repository = get_repository(db_path)
+    row = repository.connection().execute(
+        "SELECT params FROM clip_params WHERE path = ? AND mtime = ? AND size = ?",
+        (video_path, stat.st_mtime, stat.st_size),
+    ).fetchone()
+    if row is not None:
+        return tuple(json.loads(row[0]))
+
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,profile,width,height,r_frame_rate,time_base,pix_fmt,sample_rate,channels",
+        "-of",
+        "json",
+        video_path,
+    ]
+    result = run_tool(command, stdout=subprocess.PIPE, text=True, check=True)
+    streams = json.loads(result.stdout).get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    params = (
+        video.get("codec_name"),
+        video.get("profile"),
+        video.get("width"),
+        video.get("height"),
+        video.get("r_frame_rate"),
+        video.get("time_base"),
+        video.get("pix_fmt"),
+        audio.get("codec_name"),
+        audio.get("sample_rate"),
+        audio.get("channels"),
+    )
+
+    with repository.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO clip_params (path, mtime, size, params) VALUES (?, ?, ?, ?)",
+            (video_path, stat.st_mtime, stat.st_size, json.dumps(params)),
+        )
+    return params
+
+def concat_stream_copy(video_paths, output_path):
+    """Verkettet Clips mit identischen Parametern per concat-Demuxer ohne Neukodierung."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for video_path in video_paths:
+            escaped_path = os.path.abspath(video_path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+    try:
+        command = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_file.name,
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            output_path,
+        ]
+        run_tool(command, check=True)
+    finally:
+        os.remove(list_file.name)
+
+def conform_clip(video_path, params, output_path):
+    """
+    Kodiert einen abweichenden Clip in einem ffmpeg-Filtergraph auf die
+    Parameter params um (Skalierung mit Rand, Bildrate, Pixelformat, Ton).
+    Clips ohne Ton erhalten eine stille Tonspur.
+    """
+    _, _, width, height, frame_rate, time_base, pix_fmt, _, sample_rate, channels = params
+    has_audio = probe_clip(video_path)[7] is not None
+    command = ["ffmpeg", "-v", "error", "-y", "-i", video_path]
+    if not has_audio:
+        command += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=r={sample_rate}:cl={'mono' if channels == 1 else 'stereo'}",
+            "-shortest",
+        ]
+    command += [
+        "-vf",
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate},format={pix_fmt}",
+        "-af",
+        f"aresample={sample_rate}",
+        "-ac",
+        str(channels),
+        "-c:v",
+        "libx264",
+        "-c:a",
+        "aac",
+        "-video_track_timescale",
+        time_base.split("/")[1],
+        output_path,
+    ]
+    run_tool(command, check=True)
+
+def concat_reencode(video_paths, output_path, fps=24):
+    """Verkettet beliebige Clips in einem einzigen ffmpeg-Filtergraph mit Neukodierung."""
+    params = [probe_clip(video_path) for video_path in video_paths]
+    width, height = params[0][2], params[0][3]
+    command = ["ffmpeg", "-v", "error", "-y"]
+    filters = []
+    for i, video_path in enumerate(video_paths):
+        command += ["-i", video_path]
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+        )
+        if params[i][7] is not None:
+            filters.append(f"[{i}:a]aresample=44100,aformat=channel_layouts=stereo[a{i}]")
+        else:
+            filters.append(
+                f"anullsrc=r=44100:cl=stereo,atrim=duration={probe_duration(video_path)}[a{i}]"
+            )
+    inputs = "".join(f"[v{i}][a{i}]" for i in range(len(video_paths)))
+    filters.append(f"{inputs}concat=n={len(video_paths)}:v=1:a=1[v][a]")
+    command += [
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        "-c:v",
+        "libx264",
+        "-c:a",
+        "aac",
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+    run_tool(command, check=True)
+
+def probe_duration(video_path):
+    result = run_tool(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            video_path,
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return float(result.stdout.strip())
+
+def render_clips(video_paths, output_path):
+    """
+    Rendert die Clips hintereinander in eine Datei.
+    Stimmen alle Parameter überein, wird nur per Stream-Copy verkettet. Sonst
+    werden nur die abweichenden Clips auf die häufigsten Parameter umkodiert
+    und danach ebenfalls per Stream-Copy verkettet. Ist das nicht möglich
+    (kein H.264/AAC als Ziel), wird alles in einem Filtergraph neu kodiert.
+    """
+    params = [probe_clip(video_path) for video_path in video_paths]
+    target, _ = Counter(params).most_common(1)[0]
+    if all(p == target for p in params):
+        concat_stream_copy(video_paths, output_path)
+        return
+
+    if target[0] != "h264" or target[7] != "aac":
+        concat_reencode(video_paths, output_path)
+        return
 
-    # Tokenisieren Sie den Satz in Wörter
-    words = sentence.split()
+    work_dir = tempfile.mkdtemp(prefix="render_")
+    try:
+        conformed = []
+        for i, (video_path, clip_params) in enumerate(zip(video_paths, params)):
+            if clip_params == target:
+                conformed.append(video_path)
+                continue
+            conformed_path = os.path.join(work_dir, f"clip_{i}.mp4")
+            conform_clip(video_path, target, conformed_path)
+            conformed.append(conformed_path)
+        concat_stream_copy(conformed, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-    videos = []
+def select_clips(sentence, index, clip_root=CLIP_ROOT, cut_missing=True):
+    """
+    Wählt für jedes Wort des Satzes den besten Clip.
+    :param cut_missing: Für Wörter ohne Clip, aber mit erkannten Vorkommen,
+        die besten Vorkommen jetzt schneiden (cut_candidates).
+    :return: (Liste von (word, clip_id, path), Dict unbekanntes Wort -> Vorschläge).
+    """
+    # Tokenisieren Sie den Satz in Wörter (die Erkennung speichert Kleinbuchstaben)
+    words = sentence.lower().split()
+
+    clips = []
+    missing = {}
+    store = None
     for word in words:
-        word_folder = os.path.join(input_dir, word)
-        video_files = [f for f in os.listdir(word_folder) if f.endswith('.mp4')]
-        video_files.sort()
+        candidates = index.lookup_clips(word)
+        if not candidates and cut_missing:
+            if store is None:
+                from occurrence_store import OccurrenceStore
 
-        if video_files:
-            # Nehmen Sie das erste Video im Ordner
-            video_path = os.path.join(word_folder, video_files[0])
-            videos.append(mp.VideoFileClip(video_path))
+                store = OccurrenceStore.load(index.db_path)
+            if store.count(word):
+                candidates = _cut_on_demand(word, store, index)
 
-    if videos:
-        # Erstellen Sie ein Video aus den ausgewählten Videodateien
-        combined_video = mp.concatenate_videoclips(videos, method="compose")
+        if candidates:
+            # Nehmen Sie das beste Video des Wortes
+            clip_id, file_name = candidates[0]
+            clips.append((word, clip_id, clip_path(file_name, clip_root)))
+        else:
+            missing[word] = index.suggest(word) or index.complete(word, limit=5)
+    return clips, missing
+
+def _cut_on_demand(word, store, index):
+    # Schneidet die besten noch ungeschnittenen Vorkommen eines Wortes und
+    # übernimmt die neuen Clips in den Index
+    from cut_youtube_to_word_video import cut_candidates
+    from occurrence_store import CLIPS_PER_WORD
+
+    print(f"Schneide Clips für '{word}' aus den erkannten Vorkommen...")
+    try:
+        cut_candidates(word, store, n=CLIPS_PER_WORD, db_path=index.db_path)
+    except Exception as e:
+        print(f"Fehler beim Schneiden der Clips für '{word}': {e}")
+        return []
+    index.refresh()
+    return index.lookup_clips(word)
 
-        # Speichern Sie das erstellte Video im Ausgabeordner
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        output_path = os.path.join(output_dir, "output_video.mp4")
-        combined_video.write_videofile(output_path, codec="libx264", fps=24)
+def create_video_from_sentence(
+    sentence, index=None, normalized_cache=None, output_path=None, render_cache=None
+):
+    """
+    :param normalized_cache: Optionaler NormalizedClipCache; dann werden die
+        normalisierten Varianten verwendet und nur noch verkettet.
+    :param output_path: Zieldatei, standardmäßig output/output_video.mp4.
+    :param render_cache: Optionaler RenderCache für bereits gerenderte (Teil-)Sätze.
+    :return: Pfad des erstellten Videos oder None.
+    """
+    output_dir = "output"  # Ausgabeordner
+    if index is None:
+        index = VocabularyIndex.load()
+
+    clips, missing = select_clips(sentence, index)
+    for word, suggestions in missing.items():
+        if suggestions:
+            print(f"Kein Video für '{word}'. Meinten Sie: {', '.join(suggestions)}?")
+        else:
+            print(f"Kein Video für '{word}' gefunden.")
+
+    if clips:
+        # Erstellen Sie ein Video aus den ausgewählten Videodateien
+        if output_path is None:
+            output_path = os.path.join(output_dir, "output_video.mp4")
+        if os.path.dirname(output_path) and not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        if render_cache is not None:
+            render_cache.render(clips, output_path, normalized_cache)
+        else:
+            videos = [video_path for _, _, video_path in clips]
+            if normalized_cache is not None:
+                videos = [normalized_cache.get(video_path) for video_path in videos]
+            render_clips(videos, output_path)
 
         print(f"Video basierend auf dem Satz erstellt und im Ausgabeordner gespeichert: {output_path}")
+        return output_path
     else:
         print("Für einige Wörter im Satz wurden keine Videos gefunden.")
+        return None
 
 if __name__ == "__main__":
-    list_available_words()  # Liste der verfügbaren Wörter mit Videodateien anzeigen
+    index = VocabularyIndex.load()
+    list_available_words(index)  # Liste der verfügbaren Wörter mit Videodateien anzeigen
     user_input = input("Geben Sie einen Satz ein: ")
-    create_video_from_sentence(user_input)
+    create_video_from_sentence(
+        user_input, index, NormalizedClipCache(), render_cache=RenderCache()
+    )
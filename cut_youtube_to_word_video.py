@@ -1,56 +1,62 @@
-from pytube import YouTube
-import moviepy.editor as mp
+# Schwere Abhängigkeiten (pytube, cv2, PIL, tkinter, tqdm) werden erst in den
+# Funktionen geladen, die sie brauchen: Worker-Prozesse und Läufe ohne
+# Bildschirm starten so ohne GUI-Bibliotheken
 import os
 import subprocess
-from google.cloud import speech_v1p1beta1 as speech
 import re
-from moviepy.editor import AudioFileClip
 import shutil
-from tqdm import tqdm
 import json
-import sqlite3
-import cv2
-from PIL import Image, ImageTk
-import tkinter as tk
-from tkinter import messagebox, font
 import threading
+import bisect
+import tempfile
+import time
+from recognizers import Recognizer, GoogleRecognizer, create_recognizer
+from transcription import segment_length, transcribe_segments
+from segmentation import (
+    decode_audio_pcm,
+    pcm_to_wav_bytes,
+    stream_audio_pcm,
+    stream_segments,
+)
+from verification import verify_clips_batched, verify_clips_locally
+from transcript_cache import CachingRecognizer
+from storage import get_repository
+from normalization import NormalizedClipCache, normalize_clips
+from render_cache import invalidate_clip
+from occurrence_store import (
+    link_clips,
+    linked_clips,
+    load_occurrences,
+    plan_cuts,
+    record_occurrences,
+)
+from jobs import JobTracker, hash_file, hash_values
+from media_info import probe_media
+from boundaries import BoundaryRefiner
+from clip_store import (
+    clip_file_name,
+    clip_path,
+    faulty_clip_names,
+    manifest,
+    mark_verified,
+    partial_path,
+    prepare_clip_path,
+)
+from previews import add_to_atlas, generate_sprite, sprite_output_args, sprite_path_for
+from estimator import CostEstimator, RunHistory
+from instrumentation import (
+    METRICS,
+    InstrumentedRecognizer,
+    file_bytes,
+    run_tool,
+    timed,
+)
 
 
 # SQLite-Datenbank initialisieren
 def initialize_db(db_path="word_videos.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Erstellen einer Tabelle, falls sie noch nicht existiert
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY,
-            word TEXT,
-            file_name TEXT,
-            duration_ms INTEGER,
-            start_time REAL,
-            end_time REAL,
-            rated INTEGER DEFAULT -1  -- Geänderte Spalte zur Bewertungskennzeichnung
-        )
-    """
-    )
-
-    conn.commit()
-    conn.close()
-
-
-# Bewertung in der Datenbank speichern
-def save_rating(word, file_name, rating, db_path="word_videos.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    # Setzt die Bewertung auf 1 für gut oder 0 für schlecht
-    cursor.execute(
-        "UPDATE videos SET rated = ? WHERE word = ? AND file_name = ?",
-        (rating, word, file_name),
-    )
-    conn.commit()
-    conn.close()
+    # Erstellt Tabellen und Indizes bzw. migriert eine bestehende Datenbank
+    get_repository(db_path)
 
 
 def is_file_size_within_limit(file_path, size_limit=26214400):  # 26 MB
@@ -74,28 +80,17 @@ def check_audio_channels(audio_path):
     Gibt die Anzahl der Kanäle zurück.
     """
     try:
-        command = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "a:0",
-            "-show_entries",
-            "stream=channels",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            audio_path,
-        ]
-        result = subprocess.run(command, stdout=subprocess.PIPE, text=True)
-        channels = int(result.stdout.strip())
-        return channels
+        return probe_media(audio_path).audio_channels
     except Exception as e:
         print(f"Fehler bei der Überprüfung der Audiokanäle: {e}")
         return None
 
 
+@timed("download", output_bytes=file_bytes)
 def download_youtube_video(url, download_folder):
     try:
+        from pytube import YouTube
+
         yt = YouTube(url)
         stream = (
             yt.streams.filter(progressive=True, file_extension="mp4")
@@ -123,6 +118,7 @@ def download_youtube_video(url, download_folder):
         return None
 
 
+@timed("extract", output_bytes=file_bytes)
 def convert_audio_to_mono(video_path):
     try:
         audio_path = os.path.join("downloads", "extracted_audio.wav")
@@ -137,125 +133,519 @@ def convert_audio_to_mono(video_path):
             "-y",  # Überschreiben, falls Datei existiert
             audio_path,
         ]
-        subprocess.run(command, check=True)
+        run_tool(command, check=True)
         return audio_path
     except Exception as e:
         print(f"Fehler bei der Audio-Konvertierung: {e}")
         return None
 
 
-def extract_audio(video_path):
-    try:
-        audio_path = os.path.join("downloads", "extracted_audio.wav")
-        # Verwenden von ffmpeg, um Audio in Mono zu konvertieren
-        command = [
-            "ffmpeg",
-            "-i",
-            video_path,
-            "-ac",
-            "1",  # Setzen auf 1 Kanal (Mono)
-            "-ar",
-            "44100",  # Abtastrate auf 44100 Hz setzen
-            "-y",  # Überschreiben, falls Datei existiert
-            audio_path,
-        ]
-        subprocess.run(command, check=True)
-        return audio_path
-    except Exception as e:
-        print(f"Ein Fehler ist aufgetreten: {e}")
-        return None
+def as_recognizer(client):
+    """
+    Macht aus einem Recognizer, einem Backend-Namen (z.B. "whisper") oder
+    einem Google SpeechClient einen Recognizer.
+    """
+    if isinstance(client, Recognizer):
+        return client
+    if isinstance(client, str):
+        return create_recognizer(client)
+    return GoogleRecognizer(client)
 
 
 def recognize_speech_from_audio(audio_path, client):
+    """
+    Erkennt die Wörter einer Audiodatei.
+    :param client: Ein Recognizer, ein Backend-Name oder ein Google SpeechClient.
+    """
     with open(audio_path, "rb") as audio_file:
         content = audio_file.read()
 
-    config = {
-        "language_code": "de-DE",
-        "enable_word_time_offsets": True,
-        "use_enhanced": False,
-    }
+    return [
+        (word.word, word.start_time, word.end_time)
+        for word in as_recognizer(client).recognize(content)
+    ]
 
-    response = client.recognize(config=config, audio={"content": content})
 
-    words_with_timestamps = {}
-    for result in response.results:
-        for word_info in result.alternatives[0].words:
-            word = word_info.word.lower()  # Wörter in Kleinbuchstaben umwandeln
-            start_time = word_info.start_time.total_seconds()
-            end_time = word_info.end_time.total_seconds()
+def cut_video_by_word(video_path, word, start_time, end_time, db_path="word_videos.db"):
+    """Schneidet ein einzelnes Wort aus dem Video (Sonderfall von cut_video_by_words)."""
+    return cut_video_by_words(video_path, [(word, start_time, end_time)], db_path=db_path)
 
-            word_duration = end_time - start_time
-            ideal_duration = 1.0  # Eine geschätzte ideale Dauer für ein Wort
 
-            # Prüfen, ob das Wort bereits erkannt wurde
-            if word in words_with_timestamps:
-                existing_duration = (
-                    words_with_timestamps[word][2] - words_with_timestamps[word][1]
-                )
-                # Das Wort behalten, dessen Dauer näher an der idealen Dauer liegt
-                if abs(word_duration - ideal_duration) < abs(
-                    existing_duration - ideal_duration
-                ):
-                    words_with_timestamps[word] = (word, start_time, end_time)
-            else:
-                words_with_timestamps[word] = (word, start_time, end_time)
+def _build_batch_cut_command(
+    video_path, batch, batch_start, batch_end, sprite_paths=None
+):
+    """
+    Baut einen ffmpeg-Aufruf, der das Quellvideo nur einmal im Bereich
+    [batch_start, batch_end] dekodiert und daraus mehrere Wortclips erzeugt.
+    :param batch: Liste von (word, start_time, end_time, output_path).
+    :param sprite_paths: Optional pro Clip ein Pfad, unter dem aus denselben
+        dekodierten Bildern eine Vorschauzeile entsteht.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-ss",
+        f"{batch_start:.3f}",  # Schnelles Springen vor dem Eingang
+        "-t",
+        f"{batch_end - batch_start:.3f}",
+        "-i",
+        video_path,
+    ]
+    for _, start_time, end_time, output_path in batch:
+        command += [
+            "-ss",
+            f"{start_time - batch_start:.3f}",  # Framegenau, relativ zum Batch
+            "-t",
+            f"{end_time - start_time:.3f}",
+            "-c:v",
+            "libx264",
+            "-c:a",
+            "aac",
+            output_path,
+        ]
+    for (_, start_time, end_time, _), sprite_path in zip(batch, sprite_paths or []):
+        command += sprite_output_args(
+            start_time - batch_start, end_time - start_time, sprite_path
+        )
+    return command
 
-    return list(words_with_timestamps.values())
 
+def get_video_codec(video_path):
+    """
+    Ermittelt den Codec des ersten Videostreams (z.B. "h264").
+    Gibt None zurück, wenn er nicht bestimmt werden kann.
+    """
+    try:
+        return probe_media(video_path).video_codec
+    except Exception as e:
+        print(f"Fehler bei der Ermittlung des Videocodecs: {e}")
+        return None
 
-def cut_video_by_word(video_path, word, start_time, end_time, db_path="word_videos.db"):
-    output_folder = "Wörter"
-    word_folder = os.path.join(output_folder, word)
-    if not os.path.exists(word_folder):
-        os.makedirs(word_folder)
 
-    try:
-        video = mp.VideoFileClip(video_path).subclip(start_time, end_time)
-        video_duration = video.duration  # Dauer des Videos in Sekunden
+def build_keyframe_index(video_path):
+    """
+    Liefert die sortierten Zeitpunkte (Sekunden) aller Keyframes des Videos.
+    Der Index wird einmal per ffprobe aus den Paketflags gelesen (ohne zu
+    dekodieren) und als JSON neben dem Download zwischengespeichert.
+    """
+    index_path = os.path.splitext(video_path)[0] + ".keyframes.json"
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(
+        video_path
+    ):
+        with open(index_path, "r") as index_file:
+            return json.load(index_file)
 
-        # Erstellen des Videodateinamens
-        video_file_name = f"{word}_{len(os.listdir(word_folder))}.mp4"
-        output_path = os.path.join(word_folder, video_file_name)
-        video.write_videofile(output_path)
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        video_path,
+    ]
+    result = run_tool(command, stdout=subprocess.PIPE, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    keyframes.sort()
 
-        # Speichern der Videoinformationen in der SQLite-Datenbank
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO videos (word, file_name, duration_ms, start_time, end_time)
-            VALUES (?, ?, ?, ?, ?)
-        """,
-            (word, video_file_name, video_duration * 1000, start_time, end_time),
-        )
-        conn.commit()
-        conn.close()
+    with open(index_path, "w") as index_file:
+        json.dump(keyframes, index_file)
+    return keyframes
 
-    except Exception as e:
-        print(f"Fehler beim Schneiden des Wortes '{word}': {e}")
 
+def find_copyable_span(keyframes, start_time, end_time):
+    """
+    Sucht den inneren, GOP-ausgerichteten Teil [first_key, last_key) eines
+    Wortbereichs, der ohne Neukodierung kopiert werden kann.
+    Gibt None zurück, wenn im Bereich keine zwei Keyframes liegen.
+    """
+    first = bisect.bisect_left(keyframes, start_time)
+    last = bisect.bisect_right(keyframes, end_time) - 1
+    if first >= len(keyframes) or last <= first:
+        return None
+    return keyframes[first], keyframes[last]
 
-def get_audio_length(audio_path):
+
+# ffprobe-Profilnamen von H.264 -> Werte für libx264 -profile:v
+_X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+
+def _edge_encoder_args(stream):
+    """
+    Kodierparameter für die neu kodierten Ränder eines Smart Cuts, passend
+    zum Videostream der Quelle (ffprobe-Stream): gleiches Profil, Level,
+    Pixelformat und gleiche Bildrate, damit der kopierte Mittelteil mit
+    denselben Decodereinstellungen abgespielt werden kann.
+    """
+    args = ["-c:v", "libx264", "-pix_fmt", stream.get("pix_fmt") or "yuv420p"]
+    profile = _X264_PROFILES.get(stream.get("profile"))
+    if profile is not None:
+        args += ["-profile:v", profile]
+    level = stream.get("level")
+    if level and int(level) > 0:
+        args += ["-level:v", f"{int(level) / 10:.1f}"]
+    frame_rate = stream.get("r_frame_rate")
+    if frame_rate and frame_rate != "0/0":
+        args += ["-r", frame_rate]
+    return args
+
+
+def _check_smart_cut(output_path, source_stream, duration):
+    """
+    Prüft den zusammengesetzten Clip: Profil und Bildrate müssen der Quelle
+    entsprechen und die Dauer darf höchstens um etwa zwei Bilder abweichen.
+    Löst bei einer Abweichung ValueError aus.
+    """
+    stream = probe_media(output_path).video
+    if stream is None:
+        raise ValueError("Clip enthält keinen Videostream")
+    for key in ("codec_name", "profile", "r_frame_rate"):
+        if stream.get(key) != source_stream.get(key):
+            raise ValueError(
+                f"{key} weicht ab: {stream.get(key)} statt {source_stream.get(key)}"
+            )
+    frame_rate = source_stream.get("r_frame_rate") or "25/1"
+    numerator, _, denominator = frame_rate.partition("/")
+    frame = float(denominator or 1) / float(numerator)
+    actual = float(stream.get("duration") or 0)
+    if abs(actual - duration) > 2 * frame + 0.01:
+        raise ValueError(f"Dauer {actual:.3f}s statt {duration:.3f}s")
+
+
+def smart_cut_word(video_path, start_time, end_time, copy_span, output_path):
     """
-    Ermittelt die Länge der Audiodatei in Sekunden.
+    Schneidet einen Wortclip framegenau, indem nur die angeschnittenen GOPs an
+    Anfang und Ende neu kodiert werden und der innere Teil per Stream-Copy
+    übernommen wird. Der Ton wird für den ganzen Bereich neu kodiert (günstig)
+    und zum Schluss mit dem zusammengesetzten Videostream gemultiplext.
+    Die Ränder werden mit Profil, Level und Bildrate der Quelle kodiert; alle
+    Teile werden als MPEG-TS (Annex B) zusammengefügt, so dass jeder Teil
+    seine eigenen SPS/PPS im Datenstrom mitbringt statt nur die des ersten.
+    Weicht das Ergebnis trotzdem von der Quelle ab, wird ValueError
+    ausgelöst und der Aufrufer kodiert den Clip vollständig neu.
     """
-    result = subprocess.run(
-        [
-            "ffprobe",
+    first_key, last_key = copy_span
+    source_stream = probe_media(video_path).video
+    time_base = source_stream.get("time_base", "")
+    timescale = time_base.partition("/")[2] if time_base.startswith("1/") else None
+    work_dir = tempfile.mkdtemp(prefix="smartcut_")
+    try:
+        parts = []
+
+        def encode_edge(part_start, part_end, name):
+            part_path = os.path.join(work_dir, name)
+            command = [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-y",
+                "-ss",
+                f"{part_start:.6f}",
+                "-i",
+                video_path,
+                "-t",
+                f"{part_end - part_start:.6f}",
+                "-map",
+                "0:v:0",
+                *_edge_encoder_args(source_stream),
+                "-f",
+                "mpegts",
+                part_path,
+            ]
+            run_tool(command, check=True)
+            parts.append(part_path)
+
+        # Angeschnittene GOP am Anfang neu kodieren
+        if first_key - start_time > 0.001:
+            encode_edge(start_time, first_key, "head.ts")
+
+        # Innere GOPs unverändert kopieren, mit SPS/PPS vor jedem Keyframe
+        middle_path = os.path.join(work_dir, "middle.ts")
+        command = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-ss",
+            f"{first_key:.6f}",
+            "-i",
+            video_path,
+            "-t",
+            f"{last_key - first_key:.6f}",
+            "-map",
+            "0:v:0",
+            "-c",
+            "copy",
+            "-bsf:v",
+            "h264_mp4toannexb",
+            "-avoid_negative_ts",
+            "make_zero",
+            "-f",
+            "mpegts",
+            middle_path,
+        ]
+        run_tool(command, check=True)
+        parts.append(middle_path)
+
+        # Angeschnittene GOP am Ende neu kodieren
+        if end_time - last_key > 0.001:
+            encode_edge(last_key, end_time, "tail.ts")
+
+        audio_path = os.path.join(work_dir, "audio.m4a")
+        command = [
+            "ffmpeg",
             "-v",
             "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
+            "-y",
+            "-ss",
+            f"{start_time:.6f}",
+            "-i",
+            video_path,
+            "-t",
+            f"{end_time - start_time:.6f}",
+            "-vn",
+            "-c:a",
+            "aac",
             audio_path,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+        ]
+        run_tool(command, check=True)
+
+        list_path = os.path.join(work_dir, "parts.txt")
+        with open(list_path, "w") as list_file:
+            for part_path in parts:
+                list_file.write(f"file '{part_path}'\n")
+
+        command = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-i",
+            audio_path,
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0?",
+            "-c",
+            "copy",
+        ]
+        if timescale:
+            # Zeitbasis der Quelle, sonst wählt der Muxer eine eigene
+            command += ["-video_track_timescale", timescale]
+        command.append(output_path)
+        run_tool(command, check=True)
+        _check_smart_cut(output_path, source_stream, end_time - start_time)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _clip_bytes(created):
+    return sum(file_bytes(path) for _, _, path, _, _ in created)
+
+
+@timed("cut", items=len, output_bytes=_clip_bytes)
+def cut_video_by_words(
+    video_path,
+    words_with_timestamps,
+    db_path="word_videos.db",
+    max_open_encoders=8,
+    smart_cut=False,
+    source_hash=None,
+    previews=True,
+):
+    """
+    Schneidet alle Wörter eines Quellvideos in einem Durchlauf.
+    Die Wörter werden nach Startzeit sortiert und in Gruppen von höchstens
+    max_open_encoders Clips verarbeitet; jede Gruppe ist ein einziger
+    ffmpeg-Prozess, der nur ihren Zeitbereich der Quelle dekodiert.
+    Alle Datenbankeinträge werden am Ende in einer Transaktion geschrieben.
+    Clips, die schon existieren, werden nicht erneut geschnitten; ein
+    wiederholter Aufruf ist damit idempotent. Die Clips landen unter ihrem
+    deterministischen Namen in der Ablage von clip_store.py.
+    :param words_with_timestamps: Liste von (word, start_time, end_time) oder,
+        nach BoundaryRefiner.refine, (word, start_time, end_time, raw_start,
+        raw_end); geschnitten wird an start_time/end_time, in der Datenbank
+        stehen beide Zeitpaare.
+    :param smart_cut: Wörter, deren Bereich mindestens eine ganze GOP enthält,
+        per smart_cut_word schneiden (nur H.264-Quellen).
+    :param source_hash: SHA-256 der Quelle; wird berechnet, wenn er fehlt.
+    :param previews: Für neu geschnittene Clips Vorschauen erzeugen und in den
+        Atlas des Wortes übernehmen (siehe previews.py).
+    :return: Liste von (word, file_name, output_path, start_time, end_time) der Clips.
+    """
+    if source_hash is None:
+        source_hash = hash_file(video_path)
+
+    # Ursprüngliche Zeiten des Erkenners pro Schnitt
+    raw_times = {
+        (w[0], w[1], w[2]): (w[3], w[4]) if len(w) == 5 else (w[1], w[2])
+        for w in words_with_timestamps
+    }
+    created = []
+    planned = []
+    # Als fehlerhaft geprüfte Schnitte werden nicht erneut angelegt
+    faulty = faulty_clip_names(
+        (clip_file_name(w, source_hash, s, e) for w, s, e in raw_times), db_path
     )
-    duration = float(result.stdout)
-    return duration / 60  # Umwandlung in Minuten
+    for word, start_time, end_time in sorted(
+        raw_times, key=lambda w: (w[1], w[2])
+    ):
+        if end_time <= start_time:
+            continue
+        video_file_name = clip_file_name(word, source_hash, start_time, end_time)
+        if video_file_name in faulty:
+            continue
+        output_path = prepare_clip_path(video_file_name)
+        if os.path.exists(output_path):
+            created.append((word, video_file_name, output_path, start_time, end_time))
+            continue
+        planned.append((word, start_time, end_time, output_path))
+
+    def finish(word, start_time, end_time, output_path):
+        if os.path.exists(partial_path(output_path)):
+            os.replace(partial_path(output_path), output_path)
+            created.append(
+                (word, os.path.basename(output_path), output_path, start_time, end_time)
+            )
+        else:
+            print(f"Fehler beim Schneiden des Wortes '{word}': Clip fehlt.")
+
+    if smart_cut and planned and get_video_codec(video_path) == "h264":
+        keyframes = build_keyframe_index(video_path)
+        remaining = []
+        for word, start_time, end_time, output_path in planned:
+            copy_span = find_copyable_span(keyframes, start_time, end_time)
+            if copy_span is None:
+                remaining.append((word, start_time, end_time, output_path))
+                continue
+            try:
+                smart_cut_word(
+                    video_path, start_time, end_time, copy_span, partial_path(output_path)
+                )
+                finish(word, start_time, end_time, output_path)
+            except Exception as e:
+                print(f"Smart Cut für '{word}' fehlgeschlagen, kodiere neu: {e}")
+                if os.path.exists(partial_path(output_path)):
+                    os.remove(partial_path(output_path))
+                remaining.append((word, start_time, end_time, output_path))
+                continue
+            if previews:
+                # Der Smart Cut dekodiert nicht den ganzen Clip, die Vorschau
+                # kommt aus einem eigenen Aufruf
+                try:
+                    generate_sprite(
+                        output_path, sprite_path_for(output_path), end_time - start_time
+                    )
+                except Exception as e:
+                    print(f"Fehler beim Erstellen der Vorschau für '{word}': {e}")
+        planned = remaining
+
+    for i in range(0, len(planned), max_open_encoders):
+        batch = planned[i : i + max_open_encoders]
+        batch_start = batch[0][1]
+        batch_end = max(end_time for _, _, end_time, _ in batch)
+        command = _build_batch_cut_command(
+            video_path,
+            [(w, s, e, partial_path(p)) for w, s, e, p in batch],
+            batch_start,
+            batch_end,
+            [sprite_path_for(p) for _, _, _, p in batch] if previews else None,
+        )
+        try:
+            run_tool(command, check=True)
+        except Exception as e:
+            print(f"Fehler beim Schneiden der Wörter ab {batch_start:.2f}s: {e}")
+        for word, start_time, end_time, output_path in batch:
+            finish(word, start_time, end_time, output_path)
+
+    if created:
+        # Speichern der Videoinformationen in der SQLite-Datenbank
+        get_repository(db_path).insert_videos(
+            [
+                (word, file_name, (end_time - start_time) * 1000)
+                + raw_times[(word, start_time, end_time)]
+                + (start_time, end_time, file_bytes(output_path))
+                for word, file_name, output_path, start_time, end_time in created
+            ]
+        )
+
+    if previews:
+        sprites = {}
+        for word, file_name, output_path, _, _ in created:
+            sprites.setdefault(word, []).append(
+                (file_name, sprite_path_for(output_path))
+            )
+        for word, word_sprites in sprites.items():
+            try:
+                add_to_atlas(word, word_sprites, db_path)
+            except Exception as e:
+                print(f"Fehler beim Erstellen der Vorschauen für '{word}': {e}")
+
+    return created
+
+
+def cut_candidates(word, store, n=5, db_path="word_videos.db"):
+    """
+    Liefert die n besten Vorkommen eines Wortes mit Clip. Clips werden erst
+    hier, beim ersten Bedarf, geschnitten (ein Durchlauf pro Quelle).
+    :param store: Ein geladener OccurrenceStore.
+    :return: Liste der Kandidaten (Dicts aus OccurrenceStore.best_candidates).
+    """
+    candidates = store.best_candidates(word, n)
+    missing = {}
+    for candidate in candidates:
+        if candidate["video_id"] is None:
+            missing.setdefault(candidate["source"], []).append(candidate)
+
+    for source, source_candidates in missing.items():
+        clips = cut_video_by_words(
+            source,
+            [(word, c["start_time"], c["end_time"]) for c in source_candidates],
+            db_path=db_path,
+        )
+        link_clips(source, clips, db_path)
+
+    if missing:
+        conn = get_repository(db_path).connection()
+        for candidate in candidates:
+            if candidate["video_id"] is None:
+                row = conn.execute(
+                    "SELECT video_id FROM occurrences WHERE id = ?", (candidate["id"],)
+                ).fetchone()
+                if row is not None and row[0] is not None:
+                    candidate["video_id"] = row[0]
+                    store.mark_cut(candidate["id"], row[0])
+    return [c for c in candidates if c["video_id"] is not None]
+
+
+def get_audio_length(audio_path):
+    """
+    Ermittelt die Länge der Audiodatei in Minuten.
+    """
+    return probe_media(audio_path).duration / 60  # Umwandlung in Minuten
 
 
 def estimate_costs(audio_length, price_per_minute=0.016, num_words=0):
@@ -280,19 +670,9 @@ def confirm_costs(costs_text):
     return user_input.lower() == "ja"
 
 
+@timed("split", items=len)
 def split_audio_mono_ffmpeg(file_path, segment_length=50):
-    total_duration_command = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        file_path,
-    ]
-    result = subprocess.run(total_duration_command, stdout=subprocess.PIPE, text=True)
-    total_duration = float(result.stdout.strip())
+    total_duration = probe_media(file_path).duration
 
     segments = []
     for start in range(0, int(total_duration), segment_length):
@@ -300,68 +680,56 @@ def split_audio_mono_ffmpeg(file_path, segment_length=50):
         segment_file_path = f"downloads/segment_{start}_{end}.wav"
         command = [
             "ffmpeg",
-            "-i",
-            file_path,
             "-ss",
-            str(start),
+            str(start),  # Vor -i, damit nicht ab Dateianfang dekodiert wird
             "-to",
             str(end),
+            "-i",
+            file_path,
             "-ac",
             "1",  # Setzen auf 1 Kanal (Mono)
             segment_file_path,
         ]
-        subprocess.run(command, check=True)
+        run_tool(command, check=True)
         segments.append(segment_file_path)
 
     return segments
 
 
-def transcribe_video_with_speech_to_text(video_path, speech_client):
+def transcribe_video_with_speech_to_text(video_path, speech_client, sample_rate=16000):
     """
-    Transkribiert das gesprochene Wort in einem Video mithilfe von Google Cloud Speech-to-Text.
+    Transkribiert das gesprochene Wort in einem Video.
+    Der Ton wird im Speicher dekodiert statt in eine gemeinsame WAV-Datei,
+    so dass mehrere Aufrufe gleichzeitig laufen können.
+    :param speech_client: Ein Recognizer, ein Backend-Name oder ein Google SpeechClient.
+    :return: Liste von RecognizedWord.
     """
-    # Extrahiere Audio aus dem Video
-    audio_path = extract_audio(video_path)
-    if audio_path is None:
-        print("Fehler beim Extrahieren des Audios.")
-        return None
-
-    # Transkribiere das Audio
-    words_with_timestamps = recognize_speech_from_audio(audio_path, speech_client)
+    samples = decode_audio_pcm(video_path, sample_rate)
+    content = pcm_to_wav_bytes(samples, sample_rate)
+    return as_recognizer(speech_client).recognize(content)
 
-    return words_with_timestamps
 
-
-def verify_and_sort_videos(word, base_folder="Wörter"):
+def verify_and_sort_videos(word, speech_client, db_path="word_videos.db"):
     """
-    Überprüft, ob das Wort in den Videos korrekt ist und sortiert sie entsprechend.
+    Überprüft, ob das Wort in den noch ungeprüften Videos korrekt ist, und
+    speichert das Ergebnis in videos.verified; die Dateien bleiben, wo sie sind.
+    Clips, deren Erkennung fehlschlägt, bleiben ungeprüft.
     """
-    word_folder = os.path.join(
-        base_folder, word
-    )  # Definiert den Pfad zum Ordner des Wortes
-
-    checked_folder = os.path.join(base_folder, "geprüft", word)
-    faulty_folder = os.path.join(base_folder, "fehlerhaft", word)
-
-    if not os.path.exists(word_folder):
-        print(f"Kein Ordner für das Wort '{word}' gefunden.")
+    clips = [clip for clip in manifest(word, db_path) if clip[3] is None]
+    if not clips:
+        print(f"Keine ungeprüften Videos für das Wort '{word}' gefunden.")
         return
 
-    for video_file in os.listdir(word_folder):
-        video_path = os.path.join(word_folder, video_file)
-        transcribed_word = transcribe_video_with_speech_to_text(
-            video_path, speech_client
-        )
-
-        if transcribed_word and transcribed_word.lower() == word.lower():
-            target_folder = checked_folder
-        else:
-            target_folder = faulty_folder
-
-        if not os.path.exists(target_folder):
-            os.makedirs(target_folder)
-
-        shutil.move(video_path, os.path.join(target_folder, video_file))
+    results = []
+    for _, video_file, video_path, _ in clips:
+        try:
+            recognized = transcribe_video_with_speech_to_text(video_path, speech_client)
+        except Exception as e:
+            print(f"Fehler beim Überprüfen von '{video_file}': {e}")
+            continue
+        verified = any(w.word.lower() == word.lower() for w in recognized)
+        results.append(((word, video_file, video_path, None, None), verified))
+    mark_verified(results, db_path)
 
 
 def estimate_duration(audio_length, processing_speed=1.0):
@@ -389,46 +757,44 @@ def process_audio_for_clarity(audio_path):
         "1",
         processed_audio_path,
     ]
-    subprocess.run(command, check=True)
+    run_tool(command, check=True)
     return processed_audio_path
 
 
-def transcribe_and_verify_video(video_path, word, client):
-    """Transkribiert das Video und überprüft, ob das spezifische Wort enthalten ist."""
-    audio_path = extract_audio(video_path)
-    if audio_path is None:
-        print("Fehler beim Extrahieren des Audios.")
-        return False
-
-    words = recognize_speech_from_audio(audio_path, client)
-    return any(w.lower() == word.lower() for w, _, _ in words)
-
-
 def delete_video_and_db_entry(word, file_name, db_path="word_videos.db"):
     """Löscht das Video und den entsprechenden Datenbankeintrag."""
-    video_path = os.path.join("Wörter", word, file_name)
+    video_path = clip_path(file_name)
 
     # Überprüfen, ob die Videodatei existiert
     if os.path.exists(video_path):
+        # Gerenderte Sätze mit diesem Clip verwerfen
+        invalidate_clip(word, file_name, db_path)
+
         # Lösche die Videodatei
         os.remove(video_path)
         print(f"Video {video_path} wurde gelöscht.")
 
-        # Verbindung zur SQLite-Datenbank herstellen
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
         # Lösche den entsprechenden Eintrag aus der Datenbank
-        cursor.execute(
-            "DELETE FROM videos WHERE word = ? AND file_name = ?", (word, file_name)
-        )
-        conn.commit()
-        conn.close()
+        get_repository(db_path).delete_video(word, file_name)
         print(f"Eintrag für {word} in der Datenbank gelöscht.")
     else:
         print(f"Video {video_path} nicht gefunden.")
 
 
+def discard_faulty_clip(word, file_name, db_path="word_videos.db"):
+    """
+    Löscht die Datei eines als fehlerhaft geprüften Clips. Die Zeile bleibt
+    mit verified = 0 stehen: Sie ist aus Index und Bewertung ausgeschlossen
+    und verhindert, dass ein erneuter Lauf denselben Schnitt wieder anlegt.
+    """
+    video_path = clip_path(file_name)
+    if os.path.exists(video_path):
+        # Gerenderte Sätze mit diesem Clip verwerfen
+        invalidate_clip(word, file_name, db_path)
+        os.remove(video_path)
+        print(f"Video {video_path} wurde gelöscht.")
+
+
 # Funktion zur Bewertung eines Videos
 def rate_and_get_rating(video_path, word, video_file):
     # Hier füge den Code zur Anzeige des Videos und zur Ermittlung der Bewertung ein
@@ -442,51 +808,40 @@ def rate_and_get_rating(video_path, word, video_file):
 
 # Funktion zur Überprüfung, ob ein Video bereits bewertet wurde
 def is_video_rated(word, video_file, db_path="word_videos.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT rated FROM videos WHERE word = ? AND file_name = ?", (word, video_file)
-    )
-    result = cursor.fetchone()
-    conn.close()
-
-    if result is not None:
-        return bool(result[0])  # Gibt True zurück, wenn das Video bewertet wurde
-    else:
-        return False  # Gibt False zurück, wenn das Video nicht bewertet wurde oder nicht in der Datenbank existiert
+    rating = get_repository(db_path).get_rating(word, video_file)
+    # Gibt True zurück, wenn das Video bewertet wurde; False, wenn es noch
+    # unbewertet (-1) ist oder nicht in der Datenbank existiert
+    return rating is not None and rating != -1
 
 
 # Funktion zum Speichern der Bewertung in der Datenbank
 def save_rating(word, video_file, rating, db_path="word_videos.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE videos SET rated = ? WHERE word = ? AND file_name = ?",
-        (rating, word, video_file),
-    )
-    conn.commit()
-    conn.close()
+    # Setzt die Bewertung auf 1 für gut oder 0 für schlecht
+    get_repository(db_path).save_rating(word, video_file, rating)
+    # Gerenderte Sätze mit diesem Clip verwerfen, die Auswahl kann sich ändern
+    invalidate_clip(word, video_file, db_path)
 
 
 def process_videos():
     # Hier füge den Code zum Herunterladen, Zuschneiden und Extrahieren von Videos ein
 
     # Dann starte die Schleife zur Bewertung der Videos
-    for word_folder, _, video_files in os.walk("Wörter"):
-        for video_file in video_files:
-            word = os.path.basename(word_folder)
-            video_path = os.path.join(word_folder, video_file)
+    for _, word, video_file in get_repository().unrated_videos():
+        video_path = clip_path(video_file)
 
-            # Überprüfen, ob das Video bereits bewertet wurde
-            if not is_video_rated(word, video_file):
-                # Video anzeigen und bewerten
-                rating = rate_and_get_rating(video_path, word, video_file)
+        # Überprüfen, ob das Video bereits bewertet wurde
+        if not is_video_rated(word, video_file):
+            # Video anzeigen und bewerten
+            rating = rate_and_get_rating(video_path, word, video_file)
 
-                # Bewertung in der Datenbank speichern
-                save_rating(word, video_file, rating)
+            # Bewertung in der Datenbank speichern
+            save_rating(word, video_file, rating)
 
 
 def play_video(video_path, label):
+    import cv2
+    from PIL import Image, ImageTk
+
     cap = cv2.VideoCapture(video_path)
 
     def update_frame():
@@ -516,6 +871,9 @@ def play_video_in_vlc(video_path):
 
 
 def rate_video(word, video_path):
+    import tkinter as tk
+    from tkinter import font
+
     # Erstellen eines neuen Fensters
     window = tk.Tk()
     window.title(f"Bewerte das Wort: {word}")
@@ -545,82 +903,289 @@ def rate_video(word, video_path):
     window.mainloop()  # Dies blockiert die Ausführung, bis das Fenster geschlossen wird
 
 
-def main():
+def write_metrics(report_path="run_report.json", prometheus_path="metrics.prom"):
+    """Schreibt die Messwerte des Laufs als JSON-Bericht und für Prometheus."""
+    try:
+        METRICS.write_report(report_path)
+        METRICS.write_prometheus(prometheus_path)
+    except Exception as e:
+        print(f"Fehler beim Schreiben der Messwerte: {e}")
+        return
+    report = METRICS.report()
+    for stage, entry in sorted(report["stages"].items()):
+        print(
+            f"{stage}: {entry['calls']} Aufrufe, {entry['seconds']:.2f} s, "
+            f"{entry['errors']} Fehler"
+        )
+    recognition = report["recognizer"]
+    print(
+        f"Erkenner: {recognition['calls']} Anfragen, "
+        f"{recognition['billed_seconds']:.0f} s abgerechnet; "
+        f"Prozesse: {sum(report['subprocesses'].values())}"
+    )
+
+
+def main(
+    use_transcript_cache=True,
+    verification_mode="batched",
+    normalize=False,
+    backend="google",
+    backend_options=None,
+    refine=True,
+):
+    """
+    :param verification_mode: "batched" prüft die Clips gebündelt mit dem
+        Erkenner, "local" nur anhand der Wortzeiten und der Tonenergie.
+    :param normalize: Bestätigte Clips direkt in das kanonische Profil umkodieren.
+    :param backend: Erkennungs-Backend dieses Laufs ("google", "whisper",
+        "vosk" oder "fake"), backend_options gehen an dessen Konstruktor.
+    :param refine: Wortgrenzen vor dem Schneiden auf die nächste Pause im
+        Ton verschieben (BoundaryRefiner).
+    """
     url = "https://www.youtube.com/shorts/pes9pXYZTUI"
     download_folder = "downloads"
+    # Laufzeiten, Prozesse und Erkenneraufrufe dieses Laufs messen
+    METRICS.reset()
+    finished = False
     try:
-        video_path = download_youtube_video(url, download_folder)
-        if video_path is None or not os.path.exists(video_path):
-            print("Fehler beim Herunterladen oder Finden des Videos.")
+        initialize_db()
+        # Fortschritt pro Stufe; ein erneuter Lauf setzt nach der letzten
+        # abgeschlossenen Stufe wieder ein
+        tracker = JobTracker()
+        if tracker.first_incomplete(url) is None:
+            print("Das Video wurde bereits vollständig verarbeitet.")
+            rate_all_videos()
             return
 
-        audio_path = convert_audio_to_mono(video_path)
-        if audio_path is None or not os.path.exists(audio_path):
-            print(
-                "Fehler beim Konvertieren des Audios oder die Audiodatei existiert nicht."
-            )
+        downloaded = tracker.stage(url, "download")
+        if (
+            downloaded is not None
+            and os.path.exists(downloaded[0])
+            and hash_file(downloaded[0]) == downloaded[1]
+        ):
+            video_path, source_hash = downloaded
+            print(f"Verwende bereits heruntergeladenes Video: {video_path}")
+        else:
+            video_path = download_youtube_video(url, download_folder)
+            if video_path is None or not os.path.exists(video_path):
+                print("Fehler beim Herunterladen oder Finden des Videos.")
+                return
+            source_hash = hash_file(video_path)
+            tracker.complete(url, "download", video_path, source_hash)
+
+        # Eine einzige ffprobe-Abfrage für alle Angaben zur Quelle
+        media = probe_media(video_path)
+        if not media.has_audio:
+            print("Das Video enthält keine Tonspur.")
             return
 
-        channels = check_audio_channels(audio_path)
-        if channels != 1:
-            print(f"Die Audiodatei ist nicht Mono, sie hat {channels} Kanäle.")
-            return
-        else:
-            print("Die Audiodatei ist Mono.")
+        # Bereits transkribiertes Audio wird aus der Datenbank beantwortet;
+        # gemessen werden nur die Anfragen, die tatsächlich den Erkenner erreichen
+        speech_client = CachingRecognizer(
+            InstrumentedRecognizer(
+                create_recognizer(backend, **(backend_options or {}))
+            ),
+            enabled=use_transcript_cache,
+        )
 
-        audio_length = get_audio_length(audio_path)
-        estimated_costs = estimate_costs(audio_length)
-        estimated_duration = estimate_duration(audio_length)
-        if not confirm_costs(
-            f"Die geschätzten Kosten für die Bearbeitung betragen {estimated_costs:.2f} Euro und die geschätzte Dauer beträgt ca. {estimated_duration:.2f} Minuten."
-        ):
+        # Schätzung aus den bisher gemessenen Läufen dieses Backends
+        estimator = CostEstimator(backend=backend)
+        estimate = estimator.estimate(
+            [(media.duration, media.height)], speech_client.price_per_minute
+        )
+        if not confirm_costs(estimator.describe(estimate)):
             print("Kosten wurden nicht bestätigt. Verarbeitung abgebrochen.")
             return
+        # Die Wartezeit auf die Bestätigung zählt nicht zur Laufzeit
+        processing_started = time.perf_counter()
+
+        sample_rate = 16000
+
+        normalized_cache = NormalizedClipCache() if normalize else None
+
+        # Ist auch der Schnitt abgeschlossen, werden nur noch die ungeprüften
+        # Clips geprüft
+        verify_only = tracker.is_done(url, "cut")
+        pending = dict(linked_clips(video_path, unverified_only=True))
+        if tracker.is_done(url, "transcribe"):
+            # Erkennung ist abgeschlossen, die Wörter liegen in der Datenbank;
+            # für die Prüfung wird nur der Ton des jeweiligen Segments dekodiert
+            def replayed():
+                for segment_index, words in load_occurrences(video_path):
+                    if verify_only and segment_index not in pending:
+                        continue
+                    start = max(0.0, min(w.start_time for w in words) - 1.0)
+                    end = max(w.end_time for w in words) + 1.0
+                    samples = decode_audio_pcm(
+                        video_path, sample_rate, start=start, end=end
+                    )
+                    yield segment_index, words, samples, start, None
 
-        initialize_db()
+            transcribed = replayed()
+        else:
+            # Der Ton wird über eine Pipe direkt mit 16 kHz aus dem Video
+            # dekodiert und an leisen Stellen in ca. 50 s lange Segmente
+            # zerlegt (länger bei Erkennern ohne Anfragelimit); die Erkennung
+            # beginnt, bevor die Dekodierung fertig ist, und es entstehen
+            # keine WAV-Dateien
+            segments = stream_segments(
+                stream_audio_pcm(video_path, sample_rate),
+                target_length=segment_length(speech_client),
+                overlap=0.5,
+                sample_rate=sample_rate,
+            )
+            # Segmente werden nebenläufig erkannt; geschnitten wird, sobald das
+            # jeweils nächste Segment fertig ist
+            transcribed = (
+                (segment.index, words, segment.samples, segment.start, error)
+                for segment, words, error in transcribe_segments(
+                    segments, speech_client, max_in_flight=speech_client.max_in_flight
+                )
+            )
 
-        segment_paths = split_audio_mono_ffmpeg(audio_path, segment_length=50)
-        speech_client = speech.SpeechClient()
+        all_words = []
+        cut_names = []
+        confirmed = []
+        verification_failed = False
+        failed_segments = 0
+        # Fortschritt in Sekunden verarbeiteten Tons
+        from tqdm import tqdm
 
-        num_segments = len(segment_paths)
-        for i, segment_path in enumerate(segment_paths):
-            print(f"Verarbeite Segment {i+1}/{num_segments}: {segment_path}")
-            words_with_timestamps = recognize_speech_from_audio(
-                segment_path, speech_client
+        progress = tqdm(
+            total=round(media.duration), unit="s", desc="Verarbeitung", leave=False
+        )
+        for segment_index, words, samples, offset, error in transcribed:
+            progress.update(
+                max(0, round(offset + len(samples) / sample_rate) - progress.n)
             )
-
-            for word, start_time, end_time in words_with_timestamps:
-                try:
-                    cut_video_by_word(video_path, word, start_time, end_time)
-                    video_file_path = os.path.join("Wörter", word, f"{word}.mp4")
-                    if os.path.exists(video_file_path):
-                        if transcribe_and_verify_video(
-                            video_file_path, word, speech_client
-                        ):
-                            print(f"Video für das Wort '{word}' bestätigt.")
-                        else:
-                            print(
-                                f"Video für das Wort '{word}' enthält das Wort nicht. Wird entfernt."
-                            )
-                            delete_video_and_db_entry(word, f"{word}.mp4")
-                    else:
-                        print(f"Video für das Wort '{word}' nicht gefunden.")
-                except Exception as e:
+            if error is not None:
+                # Nicht als leeres Segment speichern; der nächste Lauf fragt es erneut an
+                failed_segments += 1
+                continue
+            progress.set_postfix(clips=len(cut_names), words=len(all_words))
+            print(f"Verarbeite Segment {segment_index+1}")
+            # Alle Vorkommen aufbewahren, geschnitten werden nur die besten
+            # der Wörter, für die noch zu wenige Clips existieren
+            record_occurrences(video_path, segment_index, words)
+            all_words.extend(words)
+            if verify_only:
+                clips = pending.get(segment_index, [])
+            else:
+                words_with_timestamps = plan_cuts(video_path, segment_index)
+                if refine:
+                    words_with_timestamps = BoundaryRefiner(
+                        samples, sample_rate, offset=offset
+                    ).refine(words_with_timestamps)
+
+                clips = cut_video_by_words(
+                    video_path, words_with_timestamps, source_hash=source_hash
+                )
+                link_clips(video_path, clips)
+                cut_names.extend(file_name for _, file_name, _, _, _ in clips)
+            # Alle Clips des Segments gemeinsam prüfen statt einer Anfrage pro Clip
+            try:
+                if verification_mode == "local":
+                    results = verify_clips_locally(
+                        clips, words, samples, sample_rate, offset=offset
+                    )
+                else:
+                    results = verify_clips_batched(
+                        clips, samples, sample_rate, speech_client, offset=offset
+                    )
+            except Exception as e:
+                print(f"Fehler beim Überprüfen der Videos des Segments: {e}")
+                verification_failed = True
+                continue
+
+            # Prüfergebnis als Metadaten; fehlerhafte Clips werden danach entfernt
+            mark_verified(results)
+            for (word, file_name, _, _, _), verified in results:
+                if verified is None:
+                    # Die Anfrage ist fehlgeschlagen: Clip behalten und beim
+                    # nächsten Lauf erneut prüfen
+                    print(f"Video für das Wort '{word}' konnte nicht geprüft werden.")
+                    verification_failed = True
+                elif verified:
+                    print(f"Video für das Wort '{word}' bestätigt.")
+                    confirmed.append(file_name)
+                else:
                     print(
-                        f"Fehler beim Schneiden oder Überprüfen des Videos für das Wort '{word}': {e}"
+                        f"Video für das Wort '{word}' enthält das Wort nicht. Wird entfernt."
                     )
-                    continue
+                    discard_faulty_clip(word, file_name)
+
+            if normalize:
+                verified_clips = [clip for clip, verified in results if verified]
+                normalize_clips(verified_clips, normalized_cache)
 
-        base_folder = "Wörter"
-        for word_folder in os.listdir(base_folder):
-            word_path = os.path.join(base_folder, word_folder)
-            if os.path.isdir(word_path):
-                for video_file in os.listdir(word_path):
-                    video_file_path = os.path.join(word_path, video_file)
-                    rate_video(word_folder, video_file_path)
+        progress.close()
+
+        # Extraktion und Erkennung laufen gemeinsam über die Pipe
+        tracker.complete(url, "extract")
+        if verify_only:
+            if not verification_failed:
+                tracker.complete(
+                    url, "verify", artifact_hash=hash_values(sorted(confirmed))
+                )
+        elif failed_segments:
+            # Ein Transkript mit Lücken gilt nicht als fertig; spätere Stufen
+            # bleiben offen, damit der nächste Lauf die Segmente wiederholt
+            print(f"{failed_segments} Segmente konnten nicht erkannt werden.")
+            tracker.fail(
+                url,
+                "transcribe",
+                f"{failed_segments} Segmente konnten nicht erkannt werden",
+            )
+        else:
+            tracker.complete(url, "transcribe", artifact_hash=hash_values(all_words))
+            tracker.complete(
+                url, "cut", artifact_hash=hash_values(sorted(cut_names))
+            )
+            if not verification_failed:
+                tracker.complete(
+                    url, "verify", artifact_hash=hash_values(sorted(confirmed))
+                )
+
+        # Messwerte des Laufs für künftige Schätzungen aufbewahren
+        report = METRICS.report()
+        RunHistory().record(
+            report,
+            audio_seconds=media.duration,
+            words=len(all_words),
+            wall_seconds=time.perf_counter()
+            - processing_started
+            + sum(
+                report["stages"].get(stage, {}).get("seconds", 0.0)
+                for stage in ("download", "probe")
+            ),
+            clips=len(cut_names),
+            height=media.height,
+            backend=backend,
+            price_per_minute=speech_client.price_per_minute,
+        )
+
+        if use_transcript_cache:
+            cache_stats = speech_client.stats()
+            print(
+                f"Transkript-Cache: {cache_stats['hits']} Treffer, {cache_stats['misses']} Fehlschläge."
+            )
+        finished = True
 
     except Exception as e:
         print(f"Ein unerwarteter Fehler ist aufgetreten: {e}")
+    finally:
+        write_metrics()
+
+    # Bewertet wird erst nach dem Bericht, damit er nur die Verarbeitung misst
+    if finished:
+        rate_all_videos()
+
+
+def rate_all_videos():
+    from rating_station import rate_unrated_videos
+
+    # Ein Fenster für alle unbewerteten Clips statt eines Fensters pro Clip
+    rate_unrated_videos()
 
 
 if __name__ == "__main__":
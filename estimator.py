@@ -0,0 +1,447 @@
+import argparse
+import math
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from storage import get_repository
+
+
+# Annahmen, solange es keine gemessenen Läufe gibt
+DEFAULT_PROCESSING_SPEED = 1.0  # Minuten Verarbeitung pro Minute Audio
+DEFAULT_WORDS_PER_MINUTE = 120.0
+# Relative Unsicherheit, wenn sich die Streuung nicht schätzen lässt
+DEFAULT_SPREAD = 0.5
+
+# Quantile der t-Verteilung (zweiseitig) nach Freiheitsgraden; darüber die
+# Normalverteilung. Bei wenigen Läufen werden die Intervalle so nicht zu eng.
+_T_QUANTILES = {
+    0.9: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228],
+}
+_Z_QUANTILES = {0.9: 1.645, 0.95: 1.960}
+
+# Mindestzahl an Läufen derselben Auflösung, ab der nur diese verwendet werden
+MIN_RUNS_PER_RESOLUTION = 3
+
+
+Run = namedtuple(
+    "Run",
+    "id backend height sources workers audio_seconds words wall_seconds "
+    "billed_seconds stages",
+)
+
+Estimate = namedtuple(
+    "Estimate",
+    "cost cost_low cost_high seconds seconds_low seconds_high words stages runs",
+)
+Estimate.__doc__ = """
+Schätzung für eine oder mehrere Quellen; Kosten in Euro, Zeiten in Sekunden
+Laufzeit (bei mehreren gleichzeitig verarbeiteten Videos: Summe über alle
+Worker). stages bildet Stufe -> geschätzte Sekunden ab, runs ist die Anzahl
+der Läufe, auf denen die Schätzung beruht (0 = nur Annahmen).
+"""
+
+
+def _quantile(confidence, dof):
+    if confidence not in _T_QUANTILES:
+        raise ValueError(f"Nicht unterstütztes Konfidenzniveau: {confidence}")
+    table = _T_QUANTILES[confidence]
+    if dof > 30:
+        return _Z_QUANTILES[confidence]
+    return table[min(dof, len(table)) - 1]
+
+
+def _features(audio_seconds, words, sources):
+    # Audiominuten zuerst: Bei wenigen Läufen wird nur diese Spalte verwendet
+    return [audio_seconds / 60, words, sources]
+
+
+class LinearModel:
+    """
+    Kleinste-Quadrate-Modell y = a * Audiominuten + b * Wörter + c * Quellen
+    über die bisherigen Läufe. Bei wenigen Läufen werden weniger Spalten
+    verwendet (bei einem Lauf nur die Audiominuten), damit mindestens ein
+    Freiheitsgrad für die Streuung bleibt.
+    """
+
+    def __init__(self, features, targets):
+        features = np.asarray(features, dtype=float)
+        targets = np.asarray(targets, dtype=float)
+        self.runs = len(targets)
+        self.columns = max(1, min(features.shape[1], self.runs - 1))
+        x = features[:, : self.columns]
+        self.coefficients = np.linalg.lstsq(x, targets, rcond=None)[0]
+        self.dof = self.runs - self.columns
+        residuals = targets - x @ self.coefficients
+        self.residual_variance = (
+            float(residuals @ residuals) / self.dof if self.dof > 0 else None
+        )
+        self.inverse_gram = np.linalg.pinv(x.T @ x)
+
+    def predict(self, features, count=1, confidence=0.9):
+        """
+        Vorhersage für die Summe über count neue Quellen.
+        :param features: Über alle Quellen summierte Merkmale (_features).
+        :return: (Schätzwert, untere Grenze, obere Grenze), nie negativ.
+        """
+        x = np.asarray(features, dtype=float)[: self.columns]
+        value = max(0.0, float(x @ self.coefficients))
+        if self.residual_variance is None:
+            return value, value * (1 - DEFAULT_SPREAD), value * (1 + DEFAULT_SPREAD)
+        # Streuung der neuen Läufe plus Unsicherheit der Koeffizienten
+        variance = self.residual_variance * (count + float(x @ self.inverse_gram @ x))
+        margin = _quantile(confidence, self.dof) * math.sqrt(variance)
+        return value, max(0.0, value - margin), value + margin
+
+
+class RunHistory:
+    """
+    Hält die Messwerte abgeschlossener Läufe (Tabellen run_history und
+    run_stage_history) fest und liefert sie für die Schätzung.
+    """
+
+    def __init__(self, db_path="word_videos.db"):
+        self.repository = get_repository(db_path)
+
+    def record(
+        self,
+        report,
+        audio_seconds,
+        words,
+        wall_seconds,
+        clips=0,
+        sources=1,
+        workers=1,
+        height=None,
+        backend=None,
+        price_per_minute=0.0,
+    ):
+        """
+        Speichert einen Lauf.
+        :param report: Messwerte des Laufs (instrumentation.Metrics.report()).
+        :param wall_seconds: Verarbeitungszeit ohne Wartezeit auf Eingaben.
+        :param workers: Anzahl gleichzeitig verarbeiteter Videos.
+        :return: ID des Laufs.
+        """
+        with self.repository.transaction() as conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO run_history (
+                    finished, backend, height, sources, workers, audio_seconds,
+                    words, clips, wall_seconds, billed_seconds, price_per_minute
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    time.time(),
+                    backend,
+                    height,
+                    sources,
+                    workers,
+                    audio_seconds,
+                    words,
+                    clips,
+                    wall_seconds,
+                    report["recognizer"]["billed_seconds"],
+                    price_per_minute,
+                ),
+            )
+            run_id = cursor.lastrowid
+            conn.executemany(
+                """
+                INSERT INTO run_stage_history (run_id, stage, calls, seconds, items)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+                [
+                    (run_id, stage, entry["calls"], entry["seconds"], entry["items"])
+                    for stage, entry in report["stages"].items()
+                ],
+            )
+        return run_id
+
+    def runs(self, backend=None):
+        """Alle Läufe (optional nur eines Backends) mit ihren Stufenzeiten."""
+        conn = self.repository.connection()
+        query = """
+            SELECT id, backend, height, sources, workers, audio_seconds, words,
+                wall_seconds, billed_seconds
+            FROM run_history WHERE sources > 0 AND audio_seconds > 0
+        """
+        parameters = ()
+        if backend is not None:
+            query += " AND backend = ?"
+            parameters = (backend,)
+        rows = conn.execute(query + " ORDER BY id", parameters).fetchall()
+        stages = {}
+        for run_id, stage, seconds in conn.execute(
+            "SELECT run_id, stage, seconds FROM run_stage_history"
+        ):
+            stages.setdefault(run_id, {})[stage] = seconds
+        return [Run(*row, stages.get(row[0], {})) for row in rows]
+
+
+class CostEstimator:
+    """
+    Schätzt Kosten und Dauer aus den gemessenen Läufen eines Backends.
+    Pro Stufe, für die abgerechneten Sekunden und für die Worker-Sekunden
+    (Laufzeit mal gleichzeitig verarbeitete Videos) wird je ein LinearModel
+    angepasst; gibt es mindestens MIN_RUNS_PER_RESOLUTION Läufe mit der
+    Auflösung der Quelle, werden nur diese verwendet.
+    Ohne Läufe gelten die früheren Annahmen (DEFAULT_PROCESSING_SPEED,
+    jede Audiosekunde wird abgerechnet) mit DEFAULT_SPREAD als Unsicherheit.
+    """
+
+    def __init__(self, db_path="word_videos.db", backend=None, confidence=0.9):
+        self.backend = backend
+        self.confidence = confidence
+        self.history = RunHistory(db_path).runs(backend)
+        self._models = {}
+
+    def _runs_for(self, height):
+        same = [run for run in self.history if height is not None and run.height == height]
+        return same if len(same) >= MIN_RUNS_PER_RESOLUTION else self.history
+
+    def _model(self, height, target):
+        runs = self._runs_for(height)
+        key = (height if runs is not self.history else None, target)
+        if key not in self._models:
+            features = [_features(r.audio_seconds, r.words, r.sources) for r in runs]
+            if target == "billed":
+                targets = [r.billed_seconds or 0.0 for r in runs]
+            elif target == "worker_seconds":
+                targets = [r.wall_seconds * max(1, r.workers) for r in runs]
+            else:
+                targets = [r.stages.get(target, 0.0) for r in runs]
+            self._models[key] = LinearModel(features, targets)
+        return self._models[key]
+
+    def words_per_minute(self, height=None):
+        runs = self._runs_for(height)
+        minutes = sum(run.audio_seconds for run in runs) / 60
+        if not runs or minutes <= 0:
+            return DEFAULT_WORDS_PER_MINUTE
+        return sum(run.words for run in runs) / minutes
+
+    def estimate(self, sources, price_per_minute=0.0):
+        """
+        Schätzt eine Gruppe von Quellen gleicher Auflösung.
+        :param sources: Liste von (audio_seconds, height).
+        """
+        audio_seconds = sum(seconds for seconds, _ in sources)
+        height = sources[0][1] if sources else None
+        words = audio_seconds / 60 * self.words_per_minute(height)
+        price_per_second = price_per_minute / 60
+
+        if not self.history:
+            seconds = audio_seconds * DEFAULT_PROCESSING_SPEED
+            cost = audio_seconds * price_per_second
+            return Estimate(
+                cost,
+                cost * (1 - DEFAULT_SPREAD),
+                cost * (1 + DEFAULT_SPREAD),
+                seconds,
+                seconds * (1 - DEFAULT_SPREAD),
+                seconds * (1 + DEFAULT_SPREAD),
+                words,
+                {},
+                0,
+            )
+
+        features = _features(audio_seconds, words, len(sources))
+        billed = self._model(height, "billed").predict(
+            features, len(sources), self.confidence
+        )
+        seconds = self._model(height, "worker_seconds").predict(
+            features, len(sources), self.confidence
+        )
+        stage_names = {stage for run in self._runs_for(height) for stage in run.stages}
+        stages = {
+            stage: self._model(height, stage).predict(features, len(sources))[0]
+            for stage in sorted(stage_names)
+        }
+        return Estimate(
+            billed[0] * price_per_second,
+            billed[1] * price_per_second,
+            billed[2] * price_per_second,
+            seconds[0],
+            seconds[1],
+            seconds[2],
+            words,
+            stages,
+            len(self._runs_for(height)),
+        )
+
+    def describe(self, estimate):
+        """Text für confirm_costs."""
+        percent = int(self.confidence * 100)
+        basis = (
+            f"basierend auf {estimate.runs} gemessenen Läufen"
+            if estimate.runs
+            else "ohne gemessene Läufe, nur grob geschätzt"
+        )
+        return (
+            f"Die geschätzten Kosten für die Bearbeitung betragen "
+            f"{estimate.cost:.2f} Euro ({percent} %: {estimate.cost_low:.2f} bis "
+            f"{estimate.cost_high:.2f}) und die geschätzte Dauer beträgt ca. "
+            f"{estimate.seconds / 60:.2f} Minuten ({estimate.seconds_low / 60:.2f} bis "
+            f"{estimate.seconds_high / 60:.2f}), {basis}."
+        )
+
+
+BatchPlan = namedtuple(
+    "BatchPlan",
+    "sources failed estimate workers wall_seconds wall_seconds_high deadline_met",
+)
+
+
+def source_info(location, local=False):
+    """
+    Länge (Sekunden) und Bildhöhe einer Quelle, ohne sie herunterzuladen.
+    :return: (audio_seconds, height).
+    """
+    if local:
+        from media_info import probe_media
+
+        media = probe_media(location)
+        return media.duration, media.height
+    from pytube import YouTube
+
+    yt = YouTube(location)
+    # Dieselbe Auswahl wie download_youtube_video
+    stream = (
+        yt.streams.filter(progressive=True, file_extension="mp4")
+        .order_by("resolution")
+        .desc()
+        .first()
+    )
+    height = int(stream.resolution.rstrip("p")) if stream and stream.resolution else None
+    return float(yt.length), height
+
+
+def plan_batch(
+    locations,
+    deadline_hours=None,
+    db_path="word_videos.db",
+    backend="google",
+    price_per_minute=None,
+    local=False,
+    confidence=0.9,
+    max_workers=16,
+):
+    """
+    Plant einen Stapel vor dem Lauf: Gesamtkosten, Laufzeit und die Anzahl
+    gleichzeitig zu verarbeitender Videos (video_workers in ingest.py), mit
+    der die obere Grenze der Laufzeit die Frist einhält. Die Laufzeit wird
+    als Worker-Sekunden geteilt durch die Anzahl der Worker angenommen; die
+    gemessenen Stapelläufe enthalten die Reibungsverluste paralleler
+    Verarbeitung bereits.
+    :param price_per_minute: Standardmäßig der Preis des Backends.
+    :return: BatchPlan; workers ist None, wenn auch max_workers nicht reichen.
+    """
+    if price_per_minute is None:
+        from recognizers import BACKENDS
+
+        price_per_minute = BACKENDS[backend].price_per_minute
+
+    by_height = {}
+    failed = []
+    for location in locations:
+        try:
+            seconds, height = source_info(location, local)
+        except Exception as e:
+            print(f"Fehler beim Abfragen von '{location}': {e}")
+            failed.append(location)
+            continue
+        by_height.setdefault(height, []).append((seconds, height))
+
+    estimator = CostEstimator(db_path, backend, confidence)
+    parts = [estimator.estimate(group, price_per_minute) for group in by_height.values()]
+    # Gruppen verschiedener Auflösung: Grenzen werden konservativ addiert
+    totals = [sum(values) for values in zip(*[part[:7] for part in parts])] or [0.0] * 7
+    estimate = Estimate(
+        *totals,
+        {
+            stage: sum(part.stages.get(stage, 0.0) for part in parts)
+            for stage in sorted({stage for part in parts for stage in part.stages})
+        },
+        max([part.runs for part in parts], default=0),
+    )
+
+    workers = 1
+    deadline_met = True
+    if deadline_hours is not None:
+        deadline = deadline_hours * 3600
+        workers = max(1, math.ceil(estimate.seconds_high / deadline))
+        if workers > max_workers:
+            workers = None
+            deadline_met = False
+    parallel = workers or max_workers
+    return BatchPlan(
+        sum(len(group) for group in by_height.values()),
+        failed,
+        estimate,
+        workers,
+        estimate.seconds / parallel,
+        estimate.seconds_high / parallel,
+        deadline_met,
+    )
+
+
+def print_plan(plan, confidence=0.9):
+    estimate = plan.estimate
+    percent = int(confidence * 100)
+    print(
+        f"{plan.sources} Quellen, ca. {estimate.words:.0f} Wörter"
+        + (f", {len(plan.failed)} nicht abfragbar" if plan.failed else "")
+    )
+    print(
+        f"Kosten: {estimate.cost:.2f} Euro ({percent} %: {estimate.cost_low:.2f} "
+        f"bis {estimate.cost_high:.2f})"
+    )
+    print(
+        f"Arbeit: {estimate.seconds / 3600:.2f} Worker-Stunden "
+        f"({estimate.seconds_low / 3600:.2f} bis {estimate.seconds_high / 3600:.2f})"
+    )
+    for stage, seconds in estimate.stages.items():
+        print(f"  {stage}: {seconds / 60:.1f} Minuten")
+    if plan.deadline_met:
+        print(
+            f"Mit {plan.workers} Workern: {plan.wall_seconds / 3600:.2f} Stunden "
+            f"(höchstens {plan.wall_seconds_high / 3600:.2f})"
+        )
+    else:
+        print("Die Frist ist auch mit der höchsten Anzahl Worker nicht einzuhalten.")
+    if not estimate.runs:
+        print("Es gibt noch keine gemessenen Läufe; die Schätzung beruht auf Annahmen.")
+
+
+if __name__ == "__main__":
+    from ingest import read_locations
+    from recognizers import BACKENDS
+
+    parser = argparse.ArgumentParser(
+        description="Kosten und Dauer eines Stapels aus früheren Läufen schätzen"
+    )
+    parser.add_argument("locations", help="Datei mit einer URL (oder einem Pfad) pro Zeile")
+    parser.add_argument("--local", action="store_true", help="Lokale Dateien statt YouTube")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="google")
+    parser.add_argument("--deadline-hours", type=float, default=None)
+    parser.add_argument("--max-workers", type=int, default=16)
+    parser.add_argument("--confidence", type=float, choices=[0.9, 0.95], default=0.9)
+    parser.add_argument("--db", default="word_videos.db")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Datenbank {args.db} nicht gefunden, es wird nur mit Annahmen geschätzt.")
+    plan = plan_batch(
+        read_locations(args.locations),
+        args.deadline_hours,
+        db_path=args.db,
+        backend=args.backend,
+        local=args.local,
+        confidence=args.confidence,
+        max_workers=args.max_workers,
+    )
+    print_plan(plan, args.confidence)
@@ -0,0 +1,465 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import cut_youtube_to_word_video as pipeline
+from boundaries import BoundaryRefiner
+from cli_arguments import add_ingest_arguments, backend_options_from_args
+from clip_store import mark_verified
+from estimator import RunHistory
+from instrumentation import METRICS, InstrumentedRecognizer
+from jobs import JobTracker, StageError, hash_file, hash_values, stage_errors
+from media_info import probe_media
+from occurrence_store import (
+    link_clips,
+    linked_clips,
+    load_occurrences,
+    plan_cuts,
+    record_occurrences,
+)
+from recognizers import Recognizer, create_recognizer
+from segmentation import decode_audio_pcm, segment_audio
+from transcript_cache import CachingRecognizer
+from transcription import segment_length, transcribe_segments
+from verification import verify_clips_batched, verify_clips_locally
+
+
+class YouTubeSource:
+    """Lädt Videos von YouTube herunter."""
+
+    def __init__(self, download_folder="downloads"):
+        self.download_folder = download_folder
+
+    def fetch(self, url):
+        video_path = pipeline.download_youtube_video(url, self.download_folder)
+        if video_path is None or not os.path.exists(video_path):
+            raise RuntimeError(f"Video konnte nicht heruntergeladen werden: {url}")
+        return video_path
+
+
+class LocalFileSource:
+    """Verwendet lokale Videodateien statt Downloads (z.B. für Tests ohne Netzwerk)."""
+
+    def fetch(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Videodatei nicht gefunden: {path}")
+        return path
+
+
+class BoundedRecognizer(Recognizer):
+    """Begrenzt die gleichzeitigen Anfragen an einen Erkenner über alle Videos hinweg."""
+
+    def __init__(self, recognizer, limit):
+        self.recognizer = recognizer
+        self.language_code = recognizer.language_code
+        self.price_per_minute = recognizer.price_per_minute
+        self.max_segment_seconds = recognizer.max_segment_seconds
+        self.max_in_flight = limit
+        self.billing_increment = recognizer.billing_increment
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def config_key(self):
+        return self.recognizer.config_key()
+
+    def recognize(self, content):
+        with self._slots:
+            return self.recognizer.recognize(content)
+
+
+def read_locations(path):
+    """Liest URLs bzw. Dateipfade zeilenweise; Leerzeilen und # werden ignoriert."""
+    with open(path, "r", encoding="utf-8") as locations_file:
+        return [
+            line.strip()
+            for line in locations_file
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+def _measured(job, *args):
+    # Läuft im Prozesspool: Die Messwerte des Auftrags gehen mit dem Ergebnis
+    # zurück und werden im Hauptprozess zusammengeführt
+    METRICS.reset()
+    return job(*args), METRICS.report()
+
+
+def _extract_job(video_path, pcm_path, sample_rate):
+    # Ton direkt aus dem Video als Roh-PCM auf die Platte
+    decode_audio_pcm(video_path, sample_rate, memmap_path=pcm_path)
+    return pcm_path
+
+
+def _cut_job(video_path, words_with_timestamps, db_path, source_hash):
+    return pipeline.cut_video_by_words(
+        video_path, words_with_timestamps, db_path=db_path, source_hash=source_hash
+    )
+
+
+def _run_in_pool(pool, job, *args):
+    result, report = pool.submit(_measured, job, *args).result()
+    METRICS.merge(report)
+    return result
+
+
+_DONE = object()  # Signalisiert einer Stufe, dass keine Aufträge mehr folgen
+
+
+def run_batch_ingest(
+    locations,
+    source=None,
+    recognizer=None,
+    db_path="word_videos.db",
+    download_workers=4,
+    cpu_workers=None,
+    video_workers=2,
+    recognition_in_flight=None,
+    queue_size=4,
+    verification_mode="local",
+    sample_rate=16000,
+    work_dir="downloads",
+    backend="google",
+    backend_options=None,
+    refine=True,
+    metrics_path="metrics.prom",
+    report_path="run_report.json",
+    metrics_interval=15.0,
+):
+    """
+    Verarbeitet viele Videos als Pipeline mit getrennt begrenzten Stufen:
+    - Download: download_workers Threads (I/O-gebunden),
+    - Tonextraktion und Schneiden: Prozesspool mit cpu_workers Prozessen,
+    - Erkennung: video_workers Videos gleichzeitig, insgesamt höchstens
+      recognition_in_flight laufende Anfragen.
+    Zwischen den Stufen liegen Warteschlangen mit höchstens queue_size
+    Einträgen, so dass der Speicherbedarf unabhängig von der Anzahl der Videos
+    bleibt. Der Ton wird als Roh-PCM-Datei abgelegt und per memmap gelesen.
+    Der Fortschritt jeder Quelle wird pro Stufe im JobTracker festgehalten;
+    ein erneuter Lauf überspringt abgeschlossene Stufen und Quellen.
+    :param source: Quelle der Videos, standardmäßig YouTubeSource; für
+        Offline-Läufe LocalFileSource.
+    :param recognizer: Fertiger Erkenner; sonst wird einer für backend mit
+        backend_options erzeugt und mit dem Transkript-Cache versehen.
+    :param recognition_in_flight: Standardmäßig max_in_flight des Erkenners.
+    :param refine: Wortgrenzen vor dem Schneiden auf Pausen verschieben.
+    :param metrics_path: Prometheus-Datei, die alle metrics_interval Sekunden
+        und am Ende aktualisiert wird; dazu kommt report_path als JSON-Bericht.
+    :return: Dict Ort -> {"clips": Anzahl bestätigter Clips}, {"skipped": True}
+        für bereits fertige Quellen oder {"error": Meldung}.
+    """
+    pipeline.initialize_db(db_path)
+    started = time.perf_counter()
+    METRICS.reset()
+    tracker = JobTracker(db_path)
+    source = source or YouTubeSource(work_dir)
+    if recognizer is None:
+        recognizer = CachingRecognizer(
+            InstrumentedRecognizer(
+                create_recognizer(backend, **(backend_options or {}))
+            ),
+            db_path=db_path,
+        )
+    recognition_in_flight = recognition_in_flight or recognizer.max_in_flight
+    recognizer = BoundedRecognizer(recognizer, recognition_in_flight)
+    cpu_workers = cpu_workers or os.cpu_count() or 1
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+
+    location_queue = queue.Queue()
+    for location in locations:
+        location_queue.put(location)
+    extract_queue = queue.Queue(maxsize=queue_size)
+    recognize_queue = queue.Queue(maxsize=queue_size)
+    results = {}
+    results_lock = threading.Lock()
+    from tqdm import tqdm
+
+    progress = tqdm(total=location_queue.qsize(), unit="Video", desc="Ingest")
+    # Umfang der verarbeiteten Quellen für die Laufhistorie (estimator.py)
+    processed = {"sources": 0, "audio_seconds": 0.0, "words": 0, "clips": 0}
+    heights = set()
+
+    def finish(location, result):
+        with results_lock:
+            results[location] = result
+            progress.update(1)
+            failed = sum(1 for r in results.values() if "error" in r)
+        progress.set_postfix(fehler=failed)
+
+    def fail(location, stage, error):
+        print(f"Fehler bei '{location}' ({stage}): {error}")
+        tracker.fail(location, stage, error)
+        finish(location, {"error": f"{stage}: {error}"})
+
+    def download_worker():
+        while True:
+            try:
+                location = location_queue.get_nowait()
+            except queue.Empty:
+                return
+            if tracker.first_incomplete(location) is None:
+                print(f"'{location}' wurde bereits vollständig verarbeitet.")
+                finish(location, {"skipped": True})
+                continue
+            try:
+                downloaded = tracker.stage(location, "download")
+                if downloaded is not None and hash_file(downloaded[0]) == downloaded[1]:
+                    video_path, source_hash = downloaded
+                else:
+                    video_path = source.fetch(location)
+                    source_hash = hash_file(video_path)
+                    tracker.complete(location, "download", video_path, source_hash)
+            except Exception as e:
+                fail(location, "download", e)
+                continue
+            extract_queue.put((location, video_path, source_hash))
+
+    def extract_worker():
+        while True:
+            item = extract_queue.get()
+            if item is _DONE:
+                return
+            location, video_path, source_hash = item
+            pcm_path = os.path.join(work_dir, f"{source_hash[:16]}.pcm")
+            extracted = tracker.stage(location, "extract")
+            if extracted is None or extracted[0] != pcm_path:
+                try:
+                    _run_in_pool(pool, _extract_job, video_path, pcm_path, sample_rate)
+                    tracker.complete(location, "extract", pcm_path, hash_file(pcm_path))
+                except Exception as e:
+                    fail(location, "extract", e)
+                    continue
+            recognize_queue.put((location, video_path, source_hash, pcm_path))
+
+    def transcribed_segments(location, video_path, samples, failed):
+        # Bereits abgeschlossene Erkennung wird aus der Datenbank gelesen;
+        # Segmente, deren Erkennung fehlschlägt, landen in failed
+        with stage_errors("transcribe"):
+            if tracker.is_done(location, "transcribe"):
+                for segment_id, words in load_occurrences(video_path, db_path):
+                    yield segment_id, words
+                return
+            segments = segment_audio(
+                None,
+                target_length=segment_length(recognizer),
+                overlap=0.5,
+                sample_rate=sample_rate,
+                samples=samples,
+            )
+            all_words = []
+            for segment, words, error in transcribe_segments(
+                segments, recognizer, max_in_flight=recognition_in_flight
+            ):
+                if error is not None:
+                    failed.append(segment.index)
+                    continue
+                record_occurrences(video_path, segment.index, words, db_path)
+                all_words.extend(words)
+                yield segment.index, words
+            # Ein Transkript mit Lücken ist nicht fertig: die Stufe bleibt offen,
+            # damit der nächste Lauf die fehlenden Segmente erneut anfragt
+            if failed:
+                raise RuntimeError(
+                    f"{len(failed)} Segmente konnten nicht erkannt werden"
+                )
+            tracker.complete(
+                location, "transcribe", artifact_hash=hash_values(all_words)
+            )
+
+    def cut_segment(video_path, source_hash, segment_id, refiner):
+        with stage_errors("cut"):
+            words_with_timestamps = plan_cuts(video_path, segment_id, db_path=db_path)
+            if refiner is not None:
+                words_with_timestamps = refiner.refine(words_with_timestamps)
+            # Clipnamen sind deterministisch, Wiederholungen überspringen fertige Clips
+            clips = _run_in_pool(
+                pool, _cut_job, video_path, words_with_timestamps, db_path, source_hash
+            )
+            link_clips(video_path, clips, db_path)
+        return clips
+
+    def process_video(location, video_path, source_hash, pcm_path):
+        # Fehler tragen ihre Stufe (StageError), recognize_worker vermerkt sie
+        # bei genau dieser Stufe und nicht pauschal bei transcribe
+        samples = np.memmap(pcm_path, dtype=np.int16, mode="r")
+        # Ist der Schnitt abgeschlossen, werden nur die ungeprüften Clips geprüft
+        verify_only = tracker.is_done(location, "cut")
+        # Hüllkurven einmal pro Quelle für alle Segmente
+        refiner = (
+            BoundaryRefiner(samples, sample_rate) if refine and not verify_only else None
+        )
+        cut_names = []
+        confirmed = []
+        unverified = 0
+        word_count = 0
+        failed = []
+        pending = dict(linked_clips(video_path, db_path, unverified_only=True))
+        for segment_id, words in transcribed_segments(
+            location, video_path, samples, failed
+        ):
+            word_count += len(words)
+            if verify_only:
+                clips = pending.get(segment_id)
+                if not clips:
+                    continue
+            else:
+                clips = cut_segment(video_path, source_hash, segment_id, refiner)
+                cut_names.extend(file_name for _, file_name, _, _, _ in clips)
+
+            with stage_errors("verify"):
+                if verification_mode == "local":
+                    checked = verify_clips_locally(clips, words, samples, sample_rate)
+                else:
+                    checked = verify_clips_batched(
+                        clips, samples, sample_rate, recognizer
+                    )
+                mark_verified(checked, db_path)
+                for (word, file_name, _, _, _), verified in checked:
+                    if verified is None:
+                        # Anfrage fehlgeschlagen: Clip behalten, später erneut prüfen
+                        unverified += 1
+                    elif verified:
+                        confirmed.append(file_name)
+                    else:
+                        pipeline.discard_faulty_clip(word, file_name, db_path)
+        audio_seconds = len(samples) / sample_rate
+        del samples, refiner
+        if not verify_only:
+            tracker.complete(
+                location, "cut", artifact_hash=hash_values(sorted(cut_names))
+            )
+        if unverified:
+            tracker.fail(
+                location, "verify", f"{unverified} Clips konnten nicht geprüft werden"
+            )
+        else:
+            tracker.complete(
+                location, "verify", artifact_hash=hash_values(sorted(confirmed))
+            )
+        try:
+            height = probe_media(video_path).height
+        except Exception as e:
+            # Nur für die Laufhistorie; die Stufen sind bereits abgeschlossen
+            print(f"Auflösung von '{video_path}' unbekannt: {e}")
+            height = None
+        with results_lock:
+            processed["sources"] += 1
+            processed["audio_seconds"] += audio_seconds
+            processed["words"] += word_count
+            processed["clips"] += len(cut_names)
+            if height is not None:
+                heights.add(height)
+        return len(confirmed)
+
+    def recognize_worker():
+        while True:
+            item = recognize_queue.get()
+            if item is _DONE:
+                return
+            location, video_path, source_hash, pcm_path = item
+            try:
+                confirmed = process_video(location, video_path, source_hash, pcm_path)
+                print(f"'{location}' verarbeitet: {confirmed} Clips bestätigt.")
+                finish(location, {"clips": confirmed})
+            except StageError as e:
+                fail(location, e.stage, e.error)
+                continue
+            except Exception as e:
+                # Nicht zugeordnete Fehler gehören zur ersten offenen Stufe
+                fail(location, tracker.first_incomplete(location) or "verify", e)
+                continue
+            # Das PCM wird nur für unvollständige Läufe aufbewahrt
+            if os.path.exists(pcm_path):
+                os.remove(pcm_path)
+
+    def start(target, count):
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def export_metrics():
+        try:
+            METRICS.write_prometheus(metrics_path)
+        except Exception as e:
+            print(f"Fehler beim Schreiben der Messwerte: {e}")
+
+    # Zwischenstände für Prometheus, während der Lauf noch andauert
+    stop_export = threading.Event()
+
+    def export_worker():
+        while not stop_export.wait(metrics_interval):
+            export_metrics()
+
+    exporter = threading.Thread(target=export_worker, daemon=True)
+    exporter.start()
+
+    # spawn statt fork: SQLite-Verbindungen dürfen nicht vererbt werden
+    with ProcessPoolExecutor(
+        max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        downloaders = start(download_worker, download_workers)
+        extractors = start(extract_worker, cpu_workers)
+        recognizers = start(recognize_worker, video_workers)
+
+        for thread in downloaders:
+            thread.join()
+        for _ in extractors:
+            extract_queue.put(_DONE)
+        for thread in extractors:
+            thread.join()
+        for _ in recognizers:
+            recognize_queue.put(_DONE)
+        for thread in recognizers:
+            thread.join()
+
+    stop_export.set()
+    exporter.join()
+    progress.close()
+    export_metrics()
+    if processed["sources"]:
+        RunHistory(db_path).record(
+            METRICS.report(),
+            audio_seconds=processed["audio_seconds"],
+            words=processed["words"],
+            wall_seconds=time.perf_counter() - started,
+            clips=processed["clips"],
+            sources=processed["sources"],
+            workers=min(video_workers, processed["sources"]),
+            height=heights.pop() if len(heights) == 1 else None,
+            backend=backend,
+            price_per_minute=recognizer.price_per_minute,
+        )
+    try:
+        METRICS.write_report(report_path)
+    except Exception as e:
+        print(f"Fehler beim Schreiben des Laufberichts: {e}")
+    return results
+
+
+def run_from_args(args):
+    results = run_batch_ingest(
+        read_locations(args.locations),
+        source=LocalFileSource() if args.local else None,
+        download_workers=args.download_workers,
+        cpu_workers=args.cpu_workers,
+        video_workers=args.video_workers,
+        recognition_in_flight=args.recognition_in_flight,
+        verification_mode=args.verification,
+        backend=args.backend,
+        backend_options=backend_options_from_args(args),
+    )
+    failed = [location for location, result in results.items() if "error" in result]
+    print(f"{len(results) - len(failed)} Videos verarbeitet, {len(failed)} fehlgeschlagen.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Viele Videos in einem Lauf verarbeiten")
+    add_ingest_arguments(parser)
+    run_from_args(parser.parse_args())
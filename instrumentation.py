@@ -0,0 +1,321 @@
+import functools
+import inspect
+import json
+import math
+import os
+import subprocess
+import threading
+import time
+
+from recognizers import Recognizer, wav_duration
+
+
+class Metrics:
+    """
+    Sammelt pro Stufe Aufrufe, Fehler, Laufzeit und geschriebene Bytes sowie
+    gestartete Prozesse und Erkenneraufrufe eines Laufs. Jede Messung kostet
+    nur einen Zeitstempel und eine kurze Sperre und kann daher immer aktiv
+    bleiben.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.subprocesses = {}
+            self.recognizer = {
+                "calls": 0,
+                "errors": 0,
+                "audio_seconds": 0.0,
+                "billed_seconds": 0.0,
+            }
+
+    def _stage(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {
+                "calls": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "max_seconds": 0.0,
+                "items": 0,
+                "bytes": 0,
+            }
+        return entry
+
+    def observe(self, stage, seconds, error=False, items=0, bytes_written=0):
+        with self._lock:
+            entry = self._stage(stage)
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["items"] += items
+            entry["bytes"] += bytes_written
+
+    def count_subprocess(self, program):
+        with self._lock:
+            self.subprocesses[program] = self.subprocesses.get(program, 0) + 1
+
+    def observe_recognition(self, audio_seconds, billed_seconds, error=False):
+        with self._lock:
+            self.recognizer["calls"] += 1
+            self.recognizer["errors"] += int(error)
+            self.recognizer["audio_seconds"] += audio_seconds
+            self.recognizer["billed_seconds"] += billed_seconds
+
+    def merge(self, report):
+        """
+        Übernimmt die Messwerte eines anderen Prozesses (z.B. eines Auftrags
+        im Prozesspool), geliefert als report().
+        """
+        with self._lock:
+            for stage, other in report["stages"].items():
+                entry = self._stage(stage)
+                for field in ("calls", "errors", "seconds", "items", "bytes"):
+                    entry[field] += other[field]
+                entry["max_seconds"] = max(entry["max_seconds"], other["max_seconds"])
+            for program, count in report["subprocesses"].items():
+                self.subprocesses[program] = self.subprocesses.get(program, 0) + count
+            for field, value in report["recognizer"].items():
+                self.recognizer[field] += value
+
+    def report(self):
+        """Alle Messwerte als Dict (Grundlage für JSON- und Prometheus-Export)."""
+        with self._lock:
+            stages = {}
+            for stage, entry in self.stages.items():
+                stages[stage] = dict(entry)
+                stages[stage]["error_rate"] = (
+                    entry["errors"] / entry["calls"] if entry["calls"] else 0.0
+                )
+            return {
+                "started": self.started,
+                "duration_seconds": time.time() - self.started,
+                "stages": stages,
+                "subprocesses": dict(self.subprocesses),
+                "recognizer": dict(self.recognizer),
+            }
+
+    def write_report(self, path="run_report.json"):
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+    def prometheus_text(self, prefix="wordvideo"):
+        """Messwerte im Textformat von Prometheus (z.B. für den node_exporter)."""
+        report = self.report()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+        stages = report["stages"]
+        for field, kind, help_text in (
+            ("calls", "counter", "Aufrufe pro Stufe"),
+            ("errors", "counter", "Fehlgeschlagene Aufrufe pro Stufe"),
+            ("seconds", "counter", "Laufzeit pro Stufe in Sekunden"),
+            ("max_seconds", "gauge", "Längster Aufruf pro Stufe in Sekunden"),
+            ("items", "counter", "Verarbeitete Elemente pro Stufe"),
+            ("bytes", "counter", "Geschriebene Bytes pro Stufe"),
+        ):
+            name = f"stage_{field}" + ("_total" if kind == "counter" else "")
+            metric(
+                name,
+                kind,
+                help_text,
+                [({"stage": stage}, entry[field]) for stage, entry in sorted(stages.items())],
+            )
+        metric(
+            "subprocesses_total",
+            "counter",
+            "Gestartete Prozesse nach Programm",
+            [({"program": p}, n) for p, n in sorted(report["subprocesses"].items())],
+        )
+        for field, help_text in (
+            ("calls", "Aufrufe des Erkenners"),
+            ("errors", "Fehlgeschlagene Aufrufe des Erkenners"),
+            ("audio_seconds", "An den Erkenner geschickte Sekunden Audio"),
+            ("billed_seconds", "Abgerechnete Sekunden Audio"),
+        ):
+            metric(
+                f"recognizer_{field}_total",
+                "counter",
+                help_text,
+                [({}, report["recognizer"][field])],
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path="metrics.prom"):
+        # Erst vollständig schreiben, dann umbenennen: Leser sehen nie eine halbe Datei
+        partial_path = path + ".part"
+        with open(partial_path, "w", encoding="utf-8") as prom_file:
+            prom_file.write(self.prometheus_text())
+        os.replace(partial_path, path)
+
+
+# Gemeinsame Messwerte des Prozesses
+METRICS = Metrics()
+
+
+class _TimedInput:
+    """Iterator, der die Zeit zum Holen der Elemente eines Eingabestroms summiert."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def timed(stage, items=None, output_bytes=None, upstream=None):
+    """
+    Dekorator, der jeden Aufruf einer Funktion als Stufe stage misst.
+    Bei Generatoren wird nur die Zeit im Generator gezählt, nicht die Zeit
+    des Verbrauchers zwischen zwei Elementen; items zählt dann die
+    gelieferten Elemente.
+    :param items: Optional Funktion Ergebnis -> Anzahl verarbeiteter Elemente.
+    :param output_bytes: Optional Funktion Ergebnis -> geschriebene Bytes.
+    :param upstream: Optional Name des Parameters, über den ein Generator
+        seine Eingabe als Strom bekommt (z.B. "chunks"). Die Zeit, die das
+        Holen daraus kostet, gehört der vorgelagerten Stufe und wird abgezogen.
+    """
+
+    def decorate(function):
+        if inspect.isgeneratorfunction(function):
+            signature = inspect.signature(function)
+
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                source = None
+                if upstream is not None:
+                    bound = signature.bind(*args, **kwargs)
+                    source = _TimedInput(bound.arguments[upstream])
+                    bound.arguments[upstream] = source
+                    args, kwargs = bound.args, bound.kwargs
+                generator = function(*args, **kwargs)
+                seconds = 0.0
+                count = 0
+                error = False
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            seconds += time.perf_counter() - started
+                        count += 1
+                        yield item
+                except GeneratorExit:
+                    generator.close()
+                    raise
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    if source is not None:
+                        seconds = max(0.0, seconds - source.seconds)
+                    METRICS.observe(stage, seconds, error, items=count)
+
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                METRICS.observe(stage, time.perf_counter() - started, error=True)
+                raise
+            seconds = time.perf_counter() - started
+            try:
+                count = items(result) if items else 0
+                written = output_bytes(result) if output_bytes else 0
+            except Exception:
+                count, written = 0, 0
+            METRICS.observe(stage, seconds, items=count, bytes_written=written)
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def file_bytes(path):
+    """Größe einer Ergebnisdatei (0, wenn es keine gibt)."""
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+class InstrumentedRecognizer(Recognizer):
+    """
+    Misst die Aufrufe eines Erkenners: Anzahl, Fehler, Sekunden Audio und
+    abgerechnete Sekunden (pro Anfrage auf billing_increment aufgerundet).
+    Gehört unter den Transkript-Cache, damit Treffer nicht mitzählen.
+    """
+
+    def __init__(self, recognizer, metrics=None):
+        self.recognizer = recognizer
+        self.metrics = metrics or METRICS
+        self.language_code = recognizer.language_code
+        self.price_per_minute = recognizer.price_per_minute
+        self.max_segment_seconds = recognizer.max_segment_seconds
+        self.max_in_flight = recognizer.max_in_flight
+        self.billing_increment = recognizer.billing_increment
+
+    def config_key(self):
+        return self.recognizer.config_key()
+
+    def recognize(self, content):
+        duration = wav_duration(content)
+        billed = 0.0
+        if self.price_per_minute and self.billing_increment:
+            billed = math.ceil(duration / self.billing_increment) * self.billing_increment
+        started = time.perf_counter()
+        try:
+            words = self.recognizer.recognize(content)
+        except Exception:
+            # Fehlgeschlagene Anfragen werden nicht abgerechnet
+            self.metrics.observe_recognition(duration, 0.0, error=True)
+            self.metrics.observe("recognize", time.perf_counter() - started, error=True)
+            raise
+        self.metrics.observe_recognition(duration, billed)
+        self.metrics.observe("recognize", time.perf_counter() - started, items=len(words))
+        return words
+
+
+def _program_name(command):
+    program = command if isinstance(command, str) else (command[0] if command else "")
+    name = str(program).split()[0] if program else ""
+    return os.path.basename(name)
+
+
+def run_tool(command, **kwargs):
+    """
+    Startet ein externes Werkzeug (ffmpeg, ffprobe, ...) wie subprocess.run
+    und zählt den Prozess nach Programmname in METRICS.
+    """
+    METRICS.count_subprocess(_program_name(command))
+    return subprocess.run(command, **kwargs)
+
+
+def popen_tool(command, **kwargs):
+    """Wie run_tool, aber für Werkzeuge, die als Pipe weiterlaufen (subprocess.Popen)."""
+    METRICS.count_subprocess(_program_name(command))
+    return subprocess.Popen(command, **kwargs)
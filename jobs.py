@@ -0,0 +1,144 @@
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from storage import get_repository
+
+
+# Stufen einer Quelle in Verarbeitungsreihenfolge
+STAGES = ["download", "extract", "transcribe", "cut", "verify"]
+
+
+class StageError(Exception):
+    """Fehler, der einer Stufe aus STAGES zugeordnet ist."""
+
+    def __init__(self, stage, error):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+
+@contextmanager
+def stage_errors(stage):
+    """
+    Versieht Fehler im Block mit ihrer Stufe (StageError), damit der Aufrufer
+    JobTracker.fail für die richtige Stufe aufruft. Bereits zugeordnete
+    Fehler bleiben unverändert.
+    """
+    try:
+        yield
+    except StageError:
+        raise
+    except Exception as e:
+        raise StageError(stage, e) from e
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 des Dateiinhalts (blockweise gelesen)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_values(values):
+    """SHA-256 über eine Folge von Werten, z.B. die Namen der erzeugten Clips."""
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(repr(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class JobTracker:
+    """
+    Hält den Fortschritt jeder Quelle (URL oder Datei) durch die Stufen in
+    STAGES in der Tabelle job_stages fest, jeweils mit dem Hash des
+    erzeugten Artefakts. Ein erneuter Lauf setzt bei der ersten
+    unvollständigen Stufe wieder ein.
+    """
+
+    def __init__(self, db_path="word_videos.db"):
+        self.repository = get_repository(db_path)
+
+    def stage(self, location, stage):
+        """
+        Gibt (artifact_path, artifact_hash) einer abgeschlossenen Stufe zurück,
+        sonst None. Eine Stufe, deren Artefaktdatei fehlt, gilt als unvollständig.
+        """
+        row = (
+            self.repository.connection()
+            .execute(
+                """
+                SELECT artifact_path, artifact_hash FROM job_stages
+                WHERE location = ? AND stage = ? AND status = 'done'
+            """,
+                (location, stage),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        if row[0] is not None and not os.path.exists(row[0]):
+            return None
+        return row
+
+    def is_done(self, location, stage):
+        return self.stage(location, stage) is not None
+
+    def first_incomplete(self, location):
+        """
+        Name der Stufe nach der letzten abgeschlossenen, bzw. None, wenn alles
+        fertig ist. Fehlende Artefakte früherer Stufen (z.B. gelöschtes PCM)
+        spielen hier keine Rolle.
+        """
+        done = {
+            row[0]
+            for row in self.repository.connection().execute(
+                "SELECT stage FROM job_stages WHERE location = ? AND status = 'done'",
+                (location,),
+            )
+        }
+        for index in range(len(STAGES) - 1, -1, -1):
+            if STAGES[index] in done:
+                return STAGES[index + 1] if index + 1 < len(STAGES) else None
+        return STAGES[0]
+
+    def complete(self, location, stage, artifact_path=None, artifact_hash=None):
+        """
+        Markiert eine Stufe als abgeschlossen. Hat sich ihr Artefakt gegenüber
+        einem früheren Lauf geändert, werden alle späteren Stufen zurückgesetzt.
+        """
+        with self.repository.transaction() as conn:
+            row = conn.execute(
+                "SELECT artifact_hash FROM job_stages WHERE location = ? AND stage = ?",
+                (location, stage),
+            ).fetchone()
+            if row is not None and row[0] is not None and row[0] != artifact_hash:
+                conn.executemany(
+                    "DELETE FROM job_stages WHERE location = ? AND stage = ?",
+                    [(location, later) for later in STAGES[STAGES.index(stage) + 1 :]],
+                )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO job_stages
+                    (location, stage, status, artifact_path, artifact_hash, error, updated)
+                VALUES (?, ?, 'done', ?, ?, NULL, ?)
+            """,
+                (location, stage, artifact_path, artifact_hash, time.time()),
+            )
+
+    def fail(self, location, stage, error):
+        """Vermerkt den Fehler einer Stufe (die Stufe bleibt unvollständig)."""
+        with self.repository.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO job_stages (location, stage, status, error, updated)
+                VALUES (?, ?, 'failed', ?, ?)
+                ON CONFLICT (location, stage) DO UPDATE SET
+                    status = 'failed', error = excluded.error, updated = excluded.updated
+            """,
+                (location, stage, str(error), time.time()),
+            )
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import threading
+
+from instrumentation import run_tool, timed
+
+
+class MediaInfo:
+    """
+    Ergebnis eines einzigen ffprobe-Aufrufs über Container und alle Streams
+    einer Datei. Über probe_media abgefragt, wird jede Datei pro
+    (Pfad, Änderungszeit, Größe) nur einmal untersucht.
+    """
+
+    def __init__(self, path, probe):
+        self.path = path
+        self.streams = probe.get("streams", [])
+        self.format = probe.get("format", {})
+        self.audio = next(
+            (s for s in self.streams if s.get("codec_type") == "audio"), None
+        )
+        self.video = next(
+            (s for s in self.streams if s.get("codec_type") == "video"), None
+        )
+
+    @property
+    def duration(self):
+        """Dauer in Sekunden (None, wenn unbekannt)."""
+        duration = self.format.get("duration")
+        return float(duration) if duration is not None else None
+
+    @property
+    def has_audio(self):
+        return self.audio is not None
+
+    @property
+    def audio_channels(self):
+        return int(self.audio["channels"]) if self.audio else None
+
+    @property
+    def audio_sample_rate(self):
+        return int(self.audio["sample_rate"]) if self.audio else None
+
+    @property
+    def height(self):
+        """Bildhöhe in Pixeln (None ohne Videospur)."""
+        return int(self.video["height"]) if self.video and "height" in self.video else None
+
+    @property
+    def video_codec(self):
+        return self.video.get("codec_name") if self.video else None
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+@timed("probe")
+def probe_media(path):
+    """
+    Liefert die MediaInfo einer Datei; wiederholte Abfragen derselben,
+    unveränderten Datei kommen aus dem Speicher.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    with _cache_lock:
+        info = _cache.get(key)
+    if info is not None:
+        return info
+
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_streams",
+        "-show_format",
+        "-of",
+        "json",
+        path,
+    ]
+    result = run_tool(command, stdout=subprocess.PIPE, text=True, check=True)
+    info = MediaInfo(path, json.loads(result.stdout))
+    with _cache_lock:
+        _cache[key] = info
+    return info
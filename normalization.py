@@ -0,0 +1,261 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from instrumentation import run_tool
+from storage import get_repository
+
+
+# Einheitliches Clipformat, in das alle Clips bei Bedarf umkodiert werden
+CANONICAL_PROFILE = {
+    "width": 1280,
+    "height": 720,
+    "fps": 30,
+    "pix_fmt": "yuv420p",
+    "sample_rate": 48000,
+    "channels": 2,
+    "crf": 20,
+}
+
+
+def profile_name(profile):
+    """Kurzer, eindeutiger Name eines Profils, z.B. "1280x720_30fps_48000hz_2ch"."""
+    return (
+        f"{profile['width']}x{profile['height']}_{profile['fps']}fps_"
+        f"{profile['sample_rate']}hz_{profile['channels']}ch"
+    )
+
+
+def has_audio_stream(video_path):
+    """Prüft per ffprobe, ob die Datei eine Tonspur enthält."""
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a",
+        "-show_entries",
+        "stream=index",
+        "-of",
+        "csv=p=0",
+        video_path,
+    ]
+    result = run_tool(command, stdout=subprocess.PIPE, text=True)
+    return bool(result.stdout.strip())
+
+
+def transcode_to_profile(video_path, profile, output_path):
+    """
+    Kodiert einen Clip in das Profil um. Alle Ausgaben eines Profils haben
+    identische Stream-Parameter und lassen sich ohne Neukodierung verketten.
+    Clips ohne Ton erhalten eine stille Tonspur.
+    """
+    width, height = profile["width"], profile["height"]
+    layout = "mono" if profile["channels"] == 1 else "stereo"
+    video_filter = (
+        f"[0:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+        f"fps={profile['fps']},format={profile['pix_fmt']}[v]"
+    )
+    command = ["ffmpeg", "-v", "error", "-y", "-i", video_path]
+    if has_audio_stream(video_path):
+        audio_filter = f"[0:a]aresample={profile['sample_rate']}[a]"
+    else:
+        command += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=r={profile['sample_rate']}:cl={layout}",
+            "-shortest",
+        ]
+        audio_filter = "[1:a]anull[a]"
+    command += [
+        "-filter_complex",
+        f"{video_filter};{audio_filter}",
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        "-c:v",
+        "libx264",
+        "-profile:v",
+        "high",
+        "-crf",
+        str(profile["crf"]),
+        "-c:a",
+        "aac",
+        "-ac",
+        str(profile["channels"]),
+        "-video_track_timescale",
+        str(profile["fps"] * 512),
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+    run_tool(command, check=True)
+
+
+class NormalizedClipCache:
+    """
+    Verzeichnis der normalisierten Clipvarianten mit Größenlimit.
+    Varianten liegen unter cache_dir/<Profil>/ und sind in der Tabelle
+    normalized_clips erfasst; wird max_bytes überschritten, werden die am
+    längsten nicht benutzten Varianten gelöscht.
+    """
+
+    def __init__(
+        self,
+        cache_dir="normalized",
+        max_bytes=2 * 1024 * 1024 * 1024,
+        profile=CANONICAL_PROFILE,
+        db_path="word_videos.db",
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.profile = profile
+        self.repository = get_repository(db_path)
+        self._lock = threading.Lock()
+
+    def get(self, video_path):
+        """
+        Liefert den Pfad der normalisierten Variante eines Clips und erzeugt
+        sie, falls sie fehlt oder die Quelle sich seitdem geändert hat
+        (Änderungszeit oder Größe).
+        """
+        name = profile_name(self.profile)
+        source = os.stat(video_path)
+        conn = self.repository.connection()
+        row = conn.execute(
+            """
+            SELECT path, source_mtime_ns, source_size FROM normalized_clips
+            WHERE source_path = ? AND profile = ?
+        """,
+            (video_path, name),
+        ).fetchone()
+        if (
+            row is not None
+            and row[1:] == (source.st_mtime_ns, source.st_size)
+            and os.path.exists(row[0])
+        ):
+            with self.repository.transaction() as conn:
+                conn.execute(
+                    """
+                    UPDATE normalized_clips SET last_used = ?
+                    WHERE source_path = ? AND profile = ?
+                """,
+                    (time.time(), video_path, name),
+                )
+            return row[0]
+
+        profile_dir = os.path.join(self.cache_dir, name)
+        if not os.path.exists(profile_dir):
+            os.makedirs(profile_dir, exist_ok=True)
+        # Der Stand der Quelle gehört zum Namen: eine neue Fassung überschreibt
+        # nicht die Datei, die ein anderer Prozess gerade noch liest
+        identity = (
+            f"{os.path.abspath(video_path)}\0{source.st_mtime_ns}\0{source.st_size}"
+        )
+        digest = hashlib.sha1(identity.encode("utf-8")).hexdigest()
+        output_path = os.path.join(profile_dir, f"{digest}.mp4")
+        # Eindeutige temporäre Datei pro Aufruf: normalisieren zwei Prozesse
+        # denselben Clip, schreibt jeder in seine eigene Datei
+        fd, tmp_path = tempfile.mkstemp(dir=profile_dir, suffix=".tmp.mp4")
+        os.close(fd)
+        try:
+            transcode_to_profile(video_path, self.profile, tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.repository.transaction() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO normalized_clips
+                    (source_path, profile, path, size_bytes, last_used,
+                     source_mtime_ns, source_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    video_path,
+                    name,
+                    output_path,
+                    os.path.getsize(output_path),
+                    time.time(),
+                    source.st_mtime_ns,
+                    source.st_size,
+                ),
+            )
+        if row is not None and row[0] != output_path and os.path.exists(row[0]):
+            # Veraltete Variante der früheren Fassung
+            os.remove(row[0])
+        self.evict()
+        return output_path
+
+    def evict(self):
+        """
+        Löscht die ältesten Varianten, bis der Cache unter max_bytes liegt,
+        und nimmt bei den betroffenen Clips das Profil in videos zurück.
+        """
+        with self._lock, self.repository.transaction() as conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size_bytes), 0) FROM normalized_clips"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for source_path, profile, path, size_bytes in conn.execute(
+                """
+                SELECT source_path, profile, path, size_bytes
+                FROM normalized_clips ORDER BY last_used
+            """
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if os.path.exists(path):
+                    os.remove(path)
+                evicted.append((source_path, profile))
+                total -= size_bytes
+            conn.executemany(
+                "DELETE FROM normalized_clips WHERE source_path = ? AND profile = ?",
+                evicted,
+            )
+            # Clips liegen unter ihrem Dateinamen in der Ablage (clip_store.py)
+            conn.executemany(
+                "UPDATE videos SET profile = NULL WHERE file_name = ? AND profile = ?",
+                [
+                    (os.path.basename(source_path), profile)
+                    for source_path, profile in evicted
+                ],
+            )
+
+
+def normalize_clips(clips, cache, db_path="word_videos.db"):
+    """
+    Normalisierungsstufe nach cut_video_by_words: kodiert die neuen Clips
+    einmal in das Profil des Caches und vermerkt das Profil in videos.
+    :param clips: Liste von (word, file_name, path, start_time, end_time).
+    """
+    name = profile_name(cache.profile)
+    normalized = []
+    for word, file_name, path, _, _ in clips:
+        try:
+            cache.get(path)
+            normalized.append((name, word, file_name, path, name))
+        except Exception as e:
+            print(f"Fehler beim Normalisieren des Videos '{path}': {e}")
+    # Nur Clips, deren Variante nicht schon wieder verdrängt wurde
+    with get_repository(db_path).transaction() as conn:
+        conn.executemany(
+            """
+            UPDATE videos SET profile = ? WHERE word = ? AND file_name = ?
+                AND EXISTS (
+                    SELECT 1 FROM normalized_clips WHERE source_path = ? AND profile = ?
+                )
+        """,
+            normalized,
+        )
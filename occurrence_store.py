@@ -0,0 +1,314 @@
+import numpy as np
+
+from clip_store import CLIP_ROOT, clip_path
+from recognizers import RecognizedWord
+from storage import get_repository
+
+CLIPS_PER_WORD = 3  # Nutzbare Clips, die die Pipeline pro Wort vorab schneidet
+
+
+def record_occurrences(source, segment_id, words, db_path="word_videos.db"):
+    """
+    Speichert alle erkannten Vorkommen eines Segments in der Tabelle occurrences.
+    Bereits gespeicherte Vorkommen (gleiche Quelle, Wort und Zeiten) werden übersprungen.
+    :param words: Liste von RecognizedWord mit absoluten Zeitstempeln.
+    """
+    with get_repository(db_path).transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO occurrences
+                (source, word, start_time, end_time, confidence, segment_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            [
+                (source, w.word, w.start_time, w.end_time, w.confidence, segment_id)
+                for w in words
+            ],
+        )
+
+
+def load_occurrences(source, db_path="word_videos.db"):
+    """
+    Lädt die gespeicherten Vorkommen einer Quelle, gruppiert nach Segment.
+    :return: Liste von (segment_id, Liste von RecognizedWord), nach Segment sortiert.
+    """
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            """
+            SELECT segment_id, word, start_time, end_time, confidence FROM occurrences
+            WHERE source = ? ORDER BY segment_id, start_time
+        """,
+            (source,),
+        )
+        .fetchall()
+    )
+    segments = {}
+    for segment_id, word, start_time, end_time, confidence in rows:
+        segments.setdefault(segment_id, []).append(
+            RecognizedWord(word, start_time, end_time, confidence)
+        )
+    return sorted(segments.items())
+
+
+def link_clips(source, clips, db_path="word_videos.db"):
+    """
+    Verknüpft geschnittene Clips mit ihren Vorkommen. Zugeordnet wird über
+    die ursprünglichen Zeiten des Erkenners in videos, nicht über die
+    (eventuell verfeinerten) Schnittzeiten der Clips.
+    :param clips: Liste von (word, file_name, path, start_time, end_time).
+    """
+    with get_repository(db_path).transaction() as conn:
+        conn.executemany(
+            """
+            UPDATE occurrences SET video_id = (
+                SELECT id FROM videos WHERE word = ? AND file_name = ?
+            )
+            WHERE source = ? AND word = ? AND (start_time, end_time) = (
+                SELECT start_time, end_time FROM videos WHERE word = ? AND file_name = ?
+            )
+        """,
+            [
+                (word, file_name, source, word, word, file_name)
+                for word, file_name, _, _, _ in clips
+            ],
+        )
+
+
+def linked_clips(
+    source, db_path="word_videos.db", clip_root=CLIP_ROOT, unverified_only=False
+):
+    """
+    Liefert die geschnittenen Clips einer Quelle, gruppiert nach Segment.
+    Als fehlerhaft geprüfte Clips (ohne Datei) fehlen.
+    :param unverified_only: Nur die noch ungeprüften Clips, z.B. um eine
+        abgebrochene Prüfung fortzusetzen.
+    :return: Liste von (segment_id, Liste von (word, file_name, path,
+        start_time, end_time)) mit den Schnittzeiten, nach Segment sortiert.
+    """
+    verified = "v.verified IS NULL" if unverified_only else "COALESCE(v.verified, 1) != 0"
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            f"""
+            SELECT DISTINCT o.segment_id, v.word, v.file_name,
+                COALESCE(v.refined_start, v.start_time),
+                COALESCE(v.refined_end, v.end_time)
+            FROM occurrences o JOIN videos v ON v.id = o.video_id
+            WHERE o.source = ? AND {verified} ORDER BY o.segment_id, v.start_time
+        """,
+            (source,),
+        )
+        .fetchall()
+    )
+    segments = {}
+    for segment_id, word, file_name, start_time, end_time in rows:
+        segments.setdefault(segment_id, []).append(
+            (word, file_name, clip_path(file_name, clip_root), start_time, end_time)
+        )
+    return sorted(segments.items())
+
+
+def usable_clip_counts(words, db_path="word_videos.db"):
+    """
+    Anzahl der nutzbaren Clips (nicht als fehlerhaft geprüft, nicht schlecht
+    bewertet) pro Wort.
+    :return: Dict Wort -> Anzahl; Wörter ohne Clip fehlen.
+    """
+    words = list(words)
+    if not words:
+        return {}
+    placeholders = ", ".join("?" * len(words))
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            f"""
+            SELECT word, COUNT(*) FROM videos
+            WHERE word IN ({placeholders})
+                AND COALESCE(verified, 1) != 0 AND rated != 0
+            GROUP BY word
+        """,
+            words,
+        )
+        .fetchall()
+    )
+    return dict(rows)
+
+
+def plan_cuts(source, segment_id, clips_per_word=CLIPS_PER_WORD, db_path="word_videos.db"):
+    """
+    Wählt die Vorkommen eines Segments, die die Pipeline schneidet: bereits
+    geschnittene bleiben dabei (Wiederholungen sind idempotent), dazu pro Wort
+    die besten offenen Vorkommen nach OccurrenceStore.best_candidates, bis das
+    Wort clips_per_word nutzbare Clips hat. Alle übrigen Vorkommen schneidet
+    erst cut_candidates, wenn sie gebraucht werden.
+    Die Vorkommen müssen mit record_occurrences gespeichert sein.
+    :return: Liste von (word, start_time, end_time).
+    """
+    store = OccurrenceStore.load(db_path, source=source, segment_id=segment_id)
+    counts = usable_clip_counts(store.vocabulary, db_path)
+    planned = []
+    for word in store.vocabulary:
+        candidates = store.best_candidates(word, store.count(word))
+        needed = max(0, clips_per_word - counts.get(word, 0))
+        cut = [c for c in candidates if c["video_id"] is not None]
+        fresh = [c for c in candidates if c["video_id"] is None][:needed]
+        planned.extend((word, c["start_time"], c["end_time"]) for c in cut + fresh)
+    return planned
+
+
+class OccurrenceStore:
+    """
+    Alle Wortvorkommen spaltenweise in NumPy-Arrays, nach Wort gruppiert.
+    Die Vorkommen von Wort w liegen in den Zeilen offsets[w]:offsets[w + 1];
+    Abfragen wie "beste N Kandidaten für ein Wort" sind damit reine
+    Array-Operationen auf einem zusammenhängenden Ausschnitt.
+    """
+
+    def __init__(self, db_path="word_videos.db", source=None, segment_id=None):
+        self.db_path = db_path
+        # Optional nur die Vorkommen einer Quelle bzw. eines Segments
+        self.source = source
+        self.segment_id = segment_id
+        self.vocabulary = []  # word_id -> Wort
+        self.word_ids = {}  # Wort -> word_id
+        self.sources = []  # source_id -> Quelle
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.source_ids = np.zeros(0, dtype=np.int32)
+        self.start = np.zeros(0, dtype=np.float64)
+        self.end = np.zeros(0, dtype=np.float64)
+        self.confidence = np.zeros(0, dtype=np.float32)
+        self.segment_ids = np.zeros(0, dtype=np.int32)
+        self.video_ids = np.zeros(0, dtype=np.int64)  # 0 = noch nicht geschnitten
+        self.faulty = np.zeros(0, dtype=bool)  # Clip als fehlerhaft geprüft
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def load(cls, db_path="word_videos.db", source=None, segment_id=None):
+        """Lädt alle Vorkommen (bzw. die einer Quelle oder eines Segments) aus der Datenbank."""
+        store = cls(db_path, source, segment_id)
+        store.reload()
+        return store
+
+    def reload(self):
+        conditions, params = [], []
+        if self.source is not None:
+            conditions.append("o.source = ?")
+            params.append(self.source)
+        if self.segment_id is not None:
+            conditions.append("o.segment_id = ?")
+            params.append(self.segment_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Verweise auf inzwischen gelöschte Clips gelten als nicht geschnitten
+        rows = (
+            get_repository(self.db_path)
+            .connection()
+            .execute(
+                f"""
+                SELECT o.id, o.source, o.word, o.start_time, o.end_time, o.confidence,
+                    o.segment_id, v.id, v.verified = 0
+                FROM occurrences o LEFT JOIN videos v ON v.id = o.video_id
+                {where} ORDER BY o.word, o.id
+            """,
+                params,
+            )
+            .fetchall()
+        )
+        self.vocabulary = []
+        self.word_ids = {}
+        self.sources = []
+        source_index = {}
+        word_column = np.empty(len(rows), dtype=np.int32)
+        source_column = np.empty(len(rows), dtype=np.int32)
+        for i, row in enumerate(rows):
+            word, source = row[2], row[1]
+            if word not in self.word_ids:
+                self.word_ids[word] = len(self.vocabulary)
+                self.vocabulary.append(word)
+            if source not in source_index:
+                source_index[source] = len(self.sources)
+                self.sources.append(source)
+            word_column[i] = self.word_ids[word]
+            source_column[i] = source_index[source]
+
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        self.source_ids = source_column
+        self.start = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+        self.end = np.fromiter((r[4] for r in rows), dtype=np.float64, count=len(rows))
+        self.confidence = np.fromiter(
+            (np.nan if r[5] is None else r[5] for r in rows),
+            dtype=np.float32,
+            count=len(rows),
+        )
+        self.segment_ids = np.fromiter(
+            (r[6] or 0 for r in rows), dtype=np.int32, count=len(rows)
+        )
+        self.video_ids = np.fromiter(
+            (r[7] or 0 for r in rows), dtype=np.int64, count=len(rows)
+        )
+        self.faulty = np.fromiter(
+            (bool(r[8]) for r in rows), dtype=bool, count=len(rows)
+        )
+        # Zeilen sind nach Wort sortiert, Grenzen per Zählung bestimmen
+        counts = np.bincount(word_column, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self, word):
+        """Anzahl der Vorkommen eines Wortes."""
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return 0
+        return int(self.offsets[word_id + 1] - self.offsets[word_id])
+
+    def best_candidates(self, word, n=5, ideal_duration=None, min_confidence=0.0):
+        """
+        Die n besten Vorkommen eines Wortes, absteigend nach Bewertung.
+        Bewertet wird die Konfidenz (fehlend = 0.5), abzüglich der Abweichung
+        der Dauer von ideal_duration, falls angegeben. Vorkommen, deren Clip
+        als fehlerhaft geprüft ist, scheiden aus.
+        :return: Liste von Dicts mit id, source, start_time, end_time,
+            confidence, segment_id und video_id (None, wenn noch nicht geschnitten).
+        """
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return []
+        lo, hi = self.offsets[word_id], self.offsets[word_id + 1]
+        confidence = np.nan_to_num(self.confidence[lo:hi], nan=0.5)
+        score = confidence.astype(np.float64)
+        if ideal_duration is not None:
+            score -= np.abs((self.end[lo:hi] - self.start[lo:hi]) - ideal_duration)
+        score[confidence < min_confidence] = -np.inf
+        score[self.faulty[lo:hi]] = -np.inf
+
+        n = min(n, hi - lo)
+        if n <= 0:
+            return []
+        top = np.argpartition(-score, n - 1)[:n]
+        top = top[np.argsort(-score[top])]
+        top = top[np.isfinite(score[top])]
+        rows = lo + top
+        return [
+            {
+                "id": int(self.ids[i]),
+                "source": self.sources[self.source_ids[i]],
+                "start_time": float(self.start[i]),
+                "end_time": float(self.end[i]),
+                "confidence": None
+                if np.isnan(self.confidence[i])
+                else float(self.confidence[i]),
+                "segment_id": int(self.segment_ids[i]),
+                "video_id": int(self.video_ids[i]) or None,
+            }
+            for i in rows
+        ]
+
+    def mark_cut(self, occurrence_id, video_id):
+        """Vermerkt im Speicher, dass für ein Vorkommen ein Clip existiert."""
+        rows = np.nonzero(self.ids == occurrence_id)[0]
+        self.video_ids[rows] = video_id
@@ -0,0 +1,180 @@
+import os
+import threading
+
+from instrumentation import run_tool
+from storage import get_repository
+
+
+# Jede Vorschau ist eine Zeile aus PREVIEW_TILES gleichmäßig über den Clip
+# verteilten Bildern; das mittlere Bild dient als Vorschaubild
+PREVIEW_TILES = 5
+TILE_SIZE = (160, 90)
+# Höchstens so viele Zeilen pro Atlasdatei (JPEG erlaubt höchstens 65535
+# Pixel Höhe); jeder Aufruf von add_to_atlas schreibt eigene Dateien
+ATLAS_ROWS = 512
+
+_atlas_lock = threading.Lock()
+_next_atlas = {}  # (atlas_dir, word) -> erste möglicherweise freie Nummer
+
+
+def sprite_filter(duration, tiles=PREVIEW_TILES, tile_size=TILE_SIZE):
+    """ffmpeg-Filter, der aus duration Sekunden Video eine Bildzeile macht."""
+    width, height = tile_size
+    return (
+        f"fps={tiles / max(duration, 0.04):.6f},"
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+        f"tile={tiles}x1"
+    )
+
+
+def sprite_output_args(start, duration, sprite_path):
+    """
+    Zusätzliche Ausgabe für einen ffmpeg-Aufruf, der den Clip ohnehin
+    dekodiert: Die Vorschau entsteht aus denselben dekodierten Bildern.
+    :param start: Beginn des Clips relativ zum Eingang in Sekunden.
+    """
+    return [
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{duration:.3f}",
+        "-map",
+        "0:v:0",
+        "-vf",
+        sprite_filter(duration),
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        sprite_path,
+    ]
+
+
+def sprite_path_for(output_path):
+    """Temporärer Pfad der Vorschau eines Clips bis zur Übernahme in den Atlas."""
+    return output_path[: -len(".mp4")] + ".sprite.jpg"
+
+
+def generate_sprite(video_path, sprite_path, duration):
+    """Erzeugt die Vorschau eines fertigen Clips in einem eigenen Aufruf."""
+    command = ["ffmpeg", "-v", "error", "-y", "-i", video_path]
+    command += sprite_output_args(0.0, duration, sprite_path)
+    run_tool(command, check=True)
+
+
+def _atlas_path(atlas_dir, word, number):
+    return os.path.join(atlas_dir, f"{word}_{number}.jpg")
+
+
+def _reserve_atlas(atlas_dir, word):
+    # Legt die nächste freie Atlasdatei des Wortes exklusiv an; damit kann
+    # kein anderer Thread oder Prozess dieselbe Nummer erhalten
+    with _atlas_lock:
+        number = _next_atlas.get((atlas_dir, word), 0)
+        while True:
+            atlas_path = _atlas_path(atlas_dir, word, number)
+            try:
+                os.close(os.open(atlas_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                number += 1
+                continue
+            _next_atlas[(atlas_dir, word)] = number + 1
+            return atlas_path
+
+
+def add_to_atlas(word, sprites, db_path="word_videos.db", atlas_dir="previews"):
+    """
+    Schreibt die Vorschauen mehrerer Clips eines Wortes als eigene Atlasdatei
+    (bzw. mehrere, wenn es mehr als ATLAS_ROWS sind) und vermerkt Atlasdatei
+    und Zeile in videos. Vorhandene Atlanten werden nicht mehr geöffnet, jede
+    Vorschau wird also genau einmal kodiert. Die einzelnen Vorschaudateien
+    werden danach gelöscht.
+    :param sprites: Liste von (file_name, sprite_path).
+    """
+    from PIL import Image
+
+    sprites = [(f, p) for f, p in sprites if os.path.exists(p)]
+    if not sprites:
+        return
+    if not os.path.exists(atlas_dir):
+        os.makedirs(atlas_dir, exist_ok=True)
+    tile_width, tile_height = TILE_SIZE
+    row_width = tile_width * PREVIEW_TILES
+
+    updates = []
+    for i in range(0, len(sprites), ATLAS_ROWS):
+        chunk = sprites[i : i + ATLAS_ROWS]
+        atlas_path = _reserve_atlas(atlas_dir, word)
+        partial_path = atlas_path[: -len(".jpg")] + ".part.jpg"
+        try:
+            atlas = Image.new("RGB", (row_width, len(chunk) * tile_height))
+            for row, (file_name, sprite_path) in enumerate(chunk):
+                with Image.open(sprite_path) as sprite:
+                    atlas.paste(sprite.convert("RGB"), (0, row * tile_height))
+                updates.append((atlas_path, row, word, file_name))
+            atlas.save(partial_path, "JPEG", quality=80)
+            os.replace(partial_path, atlas_path)
+        except Exception:
+            # Die reservierte, noch leere Datei nicht liegen lassen
+            for path in (partial_path, atlas_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+    with get_repository(db_path).transaction() as conn:
+        conn.executemany(
+            "UPDATE videos SET preview_atlas = ?, preview_row = ? "
+            "WHERE word = ? AND file_name = ?",
+            updates,
+        )
+
+    for _, sprite_path in sprites:
+        os.remove(sprite_path)
+
+
+def preview_boxes(row):
+    """
+    Rechtecke (links, oben, rechts, unten) einer Vorschauzeile im Atlas.
+    :return: (Rechteck des Vorschaubilds, Liste der Rechtecke aller Bilder).
+    """
+    tile_width, tile_height = TILE_SIZE
+    top = row * tile_height
+    tiles = [
+        (i * tile_width, top, (i + 1) * tile_width, top + tile_height)
+        for i in range(PREVIEW_TILES)
+    ]
+    return tiles[PREVIEW_TILES // 2], tiles
+
+
+def list_previews(word, db_path="word_videos.db"):
+    """
+    Liefert die Vorschauen aller Clips eines Wortes, ohne ein Video zu öffnen.
+    :return: Liste von Dicts mit id, file_name, rated, atlas, thumbnail, tiles.
+    """
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            """
+            SELECT id, file_name, rated, preview_atlas, preview_row FROM videos
+            WHERE word = ? AND preview_atlas IS NOT NULL ORDER BY id
+        """,
+            (word,),
+        )
+        .fetchall()
+    )
+    previews = []
+    for clip_id, file_name, rated, atlas, row in rows:
+        thumbnail, tiles = preview_boxes(row)
+        previews.append(
+            {
+                "id": clip_id,
+                "file_name": file_name,
+                "rated": rated,
+                "atlas": atlas,
+                "thumbnail": thumbnail,
+                "tiles": tiles,
+            }
+        )
+    return previews
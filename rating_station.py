@@ -0,0 +1,297 @@
+import queue
+import subprocess
+import threading
+import time
+import tkinter as tk
+from tkinter import font
+
+import cv2
+from PIL import Image, ImageTk
+
+from clip_store import CLIP_ROOT, clip_path
+from render_cache import RenderCache
+from storage import get_repository
+
+
+_END = object()  # Der Decoder hat alle Clips geliefert
+
+
+class PreviewDecoder(threading.Thread):
+    """
+    Dekodiert die nächsten Clips im Hintergrund vor, verkleinert die Bilder
+    auf max_size und legt sie als fertige RGB-Bilder in einen Puffer mit
+    höchstens prefetch Clips zu je höchstens max_frames Bildern. Ist der
+    Puffer voll, wartet der Decoder, bis ein Clip entnommen wurde.
+    :param clips: Liste von (id, word, file_name).
+    """
+
+    def __init__(
+        self, clips, clip_root=CLIP_ROOT, prefetch=8, max_size=(480, 270), max_frames=150
+    ):
+        super().__init__(daemon=True)
+        self.clips = clips
+        self.clip_root = clip_root
+        self.max_size = max_size
+        self.max_frames = max_frames
+        self.buffer = queue.Queue(maxsize=prefetch)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def decode(self, video_path):
+        """:return: (Liste von PIL-Bildern, Bilder pro Sekunde)."""
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        max_width, max_height = self.max_size
+        frames = []
+        while len(frames) < self.max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            height, width = frame.shape[:2]
+            scale = min(max_width / width, max_height / height, 1.0)
+            if scale < 1.0:
+                frame = cv2.resize(
+                    frame,
+                    (int(width * scale), int(height * scale)),
+                    interpolation=cv2.INTER_AREA,
+                )
+            frames.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        cap.release()
+        return frames, fps
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self.buffer.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        for clip in self.clips:
+            if self._stop_event.is_set():
+                return
+            video_path = clip_path(clip[2], self.clip_root)
+            try:
+                frames, fps = self.decode(video_path)
+            except Exception as e:
+                print(f"Fehler beim Dekodieren von {video_path}: {e}")
+                frames, fps = [], 25.0
+            if not self._put((clip, video_path, frames, fps)):
+                return
+        self._put(_END)
+
+
+class RatingStation:
+    """
+    Ein einziges Bewertungsfenster für alle unbewerteten Clips (rated = -1).
+    Die Clips werden im Hintergrund vordekodiert, die Bewertungen gesammelt
+    und alle batch_size Bewertungen (sowie beim Beenden) in einer
+    Transaktion gespeichert.
+    Tasten: g / 1 / Pfeil rechts = Gut, s / 0 / Pfeil links = Schlecht,
+    Leertaste = erneut abspielen, n / Pfeil runter = überspringen,
+    Rücktaste = letzte Bewertung zurücknehmen, q / Escape = beenden.
+    :param play_audio: Ton des Clips über ffplay abspielen.
+    """
+
+    def __init__(
+        self,
+        db_path="word_videos.db",
+        clip_root=CLIP_ROOT,
+        prefetch=8,
+        batch_size=20,
+        flush_interval=10.0,
+        play_audio=True,
+    ):
+        self.db_path = db_path
+        self.clip_root = clip_root
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.play_audio = play_audio
+        self.repository = get_repository(db_path)
+        self.pending = []  # (id, word, file_name, rating), noch nicht gespeichert
+        # Nur der zuletzt gezeigte Clip (samt Vorschau) wird für die Rücknahme
+        # behalten; eine Liste aller Clips würde mit jedem Clip wachsen
+        self.previous = None
+        self.replay = []  # Zurückgenommene Clips, die erneut gezeigt werden
+        self.current = None
+        self.rated = 0
+        self.total = 0
+        self.decoder = None
+        self._after_id = None
+        self._audio = None
+        self._last_flush = time.time()
+
+    def _build_window(self):
+        self.window = tk.Tk()
+        self.window.title("Wortvideos bewerten")
+        heading_font = font.Font(family="Helvetica", size=16, weight="bold")
+        self.heading = tk.Label(self.window, text="", font=heading_font)
+        self.heading.pack()
+        self.video_label = tk.Label(self.window)
+        self.video_label.pack()
+        self.status = tk.Label(self.window, text="")
+        self.status.pack()
+        tk.Label(
+            self.window,
+            text="g/1/→ Gut   s/0/← Schlecht   Leertaste Wiederholen   "
+            "n/↓ Überspringen   ⌫ Zurück   q Beenden",
+        ).pack()
+
+        for key in ("g", "1", "<Right>"):
+            self.window.bind(key, lambda event: self.rate(1))
+        for key in ("s", "0", "<Left>"):
+            self.window.bind(key, lambda event: self.rate(0))
+        self.window.bind("<space>", lambda event: self.play())
+        for key in ("n", "<Down>"):
+            self.window.bind(key, lambda event: self.next_clip())
+        self.window.bind("<BackSpace>", lambda event: self.undo())
+        for key in ("q", "<Escape>"):
+            self.window.bind(key, lambda event: self.close())
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+    def run(self):
+        """Öffnet das Fenster und blockiert, bis es geschlossen wird."""
+        clips = self.repository.unrated_videos()
+        if not clips:
+            print("Keine unbewerteten Videos vorhanden.")
+            return
+        self.total = len(clips)
+        self.decoder = PreviewDecoder(clips, self.clip_root, self.prefetch)
+        self.decoder.start()
+        self._build_window()
+        self.next_clip()
+        try:
+            self.window.mainloop()
+        finally:
+            self.flush()
+
+    def next_clip(self):
+        if self.replay:
+            item = self.replay.pop()
+        else:
+            try:
+                item = self.decoder.buffer.get_nowait()
+            except queue.Empty:
+                # Decoder ist noch nicht so weit
+                self.heading.configure(text="Lade ...")
+                self.window.after(50, self.next_clip)
+                return
+        if item is _END:
+            # Das Ende bleibt im Puffer, damit weitere Tastendrücke es erneut sehen
+            self.replay.append(_END)
+            if self.current is not None:
+                self.previous = self.current
+            self.current = None
+            self.heading.configure(text="Alle Videos bewertet.")
+            self.video_label.configure(image="")
+            self.flush()
+            return
+        if self.current is not None:
+            self.previous = self.current
+        self.current = item
+        (clip_id, word, file_name), _, _, _ = item
+        self.heading.configure(text=f"Wort zur Bewertung: {word}")
+        self.status.configure(
+            text=f"{file_name} – {self.rated} von {self.total} bewertet, "
+            f"{len(self.pending)} ungespeichert"
+        )
+        self.play()
+
+    def play(self):
+        if self.current is None:
+            return
+        self._stop_playback()
+        _, video_path, frames, fps = self.current
+        if self.play_audio:
+            try:
+                self._audio = subprocess.Popen(
+                    ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", video_path]
+                )
+            except Exception as e:
+                print(f"Fehler beim Abspielen des Tons: {e}")
+                self.play_audio = False
+        if not frames:
+            self.video_label.configure(image="")
+            return
+        # Ein PhotoImage pro Clip, dessen Inhalt pro Bild ersetzt wird
+        photo = ImageTk.PhotoImage(frames[0])
+        self.video_label.imgtk = photo
+        self.video_label.configure(image=photo)
+        delay = max(1, int(1000 / fps))
+
+        def show(index):
+            if index < len(frames):
+                photo.paste(frames[index])
+                self._after_id = self.window.after(delay, show, index + 1)
+
+        show(1)
+
+    def _stop_playback(self):
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        if self._audio is not None and self._audio.poll() is None:
+            self._audio.kill()
+        self._audio = None
+
+    def rate(self, rating):
+        if self.current is None:
+            return
+        (clip_id, word, file_name), _, _, _ = self.current
+        print(f"Bewertung für {word} ({file_name}): {rating}")
+        self.pending.append((clip_id, word, file_name, rating))
+        self.rated += 1
+        if (
+            len(self.pending) >= self.batch_size
+            or time.time() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+        self.next_clip()
+
+    def undo(self):
+        """Nimmt die letzte, noch nicht gespeicherte Bewertung zurück."""
+        if not self.pending or self.previous is None:
+            return
+        if self.previous[0][0] != self.pending[-1][0]:
+            # Der zuletzt gezeigte Clip wurde übersprungen, nicht bewertet
+            return
+        self.pending.pop()
+        self.rated -= 1
+        previous, self.previous = self.previous, None
+        if self.current is not None:
+            self.replay.append(self.current)
+        self.current = None
+        self.replay.append(previous)
+        self.next_clip()
+
+    def flush(self):
+        """Speichert alle gesammelten Bewertungen in einer Transaktion."""
+        self._last_flush = time.time()
+        if not self.pending:
+            return
+        self.repository.save_ratings(
+            [(word, file_name, rating) for _, word, file_name, rating in self.pending]
+        )
+        # Gerenderte Sätze mit diesen Clips verwerfen, die Auswahl kann sich ändern
+        RenderCache(db_path=self.db_path).invalidate_clip_ids(
+            [clip_id for clip_id, _, _, _ in self.pending]
+        )
+        print(f"{len(self.pending)} Bewertungen gespeichert.")
+        self.pending = []
+
+    def close(self):
+        self._stop_playback()
+        if self.decoder is not None:
+            self.decoder.stop()
+        self.flush()
+        self.window.destroy()
+
+
+def rate_unrated_videos(db_path="word_videos.db", clip_root=CLIP_ROOT):
+    """Bewertet alle unbewerteten Clips in einem Fenster."""
+    RatingStation(db_path, clip_root).run()
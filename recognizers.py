@@ -0,0 +1,344 @@
+import hashlib
+import io
+import json
+import os
+import random
+import string
+import threading
+import time
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+
+# Ein erkanntes Wort mit Zeitstempeln in Sekunden (relativ zum übergebenen Audio)
+RecognizedWord = namedtuple(
+    "RecognizedWord", ["word", "start_time", "end_time", "confidence"]
+)
+
+
+def wav_duration(content, sample_rate=16000):
+    """
+    Ermittelt die Dauer von Audiodaten in Sekunden.
+    WAV-Daten werden über den Header gelesen, alles andere wird als
+    16-Bit-Mono-PCM mit der angegebenen Abtastrate behandelt.
+    """
+    try:
+        with wave.open(io.BytesIO(content), "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (wave.Error, EOFError):
+        return len(content) / (2.0 * sample_rate)
+
+
+def wav_samples(content, sample_rate=16000):
+    """
+    Liest 16-Bit-Mono-Audio (WAV oder rohes PCM) als float32-Array im
+    Bereich [-1, 1], wie es lokale Erkenner erwarten.
+    :return: (samples, sample_rate)
+    """
+    try:
+        with wave.open(io.BytesIO(content), "rb") as wav_file:
+            sample_rate = wav_file.getframerate()
+            content = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        pass
+    samples = np.frombuffer(content[: len(content) // 2 * 2], dtype=np.int16)
+    return samples.astype(np.float32) / 32768.0, sample_rate
+
+
+def clean_word(word):
+    """Entfernt Leerzeichen und Satzzeichen lokaler Erkenner und schreibt klein."""
+    return word.strip().strip(string.punctuation + "„“”‚‘’«»–—…").lower()
+
+
+class Recognizer:
+    """
+    Schnittstelle für Spracherkenner.
+    Eine Implementierung erhält die Bytes einer Audiodatei (WAV) und liefert
+    alle erkannten Wörter als Liste von RecognizedWord zurück.
+    """
+
+    language_code = "de-DE"
+    # Kosten pro Minute Audio in Euro (0 für lokale Erkenner)
+    price_per_minute = 0.0
+    # Höchstlänge einer Anfrage in Sekunden (None: unbegrenzt)
+    max_segment_seconds = None
+    # Sinnvolle Anzahl gleichzeitiger recognize-Aufrufe
+    max_in_flight = 4
+    # Abrechnungseinheit pro Anfrage in Sekunden (None: nicht abgerechnet)
+    billing_increment = None
+
+    def recognize(self, content):
+        raise NotImplementedError
+
+    def config_key(self):
+        """
+        Beschreibt alle Einstellungen, die das Ergebnis beeinflussen, als
+        stabilen String (z.B. für den Transkript-Cache).
+        """
+        return json.dumps(
+            {"backend": type(self).__name__, "language_code": self.language_code},
+            sort_keys=True,
+        )
+
+
+class GoogleRecognizer(Recognizer):
+    """Spracherkennung über Google Cloud Speech-to-Text (synchroner Aufruf)."""
+
+    price_per_minute = 0.016
+    max_segment_seconds = 60.0  # Limit für synchrone Anfragen
+    max_in_flight = 8  # Netzwerkgebunden, mehr parallele Anfragen lohnen sich
+    billing_increment = 15.0  # V1 rundet jede Anfrage auf 15 Sekunden auf
+
+    def __init__(self, client=None, language_code="de-DE", use_enhanced=False):
+        if client is None:
+            from google.cloud import speech_v1p1beta1 as speech
+
+            client = speech.SpeechClient()
+        self.client = client
+        self.language_code = language_code
+        self.use_enhanced = use_enhanced
+
+    def config_key(self):
+        return json.dumps(
+            {
+                "backend": type(self).__name__,
+                "language_code": self.language_code,
+                "use_enhanced": self.use_enhanced,
+                "word_confidence": True,
+            },
+            sort_keys=True,
+        )
+
+    def recognize(self, content):
+        config = {
+            "language_code": self.language_code,
+            "enable_word_time_offsets": True,
+            "enable_word_confidence": True,
+            "use_enhanced": self.use_enhanced,
+        }
+        response = self.client.recognize(config=config, audio={"content": content})
+
+        words = []
+        for result in response.results:
+            for word_info in result.alternatives[0].words:
+                words.append(
+                    RecognizedWord(
+                        word_info.word.lower(),  # Wörter in Kleinbuchstaben umwandeln
+                        word_info.start_time.total_seconds(),
+                        word_info.end_time.total_seconds(),
+                        getattr(word_info, "confidence", None) or None,
+                    )
+                )
+        return words
+
+
+class WhisperRecognizer(Recognizer):
+    """
+    Lokale Spracherkennung auf der CPU mit faster-whisper (optionale
+    Abhängigkeit), mit Zeitstempeln pro Wort. Das Modell wird einmal geladen
+    und von num_workers gleichzeitigen Aufrufen geteilt; jeder Aufruf nutzt
+    cpu_threads Kerne, so dass nebenläufig erkannte Segmente auf alle Kerne
+    verteilt werden.
+    :param model_size: Name oder Pfad des Modells, z.B. "small" oder "medium".
+    :param compute_type: Rechengenauigkeit, "int8" ist auf der CPU am schnellsten.
+    """
+
+    def __init__(
+        self,
+        model_size="small",
+        language_code="de-DE",
+        compute_type="int8",
+        cpu_threads=None,
+        num_workers=None,
+        beam_size=5,
+    ):
+        from faster_whisper import WhisperModel
+
+        cores = os.cpu_count() or 1
+        num_workers = num_workers or max(1, cores // 4)
+        cpu_threads = cpu_threads or max(1, cores // num_workers)
+        self.model_size = model_size
+        self.language_code = language_code
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.max_in_flight = num_workers
+        self.model = WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
+        )
+
+    def config_key(self):
+        return json.dumps(
+            {
+                "backend": type(self).__name__,
+                "language_code": self.language_code,
+                "model_size": self.model_size,
+                "compute_type": self.compute_type,
+                "beam_size": self.beam_size,
+            },
+            sort_keys=True,
+        )
+
+    def recognize(self, content):
+        samples, _ = wav_samples(content)
+        segments, _ = self.model.transcribe(
+            samples,
+            language=self.language_code.split("-")[0],
+            beam_size=self.beam_size,
+            word_timestamps=True,
+        )
+        words = []
+        for segment in segments:
+            for word_info in segment.words or []:
+                word = clean_word(word_info.word)
+                if word:
+                    words.append(
+                        RecognizedWord(
+                            word, word_info.start, word_info.end, word_info.probability
+                        )
+                    )
+        return words
+
+
+class VoskRecognizer(Recognizer):
+    """
+    Lokale Spracherkennung auf der CPU mit Vosk (optionale Abhängigkeit).
+    Braucht ein heruntergeladenes Modell, z.B. vosk-model-de-0.21.
+    Das Modell wird geteilt, jeder Aufruf bekommt einen eigenen Decoder.
+    """
+
+    def __init__(self, model_path, language_code="de-DE", max_in_flight=None):
+        from vosk import Model, SetLogLevel
+
+        SetLogLevel(-1)
+        self.model_path = model_path
+        self.language_code = language_code
+        self.max_in_flight = max_in_flight or os.cpu_count() or 1
+        self.model = Model(model_path)
+
+    def config_key(self):
+        return json.dumps(
+            {
+                "backend": type(self).__name__,
+                "language_code": self.language_code,
+                "model": os.path.basename(os.path.normpath(self.model_path)),
+            },
+            sort_keys=True,
+        )
+
+    def recognize(self, content):
+        from vosk import KaldiRecognizer
+
+        samples, sample_rate = wav_samples(content)
+        decoder = KaldiRecognizer(self.model, sample_rate)
+        decoder.SetWords(True)
+        pcm = (samples * 32768.0).astype(np.int16).tobytes()
+        results = []
+        step = 2 * sample_rate * 4  # 4 Sekunden pro Aufruf
+        for i in range(0, len(pcm), step):
+            if decoder.AcceptWaveform(pcm[i : i + step]):
+                results.append(json.loads(decoder.Result()))
+        results.append(json.loads(decoder.FinalResult()))
+
+        words = []
+        for result in results:
+            for word_info in result.get("result", []):
+                word = clean_word(word_info["word"])
+                if word:
+                    words.append(
+                        RecognizedWord(
+                            word, word_info["start"], word_info["end"], word_info.get("conf")
+                        )
+                    )
+        return words
+
+
+class FakeRecognizer(Recognizer):
+    """
+    Deterministischer Erkenner ohne Netzwerk für Tests und Benchmarks.
+    Erzeugt aus dem Inhalt des Audios reproduzierbare Wörter mit
+    gleichmäßigen Zeitstempeln über die gesamte Dauer.
+    :param latency: Simulierte Antwortzeit pro Aufruf in Sekunden.
+    :param transient_failures: Anzahl der ersten Aufrufe, die mit einem Fehler enden.
+    """
+
+    VOCABULARY = ("hallo", "welt", "und", "die", "der", "das", "ist", "ein", "video")
+
+    def __init__(
+        self,
+        words_per_second=2.0,
+        vocabulary=VOCABULARY,
+        latency=0.0,
+        transient_failures=0,
+        language_code="de-DE",
+    ):
+        self.words_per_second = words_per_second
+        self.vocabulary = list(vocabulary)
+        self.latency = latency
+        self.language_code = language_code
+        self.calls = 0
+        self._failures_left = transient_failures
+        self._lock = threading.Lock()
+
+    def config_key(self):
+        return json.dumps(
+            {
+                "backend": type(self).__name__,
+                "language_code": self.language_code,
+                "words_per_second": self.words_per_second,
+                "vocabulary": self.vocabulary,
+            },
+            sort_keys=True,
+        )
+
+    def recognize(self, content):
+        with self._lock:
+            self.calls += 1
+            if self._failures_left > 0:
+                self._failures_left -= 1
+                raise RuntimeError("Simulierter vorübergehender Fehler")
+        if self.latency:
+            time.sleep(self.latency)
+
+        duration = wav_duration(content)
+        rng = random.Random(hashlib.sha256(content).hexdigest())
+        slot = 1.0 / self.words_per_second
+        words = []
+        start_time = 0.0
+        while start_time + slot <= duration:
+            words.append(
+                RecognizedWord(
+                    rng.choice(self.vocabulary),
+                    round(start_time + 0.1 * slot, 3),
+                    round(start_time + 0.9 * slot, 3),
+                    round(rng.uniform(0.5, 1.0), 3),
+                )
+            )
+            start_time += slot
+        return words
+
+
+# Verfügbare Erkenner, über create_recognizer pro Lauf auswählbar
+BACKENDS = {
+    "google": GoogleRecognizer,
+    "whisper": WhisperRecognizer,
+    "vosk": VoskRecognizer,
+    "fake": FakeRecognizer,
+}
+
+
+def create_recognizer(backend="google", **options):
+    """
+    Erzeugt den Erkenner eines Backends; options werden an den Konstruktor
+    weitergereicht (z.B. model_size für "whisper", model_path für "vosk").
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unbekanntes Erkennungs-Backend '{backend}', verfügbar: {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[backend](**options)
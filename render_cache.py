@@ -0,0 +1,312 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from storage import get_repository
+
+
+class RenderCache:
+    """
+    Cache für gerenderte Sätze und wiederverwendbare Satzfragmente (N-Gramme).
+    Ein Eintrag ist über die Wortfolge und die gewählten Clip-IDs eindeutig
+    bestimmt; ein neuer Satz wird an jeder Position aus dem längsten
+    vorhandenen Fragment (sonst dem Einzelclip) zusammengesetzt. Die Dateien liegen unter
+    cache_dir, die Einträge in den Tabellen render_cache und render_cache_clips.
+    :param policy: "lru" verdrängt die am längsten unbenutzten, "lfu" die am
+        seltensten benutzten Einträge, sobald max_bytes überschritten ist.
+    :param fragment_size: Länge der Fragmente, die beim Rendern neuer
+        Wortfolgen zusätzlich abgelegt werden (jedes Fenster dieser Länge,
+        nicht nur aneinandergrenzende Stücke).
+    """
+
+    def __init__(
+        self,
+        cache_dir="render_cache",
+        max_bytes=1024 * 1024 * 1024,
+        policy="lru",
+        fragment_size=3,
+        db_path="word_videos.db",
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.fragment_size = fragment_size
+        self.repository = get_repository(db_path)
+        self.sentence_hits = 0
+        self.fragment_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Das Verzeichnis entsteht erst mit dem ersten Eintrag (store); wer
+        # nur Einträge verwirft, legt keinen leeren Cache an
+
+    @staticmethod
+    def cache_key(tokens, clip_ids, variant):
+        payload = json.dumps([list(tokens), list(clip_ids), variant])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def stats(self):
+        """Trefferzähler und Trefferquote (ganze Sätze und Fragmente)."""
+        with self._lock:
+            lookups = self.sentence_hits + self.misses
+            return {
+                "sentence_hits": self.sentence_hits,
+                "fragment_hits": self.fragment_hits,
+                "misses": self.misses,
+                "hit_rate": self.sentence_hits / lookups if lookups else 0.0,
+            }
+
+    def lookup(self, cache_key):
+        """Gibt den Pfad eines vorhandenen Eintrags zurück und vermerkt die Nutzung."""
+        row = (
+            self.repository.connection()
+            .execute("SELECT path FROM render_cache WHERE cache_key = ?", (cache_key,))
+            .fetchone()
+        )
+        if row is None or not os.path.exists(row[0]):
+            return None
+        with self.repository.transaction() as conn:
+            conn.execute(
+                "UPDATE render_cache SET hits = hits + 1, last_used = ? WHERE cache_key = ?",
+                (time.time(), cache_key),
+            )
+        return row[0]
+
+    def claim(self, cache_key, target_path):
+        """
+        Wie lookup, legt den Eintrag aber unter target_path ab (Hardlink,
+        sonst Kopie). Die Datei bleibt so lesbar, auch wenn ein anderer
+        Prozess den Eintrag inzwischen verdrängt. Ist der Eintrag zwischen
+        Abfrage und Zugriff verschwunden, gilt das als Fehlschlag.
+        :return: target_path oder None.
+        """
+        path = self.lookup(cache_key)
+        if path is None:
+            return None
+        try:
+            os.link(path, target_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            try:
+                shutil.copyfile(path, target_path)
+            except FileNotFoundError:
+                return None
+        return target_path
+
+    def store(self, cache_key, tokens, clip_ids, kind, source_path, evict=True):
+        """
+        Kopiert ein gerendertes Video in den Cache (atomar) und trägt es ein.
+        :param evict: False verschiebt das Verdrängen, z.B. solange die
+            Fragmente eines Satzes noch gebraucht werden.
+        """
+        path = os.path.join(self.cache_dir, f"{cache_key}.mp4")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Eindeutige temporäre Datei: mehrere Prozesse können denselben
+        # Eintrag gleichzeitig ablegen, der letzte os.replace gewinnt
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self.repository.transaction() as conn:
+            conn.execute("DELETE FROM render_cache_clips WHERE cache_key = ?", (cache_key,))
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO render_cache
+                    (cache_key, tokens, kind, path, size_bytes, hits, last_used)
+                VALUES (?, ?, ?, ?, ?, 0, ?)
+            """,
+                (cache_key, " ".join(tokens), kind, path, os.path.getsize(path), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO render_cache_clips (cache_key, clip_id) VALUES (?, ?)",
+                [(cache_key, clip_id) for clip_id in set(clip_ids)],
+            )
+        if evict:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Verdrängt Einträge nach der gewählten Strategie bis unter max_bytes."""
+        order = "hits, last_used" if self.policy == "lfu" else "last_used"
+        with self._lock, self.repository.transaction() as conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size_bytes), 0) FROM render_cache"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for cache_key, size_bytes in conn.execute(
+                f"SELECT cache_key, size_bytes FROM render_cache ORDER BY {order}"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                evicted.append(cache_key)
+                total -= size_bytes
+            self._delete_entries(conn, evicted)
+
+    def _delete_entries(self, conn, cache_keys):
+        for cache_key in cache_keys:
+            row = conn.execute(
+                "SELECT path FROM render_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None and os.path.exists(row[0]):
+                os.remove(row[0])
+        conn.executemany(
+            "DELETE FROM render_cache WHERE cache_key = ?", [(k,) for k in cache_keys]
+        )
+        conn.executemany(
+            "DELETE FROM render_cache_clips WHERE cache_key = ?", [(k,) for k in cache_keys]
+        )
+
+    def invalidate_clip_ids(self, clip_ids):
+        """Entfernt alle Einträge, die einen der Clips enthalten."""
+        with self.repository.transaction() as conn:
+            cache_keys = [
+                row[0]
+                for clip_id in clip_ids
+                for row in conn.execute(
+                    "SELECT cache_key FROM render_cache_clips WHERE clip_id = ?", (clip_id,)
+                ).fetchall()
+            ]
+            self._delete_entries(conn, sorted(set(cache_keys)))
+
+    def render(self, clips, output_path, normalized_cache=None):
+        """
+        Rendert einen Satz unter Verwendung des Caches.
+        :param clips: Liste von (word, clip_id, path) wie von select_clips.
+        """
+        from create_video import render_clips
+
+        variant = "original"
+        if normalized_cache is not None:
+            from normalization import profile_name
+
+            variant = profile_name(normalized_cache.profile)
+
+        tokens = [word for word, _, _ in clips]
+        clip_ids = [clip_id for _, clip_id, _ in clips]
+        sentence_key = self.cache_key(tokens, clip_ids, variant)
+        cached = self.lookup(sentence_key)
+        if cached is not None:
+            try:
+                shutil.copyfile(cached, output_path)
+                with self._lock:
+                    self.sentence_hits += 1
+                return output_path
+            except FileNotFoundError:
+                pass  # Inzwischen von einem anderen Prozess verdrängt
+        with self._lock:
+            self.misses += 1
+
+        def clip_path(i):
+            if normalized_cache is not None:
+                return normalized_cache.get(clips[i][2])
+            return clips[i][2]
+
+        work_dir = tempfile.mkdtemp(prefix="render_cache_")
+        try:
+            parts = []
+            pending = []  # Einzelclips, für die noch kein Fragment existiert
+
+            def render_fragment(run, start, end):
+                chunk = run[start:end]
+                chunk_tokens = [tokens[i] for i in chunk]
+                chunk_ids = [clip_ids[i] for i in chunk]
+                fragment_path = os.path.join(
+                    work_dir, f"fragment_{chunk[0]}_{len(chunk)}.mp4"
+                )
+                render_clips([clip_path(i) for i in chunk], fragment_path)
+                self.store(
+                    self.cache_key(chunk_tokens, chunk_ids, variant),
+                    chunk_tokens,
+                    chunk_ids,
+                    "fragment",
+                    fragment_path,
+                    evict=False,
+                )
+                # Die eigene Kopie verwenden, der Eintrag kann jederzeit
+                # von einem anderen Prozess verdrängt werden
+                return fragment_path
+
+            def flush_pending():
+                # Neue Einzelclips in Fragmenten zu fragment_size Wörtern
+                # rendern. Für die Ausgabe genügen aneinandergrenzende
+                # Fragmente; abgelegt wird zusätzlich jedes dazwischen
+                # liegende Fenster, damit ein späterer Satz auch verschobene
+                # Wortfolgen findet ("b c d" nach "a b c d")
+                run = list(pending)
+                pending.clear()
+                size = self.fragment_size
+                for start in range(0, len(run), size):
+                    end = min(start + size, len(run))
+                    if end - start == 1:
+                        parts.append(clip_path(run[start]))
+                    else:
+                        parts.append(render_fragment(run, start, end))
+                if size > 1:
+                    for start in range(1, len(run) - size + 1):
+                        if start % size:
+                            render_fragment(run, start, start + size)
+
+            i = 0
+            while i < len(clips):
+                # Längstes bereits gerendertes Fragment ab Position i suchen
+                for j in range(len(clips), i + 1, -1):
+                    if j - i == len(clips):
+                        continue  # Der ganze Satz wurde oben schon geprüft
+                    fragment = self.claim(
+                        self.cache_key(tokens[i:j], clip_ids[i:j], variant),
+                        os.path.join(work_dir, f"cached_{len(parts)}.mp4"),
+                    )
+                    if fragment is not None:
+                        with self._lock:
+                            self.fragment_hits += 1
+                        flush_pending()
+                        parts.append(fragment)
+                        i = j
+                        break
+                else:
+                    pending.append(i)
+                    i += 1
+            flush_pending()
+
+            if len(parts) == 1:
+                shutil.copyfile(parts[0], output_path)
+            else:
+                render_clips(parts, output_path)
+            self.store(sentence_key, tokens, clip_ids, "sentence", output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return output_path
+
+
+def invalidate_clip(word, file_name, db_path="word_videos.db"):
+    """
+    Entfernt alle gerenderten Sätze und Fragmente, die den Clip enthalten
+    (aufgerufen bei neuer Bewertung oder beim Löschen eines Clips). Ohne
+    betroffene Einträge wird der Cache gar nicht erst geöffnet.
+    """
+    rows = (
+        get_repository(db_path)
+        .connection()
+        .execute(
+            """
+            SELECT DISTINCT v.id FROM videos v
+            JOIN render_cache_clips c ON c.clip_id = v.id
+            WHERE v.word = ? AND v.file_name = ?
+        """,
+            (word, file_name),
+        )
+        .fetchall()
+    )
+    if rows:
+        RenderCache(db_path=db_path).invalidate_clip_ids([row[0] for row in rows])
@@ -0,0 +1,302 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from create_video import select_clips
+from previews import list_previews
+from word_index import VocabularyIndex
+
+
+_worker_cache = None
+_worker_render_cache = None
+
+
+def _init_worker(use_normalized):
+    """Initialisiert einen Render-Prozess einmalig (warme Caches pro Prozess)."""
+    global _worker_cache, _worker_render_cache
+    from render_cache import RenderCache
+
+    if use_normalized:
+        from normalization import NormalizedClipCache
+
+        _worker_cache = NormalizedClipCache()
+    _worker_render_cache = RenderCache()
+
+
+def _render_job(clips, output_path):
+    """Läuft im Render-Prozess: rendert die Clips (über den Render-Cache) nach output_path."""
+    _worker_render_cache.render(clips, output_path, _worker_cache)
+    return output_path
+
+
+class RenderMetrics:
+    """Zähler und Latenzen des Dienstes (die letzten max_samples Anfragen)."""
+
+    def __init__(self, max_samples=1000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=max_samples)
+        self.counts = {"ok": 0, "rejected": 0, "not_found": 0, "failed": 0}
+        self.accepted = 0  # Angenommene, noch nicht beantwortete Aufträge
+        self.in_flight = 0  # Davon gerade im Prozesspool
+
+    def record(self, outcome, latency=None):
+        with self.lock:
+            self.counts[outcome] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+            accepted = self.accepted
+            in_flight = self.in_flight
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))]
+
+        return {
+            "requests": counts,
+            "queued": accepted - in_flight,
+            "in_flight": in_flight,
+            "latency_seconds": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+            },
+        }
+
+
+class RenderService:
+    """
+    Hält das Wortverzeichnis im Speicher und verteilt Renderaufträge auf
+    einen Prozesspool. Höchstens workers + queue_size Aufträge werden
+    gleichzeitig angenommen, weitere werden mit 503 abgewiesen.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        queue_size=16,
+        output_dir="output",
+        refresh_interval=30.0,
+        use_normalized=True,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.output_dir = output_dir
+        self.refresh_interval = refresh_interval
+        self.index = VocabularyIndex.load()
+        self.index_lock = threading.Lock()
+        self.last_refresh = time.monotonic()
+        self.slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self.metrics = RenderMetrics()
+        # spawn statt fork: SQLite-Verbindungen dürfen nicht vererbt werden
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(use_normalized,),
+        )
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+    def _maybe_refresh(self):
+        # Übernimmt regelmäßig neue Clips; nur mit gehaltenem index_lock aufrufen
+        if time.monotonic() - self.last_refresh > self.refresh_interval:
+            self.index.refresh()
+            self.last_refresh = time.monotonic()
+
+    def complete(self, prefix, limit=50):
+        with self.index_lock:
+            self._maybe_refresh()
+            return self.index.complete(prefix, limit)
+
+    def render(self, sentence):
+        """
+        Rendert einen Satz in eine eigene Ausgabedatei.
+        :return: (Status, Pfad oder Fehlerdetails).
+        """
+        if not self.slots.acquire(blocking=False):
+            self.metrics.record("rejected")
+            return "rejected", None
+
+        started = time.monotonic()
+        with self.metrics.lock:
+            self.metrics.accepted += 1
+        try:
+            with self.index_lock:
+                self._maybe_refresh()
+                # Schneiden auf Anfrage bleibt der Pipeline überlassen; der
+                # Dienst hält dabei die Indexsperre
+                clips, missing = select_clips(sentence, self.index, cut_missing=False)
+            if missing or not clips:
+                self.metrics.record("not_found")
+                return "not_found", missing
+
+            # Eigene Ausgabedatei pro Anfrage, damit sich Nutzer nicht überschreiben
+            output_path = os.path.join(
+                self.output_dir, f"render_{uuid.uuid4().hex}.mp4"
+            )
+            with self.metrics.lock:
+                self.metrics.in_flight += 1
+            try:
+                self.pool.submit(_render_job, clips, output_path).result()
+            finally:
+                with self.metrics.lock:
+                    self.metrics.in_flight -= 1
+            self.metrics.record("ok", time.monotonic() - started)
+            return "ok", output_path
+        except Exception as e:
+            print(f"Fehler beim Rendern von '{sentence}': {e}")
+            self.metrics.record("failed", time.monotonic() - started)
+            return "failed", str(e)
+        finally:
+            with self.metrics.lock:
+                self.metrics.accepted -= 1
+            self.slots.release()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /render?sentence=...    bzw. POST /render {"sentence": ...} -> MP4
+    GET  /words?prefix=...       -> passende Wörter als JSON
+    GET  /metrics                -> Zähler und Latenzen als JSON
+    GET  /previews?word=...      -> Vorschauen aller Clips eines Wortes als JSON
+    GET  /atlas/<Datei>          -> Atlasbild mit den Vorschauen (JPEG)
+    """
+
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/render":
+            self._render(query.get("sentence", [""])[0])
+        elif url.path == "/words":
+            prefix = query.get("prefix", [""])[0].lower()
+            try:
+                limit = int(query.get("limit", ["50"])[0])
+            except ValueError:
+                limit = 0
+            if limit <= 0:
+                self._send_json(400, {"error": "limit muss eine positive Zahl sein"})
+                return
+            self._send_json(200, self.service.complete(prefix, limit))
+        elif url.path == "/metrics":
+            self._send_json(200, self.service.metrics.snapshot())
+        elif url.path == "/previews":
+            previews = list_previews(query.get("word", [""])[0].lower())
+            for preview in previews:
+                preview["atlas"] = "/atlas/" + os.path.basename(preview["atlas"])
+            self._send_json(200, previews)
+        elif url.path.startswith("/atlas/"):
+            self._send_atlas(os.path.basename(url.path))
+        else:
+            self._send_json(404, {"error": "Unbekannter Pfad"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/render":
+            self._send_json(404, {"error": "Unbekannter Pfad"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send_json(400, {"error": "Ungültige Content-Length"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Ungültiges JSON"})
+            return
+        self._render(body.get("sentence", ""))
+
+    def _render(self, sentence):
+        status, result = self.service.render(sentence)
+        if status == "rejected":
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif status == "not_found":
+            self._send_json(422, {"missing": result})
+        elif status == "failed":
+            self._send_json(500, {"error": result})
+        else:
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(os.path.getsize(result)))
+                self.end_headers()
+                with open(result, "rb") as video_file:
+                    shutil.copyfileobj(video_file, self.wfile)
+            finally:
+                os.remove(result)
+
+    def _send_atlas(self, name, atlas_dir="previews"):
+        atlas_path = os.path.join(atlas_dir, name)
+        if not name.endswith(".jpg") or not os.path.isfile(atlas_path):
+            self._send_json(404, {"error": "Unbekannter Atlas"})
+            return
+        with open(atlas_path, "rb") as atlas_file:
+            body = atlas_file.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=8080, **service_options):
+    service = RenderService(**service_options)
+    RenderRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    print(f"Render-Dienst läuft auf http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Dienst zum Rendern von Sätzen aus Wortvideos"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--no-normalize", action="store_true")
+    args = parser.parse_args()
+    serve(
+        args.host,
+        args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        use_normalized=not args.no_normalize,
+    )
@@ -0,0 +1,249 @@
+import io
+import subprocess
+import wave
+
+import numpy as np
+
+from instrumentation import popen_tool, run_tool, timed
+from transcription import Segment
+
+
+def _pcm_command(file_path, sample_rate, start=None, end=None):
+    command = ["ffmpeg", "-v", "error"]
+    if start is not None:
+        command += ["-ss", str(start)]  # Vor -i, damit nur der Bereich dekodiert wird
+    if end is not None:
+        command += ["-to", str(end)]
+    return command + [
+        "-i",
+        file_path,
+        "-vn",
+        "-ac",
+        "1",  # Setzen auf 1 Kanal (Mono)
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "s16le",
+    ]
+
+
+@timed("extract")
+def decode_audio_pcm(
+    file_path, sample_rate=16000, memmap_path=None, start=None, end=None
+):
+    """
+    Dekodiert die Tonspur einer Datei in einem einzigen ffmpeg-Durchlauf zu
+    16-Bit-Mono-PCM.
+    :param memmap_path: Optionaler Pfad; wenn gesetzt, werden die Rohdaten dort
+        abgelegt und als np.memmap statt im Arbeitsspeicher gehalten.
+    :param start: Optionaler Beginn in Sekunden; mit end wird nur dieser
+        Ausschnitt dekodiert.
+    :return: np.int16-Array der Samples.
+    """
+    command = _pcm_command(file_path, sample_rate, start, end)
+    if memmap_path is not None:
+        run_tool(command + ["-y", memmap_path], check=True)
+        return np.memmap(memmap_path, dtype=np.int16, mode="r")
+    result = run_tool(command + ["-"], stdout=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+@timed("extract")
+def stream_audio_pcm(file_path, sample_rate=16000, chunk_seconds=1.0):
+    """
+    Dekodiert die Tonspur über eine ffmpeg-Pipe und liefert sie stückweise,
+    während ffmpeg noch läuft (Generator von np.int16-Arrays mit je
+    chunk_seconds Sekunden). Es entsteht keine Datei; liest der Verbraucher
+    nicht weiter, wartet ffmpeg.
+    """
+    chunk_bytes = 2 * max(1, int(chunk_seconds * sample_rate))
+    process = popen_tool(
+        _pcm_command(file_path, sample_rate) + ["-"], stdout=subprocess.PIPE
+    )
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            if len(data) % 2:
+                # Halbes Sample am Ende des Streams verwerfen
+                data = data[:-1]
+            yield np.frombuffer(data, dtype=np.int16)
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, "ffmpeg")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+
+def rms_envelope(samples, sample_rate, window=0.02):
+    """
+    Berechnet die RMS-Hüllkurve in Fenstern von window Sekunden (vektorisiert).
+    :return: float32-Array mit einem Wert pro Fenster.
+    """
+    frame = max(1, int(sample_rate * window))
+    num_frames = len(samples) // frame
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[: num_frames * frame], dtype=np.float32).reshape(
+        num_frames, frame
+    )
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def find_cut_points(
+    samples, sample_rate, target_length=50.0, search_window=5.0, window=0.02
+):
+    """
+    Wählt Schnittpunkte (Sekunden) nahe der Ziellänge in möglichst leisen Bereichen.
+    Jeder Schnitt liegt im Intervall [Ziel - search_window, Ziel + search_window]
+    um den vorherigen Schnitt plus target_length, an dem Fenster mit der
+    geringsten Energie. Das erste Element ist 0, das letzte die Gesamtdauer.
+    """
+    total_duration = len(samples) / float(sample_rate)
+    envelope = rms_envelope(samples, sample_rate, window)
+    cuts = [0.0]
+    while total_duration - cuts[-1] > target_length + search_window:
+        target = cuts[-1] + target_length
+        lo = int((target - search_window) / window)
+        hi = min(int((target + search_window) / window), len(envelope))
+        quietest = lo + int(np.argmin(envelope[lo:hi]))
+        # Schnitt in die Mitte des leisesten Fensters legen
+        cuts.append((quietest + 0.5) * window)
+    cuts.append(total_duration)
+    return cuts
+
+
+def pcm_to_wav_bytes(samples, sample_rate):
+    """Verpackt 16-Bit-Mono-PCM als WAV-Datei im Speicher."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+@timed("split")
+def segment_audio(
+    file_path,
+    target_length=50.0,
+    overlap=0.0,
+    search_window=5.0,
+    sample_rate=16000,
+    samples=None,
+):
+    """
+    Zerlegt eine Audiodatei in Segmente, die nach einmaligem Dekodieren im
+    Speicher liegen (Generator von Segment mit WAV-Bytes in content).
+    Die Schnitte liegen in leisen Bereichen nahe target_length. Mit overlap > 0
+    wird jedes Segment an beiden Seiten um overlap Sekunden erweitert, damit
+    Wörter am Schnitt vollständig erkannt werden; doppelt erkannte Wörter
+    entfernt deduplicate_overlap_words.
+    Hinweis: target_length + search_window + 2 * overlap muss unter dem
+    Limit von 60 Sekunden für synchrone Anfragen bleiben.
+    :param samples: Bereits dekodierte Samples, um das Dekodieren zu überspringen.
+    """
+    if samples is None:
+        samples = decode_audio_pcm(file_path, sample_rate)
+    total_duration = len(samples) / float(sample_rate)
+    cuts = find_cut_points(samples, sample_rate, target_length, search_window)
+
+    for index in range(len(cuts) - 1):
+        start = max(0.0, cuts[index] - overlap)
+        end = min(total_duration, cuts[index + 1] + overlap)
+        content = pcm_to_wav_bytes(
+            samples[int(start * sample_rate) : int(end * sample_rate)], sample_rate
+        )
+        yield Segment(
+            index,
+            start,
+            end,
+            content=content,
+            overlap_before=cuts[index] - start,
+            overlap_after=end - cuts[index + 1],
+        )
+
+
+@timed("split", upstream="chunks")
+def stream_segments(
+    chunks,
+    target_length=50.0,
+    overlap=0.0,
+    search_window=5.0,
+    sample_rate=16000,
+    window=0.02,
+):
+    """
+    Wie segment_audio, aber für einen Strom von PCM-Stücken (z.B. aus
+    stream_audio_pcm): Ein Segment wird geliefert, sobald der Ton bis zum
+    Ende seines Suchfensters dekodiert ist. Gepuffert wird nur der Bereich ab
+    dem letzten Schnitt, der Speicherbedarf hängt also nicht von der Länge
+    der Quelle ab. Die Schnitte sind dieselben wie bei find_cut_points.
+    Jedes Segment enthält seine Samples zusätzlich in samples.
+    """
+    frame = max(1, int(sample_rate * window))
+    buffer = np.zeros(0, dtype=np.int16)
+    base = 0  # Index des ersten gepufferten Samples, immer ein Vielfaches von frame
+    last_cut = 0.0
+    index = 0
+
+    def emit(start, end, cut_before, cut_after):
+        segment_samples = buffer[
+            int(start * sample_rate) - base : int(end * sample_rate) - base
+        ]
+        return Segment(
+            index,
+            start,
+            end,
+            content=pcm_to_wav_bytes(segment_samples, sample_rate),
+            overlap_before=cut_before - start,
+            overlap_after=end - cut_after,
+            samples=segment_samples,
+        )
+
+    def next_cut(final):
+        available = (base + len(buffer)) / float(sample_rate)
+        target = last_cut + target_length
+        if final:
+            if available - last_cut <= target_length + search_window:
+                return None
+        elif available < target + search_window + overlap:
+            return None
+        lo = int((target - search_window) / window)
+        hi = min(int((target + search_window) / window), (base + len(buffer)) // frame)
+        envelope = rms_envelope(
+            buffer[lo * frame - base : hi * frame - base], sample_rate, window
+        )
+        # Schnitt in die Mitte des leisesten Fensters legen
+        return (lo + int(np.argmin(envelope)) + 0.5) * window
+
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, chunk])
+        while True:
+            cut = next_cut(False)
+            if cut is None:
+                break
+            yield emit(max(0.0, last_cut - overlap), cut + overlap, last_cut, cut)
+            index += 1
+            last_cut = cut
+            # Alles vor dem Beginn des nächsten Segments verwerfen
+            keep_from = (int(max(0.0, last_cut - overlap) * sample_rate) // frame) * frame
+            if keep_from > base:
+                buffer = buffer[keep_from - base :]
+                base = keep_from
+
+    while True:
+        cut = next_cut(True)
+        if cut is None:
+            break
+        total_duration = (base + len(buffer)) / float(sample_rate)
+        end = min(total_duration, cut + overlap)
+        yield emit(max(0.0, last_cut - overlap), end, last_cut, cut)
+        index += 1
+        last_cut = cut
+    total_duration = (base + len(buffer)) / float(sample_rate)
+    yield emit(max(0.0, last_cut - overlap), total_duration, last_cut, total_duration)
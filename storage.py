@@ -0,0 +1,382 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from instrumentation import METRICS
+
+
+# Schemaänderungen in Reihenfolge; Version n ist nach Schritt n erreicht.
+# Neue Änderungen werden nur angehängt, nie bestehende Schritte verändert.
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS videos (
+        id INTEGER PRIMARY KEY,
+        word TEXT,
+        file_name TEXT,
+        duration_ms INTEGER,
+        start_time REAL,
+        end_time REAL,
+        rated INTEGER DEFAULT -1  -- Geänderte Spalte zur Bewertungskennzeichnung
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_videos_word ON videos (word);
+    CREATE INDEX IF NOT EXISTS idx_videos_word_file_name ON videos (word, file_name);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transcripts (
+        cache_key TEXT PRIMARY KEY,
+        words TEXT,
+        size_bytes INTEGER,
+        last_used REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts (last_used);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS clip_params (
+        path TEXT PRIMARY KEY,
+        mtime REAL,
+        size INTEGER,
+        params TEXT
+    );
+    """,
+    """
+    ALTER TABLE videos ADD COLUMN profile TEXT;
+    CREATE TABLE IF NOT EXISTS normalized_clips (
+        source_path TEXT,
+        profile TEXT,
+        path TEXT,
+        size_bytes INTEGER,
+        last_used REAL,
+        PRIMARY KEY (source_path, profile)
+    );
+    CREATE INDEX IF NOT EXISTS idx_normalized_clips_last_used ON normalized_clips (last_used);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS render_cache (
+        cache_key TEXT PRIMARY KEY,
+        tokens TEXT,
+        kind TEXT,  -- "sentence" oder "fragment"
+        path TEXT,
+        size_bytes INTEGER,
+        hits INTEGER DEFAULT 0,
+        last_used REAL
+    );
+    CREATE TABLE IF NOT EXISTS render_cache_clips (
+        cache_key TEXT,
+        clip_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_render_cache_clips_clip_id ON render_cache_clips (clip_id);
+    CREATE INDEX IF NOT EXISTS idx_render_cache_clips_cache_key ON render_cache_clips (cache_key);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS occurrences (
+        id INTEGER PRIMARY KEY,
+        source TEXT,
+        word TEXT,
+        start_time REAL,
+        end_time REAL,
+        confidence REAL,
+        segment_id INTEGER,
+        video_id INTEGER  -- gesetzt, sobald ein Clip geschnitten wurde
+    );
+    CREATE INDEX IF NOT EXISTS idx_occurrences_word ON occurrences (word);
+    CREATE INDEX IF NOT EXISTS idx_occurrences_source ON occurrences (source, start_time);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_stages (
+        location TEXT,
+        stage TEXT,
+        status TEXT,  -- "done" oder "failed"
+        artifact_path TEXT,
+        artifact_hash TEXT,
+        error TEXT,
+        updated REAL,
+        PRIMARY KEY (location, stage)
+    );
+    DELETE FROM occurrences WHERE id NOT IN (
+        SELECT MIN(id) FROM occurrences GROUP BY source, word, start_time, end_time
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_occurrences_identity
+        ON occurrences (source, word, start_time, end_time);
+    """,
+    """
+    -- Schnittzeiten nach der Grenzverfeinerung; start_time/end_time bleiben
+    -- die Zeiten des Erkenners
+    ALTER TABLE videos ADD COLUMN refined_start REAL;
+    ALTER TABLE videos ADD COLUMN refined_end REAL;
+    """,
+    """
+    -- Vorschau: Atlasdatei und Zeile darin (siehe previews.py)
+    ALTER TABLE videos ADD COLUMN preview_atlas TEXT;
+    ALTER TABLE videos ADD COLUMN preview_row INTEGER;
+    """,
+    """
+    -- Gemessene Läufe als Grundlage der Kosten- und Dauerschätzung (estimator.py)
+    CREATE TABLE IF NOT EXISTS run_history (
+        id INTEGER PRIMARY KEY,
+        finished REAL,
+        backend TEXT,
+        height INTEGER,  -- Auflösung der Quellen, NULL bei gemischten Stapeln
+        sources INTEGER,
+        workers INTEGER,  -- gleichzeitig verarbeitete Videos
+        audio_seconds REAL,
+        words INTEGER,
+        clips INTEGER,
+        wall_seconds REAL,
+        billed_seconds REAL,
+        price_per_minute REAL
+    );
+    CREATE TABLE IF NOT EXISTS run_stage_history (
+        run_id INTEGER,
+        stage TEXT,
+        calls INTEGER,
+        seconds REAL,
+        items INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_run_stage_history_run_id ON run_stage_history (run_id);
+    """,
+    """
+    -- Ablage mit Unterordnern (clip_store.py): Der Pfad ergibt sich aus
+    -- file_name, das Prüfergebnis steht hier statt im Ordnernamen
+    ALTER TABLE videos ADD COLUMN size_bytes INTEGER;
+    ALTER TABLE videos ADD COLUMN verified INTEGER;  -- NULL ungeprüft, 1 bestätigt, 0 fehlerhaft
+    CREATE INDEX IF NOT EXISTS idx_videos_file_name ON videos (file_name);
+    """,
+    """
+    -- Änderungszähler für das Wortverzeichnis (word_index.py): jede Änderung
+    -- oder Löschung eines Clips erhöht changes, neue Clips erkennt das
+    -- Verzeichnis an ihrer ID
+    CREATE TABLE IF NOT EXISTS videos_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        changes INTEGER
+    );
+    INSERT OR IGNORE INTO videos_version (id, changes) VALUES (1, 0);
+    CREATE TRIGGER IF NOT EXISTS videos_updated
+        AFTER UPDATE OF word, file_name, rated, verified ON videos
+    BEGIN
+        UPDATE videos_version SET changes = changes + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS videos_deleted AFTER DELETE ON videos
+    BEGIN
+        UPDATE videos_version SET changes = changes + 1;
+    END;
+    """,
+    """
+    -- Stand der Quelle einer normalisierten Variante (normalization.py): Ändert
+    -- sich die Datei unter demselben Pfad, ist die Variante veraltet
+    ALTER TABLE normalized_clips ADD COLUMN source_mtime_ns INTEGER;
+    ALTER TABLE normalized_clips ADD COLUMN source_size INTEGER;
+    """,
+]
+
+
+def _statements(script):
+    """Zerlegt ein Migrationsskript in einzelne Anweisungen (auch Trigger)."""
+    statement = ""
+    for part in script.split(";"):
+        statement += part + ";"
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+class _ThreadConnection:
+    """
+    Hält die Verbindung eines Threads. threading.local gibt das Objekt frei,
+    sobald der Thread endet (z.B. ein Worker eines ThreadPoolExecutor);
+    dabei wird die Verbindung samt Dateideskriptoren geschlossen.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __del__(self):
+        self.close()
+
+
+class VideoRepository:
+    """
+    Zugriff auf die SQLite-Datenbank der Wortvideos.
+    Jeder Thread erhält eine eigene, langlebige Verbindung im WAL-Modus, so
+    dass Lesen und Schreiben aus einem Worker-Pool sicher nebeneinander laufen.
+    Beim Öffnen werden ausstehende Migrationen angewendet.
+    Der Pfad wird absolut gespeichert: Verbindungen entstehen pro Thread erst
+    bei Bedarf und sollen auch nach einem chdir dieselbe Datei öffnen.
+    """
+
+    def __init__(self, db_path="word_videos.db"):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+        # Nur lebende Threads halten ihre Verbindung; close() erreicht sie hier
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.migrate()
+
+    def connection(self):
+        """Liefert die Verbindung des aktuellen Threads."""
+        holder = getattr(self._local, "holder", None)
+        if holder is None or holder.conn is None:
+            # check_same_thread=False nur, damit die Verbindung beim Ende des
+            # Threads bzw. in close() geschlossen werden kann; benutzt wird
+            # sie weiterhin nur von ihrem Thread
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            holder = self._local.holder = _ThreadConnection(conn)
+            with self._lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    def open_connections(self):
+        """Anzahl der offenen Verbindungen (eine pro lebendem Thread)."""
+        with self._lock:
+            return sum(1 for holder in self._connections if holder.conn is not None)
+
+    @contextmanager
+    def transaction(self):
+        """Führt den Block in einer Transaktion aus (Commit oder Rollback)."""
+        conn = self.connection()
+        started = time.perf_counter()
+        error = False
+        try:
+            with conn:
+                yield conn
+        except Exception:
+            error = True
+            raise
+        finally:
+            METRICS.observe("db_write", time.perf_counter() - started, error)
+
+    def close(self):
+        """Schließt alle von diesem Repository geöffneten Verbindungen."""
+        with self._lock:
+            for holder in list(self._connections):
+                holder.close()
+            self._connections = weakref.WeakSet()
+        self._local = threading.local()
+
+    def migrate(self):
+        """
+        Wendet alle noch nicht angewendeten Schritte aus MIGRATIONS an.
+        Mehrere Prozesse (z.B. der Pool von ingest.py) können gleichzeitig
+        migrieren: Die Schritte laufen in einer Schreibtransaktion
+        (BEGIN IMMEDIATE), in der user_version erneut gelesen wird, so dass
+        jeder Schritt genau einmal angewendet wird.
+        """
+        conn = self.connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in _statements(script):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def insert_videos(self, rows):
+        """
+        Fügt viele Videos in einer Transaktion ein.
+        :param rows: Liste von (word, file_name, duration_ms, start_time, end_time,
+            refined_start, refined_end, size_bytes).
+        """
+        with self.transaction() as conn:
+            # Bereits vorhandene Clips (gleiches Wort, gleicher Dateiname) werden
+            # übersprungen, so dass ein erneuter Lauf keine Duplikate erzeugt
+            conn.executemany(
+                """
+                INSERT INTO videos (
+                    word, file_name, duration_ms, start_time, end_time,
+                    refined_start, refined_end, size_bytes
+                )
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM videos WHERE word = ? AND file_name = ?
+                )
+            """,
+                [tuple(row) + (row[0], row[1]) for row in rows],
+            )
+
+    def save_ratings(self, ratings):
+        """
+        Speichert viele Bewertungen in einer Transaktion.
+        :param ratings: Liste von (word, file_name, rating).
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE videos SET rated = ? WHERE word = ? AND file_name = ?",
+                [(rating, word, file_name) for word, file_name, rating in ratings],
+            )
+
+    def set_verified(self, results):
+        """
+        Speichert Prüfergebnisse in einer Transaktion.
+        :param results: Liste von (word, file_name, verified) mit verified 1 oder 0.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE videos SET verified = ? WHERE word = ? AND file_name = ?",
+                [(verified, word, file_name) for word, file_name, verified in results],
+            )
+
+    def save_rating(self, word, file_name, rating):
+        self.save_ratings([(word, file_name, rating)])
+
+    def get_rating(self, word, file_name):
+        """Gibt die Bewertung zurück oder None, wenn das Video nicht existiert."""
+        row = (
+            self.connection()
+            .execute(
+                "SELECT rated FROM videos WHERE word = ? AND file_name = ?",
+                (word, file_name),
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def unrated_videos(self, limit=None):
+        """
+        Liefert die noch unbewerteten Videos (rated = -1), nach Wort sortiert;
+        als fehlerhaft geprüfte Clips werden ausgelassen.
+        :return: Liste von (id, word, file_name).
+        """
+        query = (
+            "SELECT id, word, file_name FROM videos "
+            "WHERE rated = -1 AND COALESCE(verified, 1) != 0 ORDER BY word, id"
+        )
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return self.connection().execute(query).fetchall()
+
+    def delete_video(self, word, file_name):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM videos WHERE word = ? AND file_name = ?", (word, file_name)
+            )
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(db_path="word_videos.db"):
+    """Liefert das gemeinsame Repository für eine Datenbankdatei."""
+    db_path = os.path.abspath(db_path)
+    with _repositories_lock:
+        repository = _repositories.get(db_path)
+        if repository is None:
+            repository = _repositories[db_path] = VideoRepository(db_path)
+        return repository
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Die Module liegen flach im Wurzelverzeichnis des Repositorys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_RATE = 16000
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Leeres Arbeitsverzeichnis mit eigener word_videos.db."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def synthetic_pcm(duration, silences=(), seed=0, amplitude=3000):
+    """
+    Rauschen als 16-Bit-Mono-PCM mit stillen Bereichen.
+    :param silences: Liste von (start, end) in Sekunden.
+    """
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(
+        -amplitude, amplitude, int(duration * SAMPLE_RATE), dtype=np.int16
+    )
+    for start, end in silences:
+        samples[int(start * SAMPLE_RATE) : int(end * SAMPLE_RATE)] = 0
+    return samples
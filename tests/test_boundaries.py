@@ -0,0 +1,41 @@
+import numpy as np
+
+from boundaries import BoundaryRefiner, frame_features
+from conftest import SAMPLE_RATE, synthetic_pcm
+
+
+def test_frame_features():
+    samples = synthetic_pcm(1.0, silences=[(0.5, 1.0)])
+    energy, zcr = frame_features(samples, SAMPLE_RATE)
+
+    assert len(energy) == len(zcr) == 100
+    assert energy[:50].min() > 1000
+    assert np.all(energy[50:] == 0)
+    # Weißes Rauschen wechselt etwa bei jedem zweiten Sample das Vorzeichen
+    assert 0.4 < zcr[:50].mean() < 0.6
+    empty, _ = frame_features(samples[:10], SAMPLE_RATE)
+    assert len(empty) == 0
+
+
+def test_boundaries_snap_to_the_nearest_pause():
+    # Genug Stille, damit der Grundpegel unter dem Rauschen liegt
+    samples = synthetic_pcm(3.0, silences=[(0.0, 0.2), (1.0, 1.2), (2.5, 3.0)])
+    refiner = BoundaryRefiner(samples, SAMPLE_RATE, offset=10.0)
+
+    (word, start, end, raw_start, raw_end), far = refiner.refine(
+        [("hallo", 10.3, 11.05), ("welt", 10.4, 10.6)]
+    )
+    # Das Ende wandert in die Pause, der Anfang hat keine Pause in Reichweite
+    assert (word, raw_start, raw_end) == ("hallo", 10.3, 11.05)
+    assert start == 10.3
+    assert 11.0 <= end <= 11.2
+    assert far[1:3] == (10.4, 10.6)
+
+
+def test_words_that_would_get_too_short_stay_unchanged():
+    samples = synthetic_pcm(3.0, silences=[(1.0, 1.2)])
+    refiner = BoundaryRefiner(samples, SAMPLE_RATE)
+
+    [(_, start, end, _, _)] = refiner.refine([("und", 1.02, 1.1)], min_duration=0.2)
+    assert (start, end) == (1.02, 1.1)
+    assert refiner.refine([]) == []
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+from cli_arguments import BACKEND_NAMES
+from recognizers import BACKENDS
+from wordvideo import build_parser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_backend_names_match_recognizers():
+    assert BACKEND_NAMES == list(BACKENDS)
+
+
+def test_parser_builds_without_heavy_imports():
+    # In einem frischen Interpreter: Parser aufbauen und prüfen, was geladen wurde
+    script = (
+        "import sys, wordvideo; wordvideo.build_parser(); "
+        "print(','.join(m for m in ('ingest', 'numpy', 'recognizers') if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    assert output == ""
+
+
+def test_ingest_and_backend_arguments():
+    args = build_parser().parse_args(
+        ["ingest", "urls.txt", "--backend", "vosk", "--video-workers", "3"]
+    )
+    assert (args.locations, args.backend, args.video_workers) == ("urls.txt", "vosk", 3)
+    assert args.model is None
+
+    args = build_parser().parse_args(["verify", "video.mp4", "--no-cache"])
+    assert (args.backend, args.no_cache, args.mode) == ("google", True, "local")
@@ -0,0 +1,128 @@
+import os
+
+from clip_store import (
+    clip_file_name,
+    clip_key,
+    clip_path,
+    faulty_clip_names,
+    manifest,
+    mark_verified,
+    migrate_legacy_clips,
+    partial_path,
+    shard_dir,
+)
+from storage import get_repository
+
+
+SOURCE_HASH = "0123456789abcdef" * 4
+
+
+def test_clip_key_is_deterministic():
+    key = clip_key("hallo", SOURCE_HASH, 1.2341, 1.9)
+    assert key == clip_key("hallo", SOURCE_HASH[:12], 1.2341, 1.9)
+    assert len(key) == 32
+    assert clip_file_name("hallo", SOURCE_HASH, 1.2341, 1.9) == key + ".mp4"
+
+    assert key != clip_key("welt", SOURCE_HASH, 1.2341, 1.9)
+    assert key != clip_key("hallo", "f" * 64, 1.2341, 1.9)
+    assert key != clip_key("hallo", SOURCE_HASH, 1.3, 1.9)
+    # Zeiten zählen auf Millisekunden genau
+    assert key == clip_key("hallo", SOURCE_HASH, 1.23412, 1.9)
+
+
+def test_shard_layout():
+    name = clip_file_name("hallo", SOURCE_HASH, 0.0, 0.5)
+    directory = shard_dir(name)
+    parts = os.path.relpath(directory, "clips").split(os.sep)
+
+    assert len(parts) == 2
+    assert all(len(part) == 2 and int(part, 16) >= 0 for part in parts)
+    assert clip_path(name) == os.path.join(directory, name)
+    assert shard_dir(name, root="andere") == os.path.join("andere", *parts)
+    assert partial_path(clip_path(name)).endswith(name[:-4] + ".part.mp4")
+
+
+def _insert(word, file_name):
+    get_repository().insert_videos([(word, file_name, 500, 1.0, 1.5, 1.0, 1.5, 3)])
+
+
+def _write(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as clip_file:
+        clip_file.write(b"mp4")
+
+
+def test_migrate_legacy_clips(workdir):
+    legacy_name = f"hallo_{SOURCE_HASH[:12]}_1000_1500.mp4"
+    _insert("hallo", legacy_name)
+    _insert("welt", "welt_1.mp4")
+    _insert("und", "und_1.mp4")
+    _write(os.path.join("Wörter", "hallo", legacy_name))
+    _write(os.path.join("Wörter", "geprüft", "welt", "welt_1.mp4"))
+    _write(os.path.join("Wörter", "fehlerhaft", "und", "und_1.mp4"))
+    _write(os.path.join("Wörter", "hallo", "unbekannt.mp4"))
+    (workdir / "word_index.json").write_text("{}")
+
+    counts = migrate_legacy_clips()
+
+    assert counts == {"moved": 3, "unknown": 1, "skipped": 0}
+    new_name = clip_file_name("hallo", SOURCE_HASH, 1.0, 1.5)
+    assert [(name, verified) for _, name, _, verified in manifest("hallo")] == [
+        (new_name, None)
+    ]
+    assert os.path.exists(clip_path(new_name))
+    assert manifest("welt")[0][3] == 1
+    assert manifest("und")[0][3] == 0
+    assert os.path.exists(clip_path("welt_1.mp4"))
+    assert os.path.exists(os.path.join("Wörter", "hallo", "unbekannt.mp4"))
+    assert not os.path.exists("word_index.json")
+
+    # Ein zweiter Lauf findet nichts mehr zu verschieben
+    assert migrate_legacy_clips()["moved"] == 0
+
+
+def test_mark_verified_skips_unknown_results(workdir):
+    _insert("hallo", "a.mp4")
+    _insert("hallo", "b.mp4")
+    _insert("hallo", "c.mp4")
+    clips = [
+        ("hallo", name, clip_path(name), 1.0, 1.5)
+        for name in ("a.mp4", "b.mp4", "c.mp4")
+    ]
+
+    mark_verified([(clips[0], True), (clips[1], False), (clips[2], None)])
+
+    assert [verified for _, _, _, verified in manifest("hallo")] == [1, 0, None]
+
+
+def test_faulty_clips_are_not_cut_again(workdir, monkeypatch):
+    import cut_youtube_to_word_video as pipeline
+
+    commands = []
+    monkeypatch.setattr(pipeline, "run_tool", lambda *a, **k: commands.append(a))
+    faulty = clip_file_name("hallo", SOURCE_HASH, 1.0, 1.5)
+    kept = clip_file_name("welt", SOURCE_HASH, 2.0, 2.5)
+    _insert("hallo", faulty)
+    _insert("welt", kept)
+    _write(clip_path(faulty))
+    _write(clip_path(kept))
+    clips = [
+        ("hallo", faulty, clip_path(faulty), 1.0, 1.5),
+        ("welt", kept, clip_path(kept), 2.0, 2.5),
+    ]
+    mark_verified([(clips[0], False), (clips[1], True)])
+    assert faulty_clip_names([faulty, kept, "fehlt.mp4"]) == {faulty}
+
+    # Die Datei verschwindet, die Zeile bleibt als fehlerhaft stehen
+    pipeline.discard_faulty_clip("hallo", faulty)
+    assert not os.path.exists(clip_path(faulty))
+    assert [verified for _, _, _, verified in manifest("hallo")] == [0]
+
+    created = pipeline.cut_video_by_words(
+        "quelle.mp4",
+        [("hallo", 1.0, 1.5), ("welt", 2.0, 2.5)],
+        source_hash=SOURCE_HASH,
+        previews=False,
+    )
+    assert [file_name for _, file_name, _, _, _ in created] == [kept]
+    assert commands == []
@@ -0,0 +1,96 @@
+import pytest
+
+import estimator
+from estimator import (
+    DEFAULT_SPREAD,
+    CostEstimator,
+    LinearModel,
+    RunHistory,
+    plan_batch,
+)
+
+
+def _record(audio_seconds, wall_seconds, height=720, workers=1, noise=0.0):
+    report = {
+        "recognizer": {"billed_seconds": audio_seconds},
+        "stages": {
+            "transcribe": {"calls": 1, "seconds": wall_seconds / 2 + noise, "items": 1}
+        },
+    }
+    RunHistory().record(
+        report,
+        audio_seconds=audio_seconds,
+        words=audio_seconds * 2,
+        wall_seconds=wall_seconds + noise,
+        height=height,
+        workers=workers,
+        backend="google",
+    )
+
+
+def test_without_runs_the_defaults_apply(workdir):
+    estimate = CostEstimator(backend="google").estimate([(120.0, 720)], 0.6)
+
+    assert estimate.runs == 0
+    assert estimate.cost == pytest.approx(1.2)
+    assert estimate.cost_high == pytest.approx(1.2 * (1 + DEFAULT_SPREAD))
+    assert estimate.seconds == pytest.approx(120.0)
+    assert estimate.words == pytest.approx(240.0)
+
+
+def test_estimate_follows_measured_runs(workdir):
+    for i, minutes in enumerate((1, 2, 4, 8, 3)):
+        _record(minutes * 60.0, minutes * 30.0, noise=(-1) ** i * 2.0)
+    cost = CostEstimator(backend="google")
+
+    estimate = cost.estimate([(600.0, 720)], price_per_minute=0.6)
+    assert estimate.runs == 5
+    assert estimate.cost == pytest.approx(6.0, rel=0.01)
+    assert estimate.seconds == pytest.approx(300.0, rel=0.05)
+    assert estimate.seconds_low < estimate.seconds < estimate.seconds_high
+    assert estimate.stages["transcribe"] == pytest.approx(150.0, rel=0.05)
+    assert cost.words_per_minute() == pytest.approx(120.0)
+    # Andere Backends haben eigene Läufe
+    assert CostEstimator(backend="whisper").estimate([(600.0, 720)]).runs == 0
+
+
+def test_runs_of_the_same_resolution_take_precedence(workdir):
+    for minutes in (1, 2, 3):
+        _record(minutes * 60.0, minutes * 30.0, height=720)
+        _record(minutes * 60.0, minutes * 120.0, height=1080)
+
+    cost = CostEstimator(backend="google")
+    assert cost.estimate([(60.0, 1080)]).seconds == pytest.approx(120.0)
+    assert cost.estimate([(60.0, 720)]).seconds == pytest.approx(30.0)
+    assert cost.estimate([(60.0, 480)]).runs == 6
+
+
+def test_single_run_uses_default_spread():
+    model = LinearModel([[2.0, 100.0, 1.0]], [60.0])
+    assert model.columns == 1
+    assert model.predict([4.0, 200.0, 1.0]) == pytest.approx(
+        (120.0, 120.0 * (1 - DEFAULT_SPREAD), 120.0 * (1 + DEFAULT_SPREAD))
+    )
+
+
+def test_plan_batch_picks_workers_for_the_deadline(workdir, monkeypatch):
+    sources = {"a": (3600.0, 720), "b": (3600.0, 720), "kaputt": None}
+
+    def source_info(location, local=False):
+        if sources[location] is None:
+            raise OSError("nicht erreichbar")
+        return sources[location]
+
+    monkeypatch.setattr(estimator, "source_info", source_info)
+    plan = plan_batch(["a", "b", "kaputt"], deadline_hours=1.0, price_per_minute=0.0)
+
+    # Ohne Läufe: 2 Stunden Arbeit, obere Grenze 3 Stunden
+    assert plan.sources == 2
+    assert plan.failed == ["kaputt"]
+    assert plan.workers == 3
+    assert plan.deadline_met
+    assert plan.wall_seconds_high == pytest.approx(3600.0)
+
+    plan = plan_batch(["a", "b"], deadline_hours=0.1, max_workers=4, price_per_minute=0.0)
+    assert plan.workers is None
+    assert not plan.deadline_met
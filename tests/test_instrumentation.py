@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from instrumentation import METRICS, popen_tool, run_tool, timed
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    METRICS.reset()
+    yield
+    METRICS.reset()
+
+
+def test_run_tool_counts_only_its_own_calls():
+    run_tool([sys.executable, "-c", "pass"], check=True)
+    process = popen_tool([sys.executable, "-c", "print(1)"], stdout=subprocess.PIPE)
+    assert process.communicate()[0].strip() == b"1"
+    # Direkte Aufrufe von subprocess laufen am Zähler vorbei
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+
+    program = sys.executable.rsplit("/", 1)[-1]
+    assert METRICS.report()["subprocesses"] == {program: 2}
+    assert subprocess.Popen.__module__ == "subprocess"
+
+
+def test_timed_generator_excludes_consumer_and_upstream_time():
+    @timed("upstream_stage")
+    def produce():
+        for value in range(3):
+            time.sleep(0.05)
+            yield value
+
+    @timed("downstream_stage", upstream="values")
+    def double(values):
+        for value in values:
+            yield value * 2
+
+    results = []
+    for value in double(produce()):
+        time.sleep(0.05)
+        results.append(value)
+
+    stages = METRICS.report()["stages"]
+    assert results == [0, 2, 4]
+    assert stages["upstream_stage"]["seconds"] >= 0.15
+    assert stages["downstream_stage"]["items"] == 3
+    # Weder die Wartezeit auf produce noch die des Verbrauchers zählt mit
+    assert stages["downstream_stage"]["seconds"] < 0.05
+
+
+def test_prometheus_text_contains_stages_and_subprocesses():
+    METRICS.observe("cut", 0.5, items=2, bytes_written=100)
+    METRICS.count_subprocess("ffmpeg")
+
+    text = METRICS.prometheus_text()
+    assert 'wordvideo_stage_calls_total{stage="cut"} 1' in text
+    assert 'wordvideo_subprocesses_total{program="ffmpeg"} 1' in text
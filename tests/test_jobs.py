@@ -0,0 +1,84 @@
+import pytest
+
+from jobs import STAGES, JobTracker, StageError, hash_file, hash_values, stage_errors
+
+
+URL = "https://example.com/video"
+
+
+def _done_stages(tracker):
+    return [stage for stage in STAGES if tracker.is_done(URL, stage)]
+
+
+def test_resume_starts_after_last_completed_stage(workdir):
+    tracker = JobTracker()
+    assert tracker.first_incomplete(URL) == "download"
+
+    (workdir / "video.mp4").write_bytes(b"video")
+    tracker.complete(URL, "download", "video.mp4", hash_file("video.mp4"))
+    tracker.complete(URL, "extract")
+    assert tracker.first_incomplete(URL) == "transcribe"
+    assert tracker.stage(URL, "download") == ("video.mp4", hash_file("video.mp4"))
+
+    for stage in ("transcribe", "cut", "verify"):
+        tracker.complete(URL, stage, artifact_hash=hash_values([stage]))
+    assert tracker.first_incomplete(URL) is None
+
+
+def test_failed_stage_stays_incomplete(workdir):
+    tracker = JobTracker()
+    tracker.complete(URL, "download")
+    tracker.complete(URL, "extract")
+    tracker.fail(URL, "transcribe", "2 Segmente konnten nicht erkannt werden")
+
+    assert not tracker.is_done(URL, "transcribe")
+    assert tracker.first_incomplete(URL) == "transcribe"
+
+    tracker.complete(URL, "transcribe", artifact_hash=hash_values(["hallo"]))
+    assert tracker.first_incomplete(URL) == "cut"
+
+
+def test_changed_artifact_invalidates_later_stages(workdir):
+    tracker = JobTracker()
+    tracker.complete(URL, "download")
+    tracker.complete(URL, "extract")
+    tracker.complete(URL, "transcribe", artifact_hash=hash_values(["hallo"]))
+    tracker.complete(URL, "cut", artifact_hash=hash_values(["a.mp4"]))
+    tracker.complete(URL, "verify", artifact_hash=hash_values(["a.mp4"]))
+
+    # Gleiches Transkript: nichts wird zurückgesetzt
+    tracker.complete(URL, "transcribe", artifact_hash=hash_values(["hallo"]))
+    assert _done_stages(tracker) == STAGES
+
+    # Anderes Transkript: Schnitt und Prüfung müssen wiederholt werden
+    tracker.complete(URL, "transcribe", artifact_hash=hash_values(["hallo", "welt"]))
+    assert _done_stages(tracker) == ["download", "extract", "transcribe"]
+    assert tracker.first_incomplete(URL) == "cut"
+
+
+def test_missing_artifact_makes_stage_incomplete(workdir):
+    tracker = JobTracker()
+    (workdir / "audio.pcm").write_bytes(b"\0\0")
+    tracker.complete(URL, "extract", "audio.pcm", hash_file("audio.pcm"))
+    assert tracker.is_done(URL, "extract")
+
+    (workdir / "audio.pcm").unlink()
+    assert tracker.stage(URL, "extract") is None
+
+
+def test_stage_errors_keep_the_failing_stage(workdir):
+    tracker = JobTracker()
+    tracker.complete(URL, "transcribe", artifact_hash=hash_values(["a"]))
+
+    with pytest.raises(StageError) as raised:
+        with stage_errors("transcribe"):
+            with stage_errors("cut"):
+                raise OSError("Platte voll")
+    assert raised.value.stage == "cut"
+    assert isinstance(raised.value.error, OSError)
+
+    # Nur die fehlgeschlagene Stufe wird vermerkt, transcribe bleibt fertig
+    tracker.fail(URL, raised.value.stage, raised.value.error)
+    assert tracker.is_done(URL, "transcribe")
+    assert not tracker.is_done(URL, "cut")
+    assert tracker.first_incomplete(URL) == "cut"
@@ -0,0 +1,63 @@
+import os
+
+import normalization
+from normalization import NormalizedClipCache, normalize_clips, profile_name
+from storage import get_repository
+
+
+def _fake_transcode(calls):
+    # Kopiert den Clip statt ihn mit ffmpeg umzukodieren
+    def transcode(video_path, profile, output_path):
+        calls.append(video_path)
+        with open(video_path, "rb") as source, open(output_path, "wb") as output:
+            output.write(source.read())
+
+    return transcode
+
+
+def _clip(file_name, content):
+    path = os.path.join("clips", file_name)
+    os.makedirs("clips", exist_ok=True)
+    with open(path, "wb") as clip_file:
+        clip_file.write(content)
+    return path
+
+
+def test_variant_follows_changes_of_the_source(workdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(normalization, "transcode_to_profile", _fake_transcode(calls))
+    cache = NormalizedClipCache()
+    path = _clip("a.mp4", b"alt")
+
+    first = cache.get(path)
+    assert cache.get(path) == first
+    assert calls == [path]
+
+    # Gleicher Pfad, neuer Inhalt: neue Variante, die alte wird gelöscht
+    _clip("a.mp4", b"neuer Inhalt")
+    second = cache.get(path)
+    assert second != first
+    assert not os.path.exists(first)
+    with open(second, "rb") as variant:
+        assert variant.read() == b"neuer Inhalt"
+    assert len(calls) == 2
+
+
+def test_evict_clears_the_profile_of_evicted_clips(workdir, monkeypatch):
+    monkeypatch.setattr(normalization, "transcode_to_profile", _fake_transcode([]))
+    repository = get_repository()
+    clips = []
+    for name in ("a.mp4", "b.mp4"):
+        path = _clip(name, b"12345")
+        repository.insert_videos([("wort", name, 500, 0.0, 0.5, 0.0, 0.5, 5)])
+        clips.append(("wort", name, path, 0.0, 0.5))
+    cache = NormalizedClipCache(max_bytes=5)
+
+    normalize_clips(clips, cache)
+
+    profiles = dict(
+        repository.connection().execute("SELECT file_name, profile FROM videos")
+    )
+    assert profiles == {"a.mp4": None, "b.mp4": profile_name(cache.profile)}
+    rows = repository.connection().execute("SELECT source_path FROM normalized_clips")
+    assert [row[0] for row in rows] == [clips[1][2]]
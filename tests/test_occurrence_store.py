@@ -0,0 +1,207 @@
+import os
+
+import create_video
+import cut_youtube_to_word_video as pipeline
+from occurrence_store import (
+    OccurrenceStore,
+    link_clips,
+    linked_clips,
+    load_occurrences,
+    plan_cuts,
+    record_occurrences,
+    usable_clip_counts,
+)
+from recognizers import RecognizedWord
+from storage import get_repository
+from word_index import VocabularyIndex
+
+
+SOURCE = "downloads/quelle.mp4"
+
+
+def _record(segment_id, words, source=SOURCE):
+    record_occurrences(
+        source, segment_id, [RecognizedWord(*word) for word in words]
+    )
+
+
+def _insert_clip(word, file_name, start_time, end_time, verified=None, rated=None):
+    repository = get_repository()
+    repository.insert_videos(
+        [
+            (word, file_name, (end_time - start_time) * 1000, start_time, end_time)
+            + (start_time, end_time, 100)
+        ]
+    )
+    conn = repository.connection()
+    with repository.transaction():
+        if verified is not None:
+            conn.execute(
+                "UPDATE videos SET verified = ? WHERE file_name = ?", (verified, file_name)
+            )
+        if rated is not None:
+            conn.execute(
+                "UPDATE videos SET rated = ? WHERE file_name = ?", (rated, file_name)
+            )
+
+
+def _fake_cut(calls):
+    # Ersetzt den ffmpeg-Schnitt: legt nur die Datenbankeinträge an
+    def cut(video_path, words_with_timestamps, db_path="word_videos.db", **kwargs):
+        calls.append((video_path, sorted(words_with_timestamps)))
+        clips = []
+        for word, start_time, end_time in words_with_timestamps:
+            file_name = f"{word}_{start_time:.2f}.mp4"
+            _insert_clip(word, file_name, start_time, end_time)
+            clips.append((word, file_name, file_name, start_time, end_time))
+        return clips
+
+    return cut
+
+
+def test_record_and_load_occurrences(workdir):
+    _record(1, [("welt", 2.0, 2.4, 0.8)])
+    _record(0, [("hallo", 0.0, 0.5, 0.9), ("welt", 0.6, 1.0, None)])
+    # Wiederholtes Speichern legt keine Duplikate an
+    _record(0, [("hallo", 0.0, 0.5, 0.9)])
+
+    segments = load_occurrences(SOURCE)
+    assert [segment_id for segment_id, _ in segments] == [0, 1]
+    assert [w.word for w in segments[0][1]] == ["hallo", "welt"]
+    assert segments[0][1][1].confidence is None
+    assert len(OccurrenceStore.load()) == 3
+
+
+def test_best_candidates_ranks_by_confidence(workdir):
+    _record(
+        0,
+        [
+            ("hallo", 0.0, 0.5, 0.4),
+            ("hallo", 1.0, 1.3, 0.95),
+            ("hallo", 2.0, 3.9, None),
+            ("welt", 4.0, 4.5, 0.7),
+        ],
+    )
+    store = OccurrenceStore.load()
+
+    assert store.count("hallo") == 3
+    assert store.count("fehlt") == 0
+    ranked = store.best_candidates("hallo", n=3)
+    assert [c["start_time"] for c in ranked] == [1.0, 2.0, 0.0]
+    assert ranked[1]["confidence"] is None
+    assert all(c["video_id"] is None for c in ranked)
+    # Die Dauer zählt nur mit ideal_duration
+    assert store.best_candidates("hallo", n=1, ideal_duration=0.3)[0]["start_time"] == 1.0
+    assert [c["start_time"] for c in store.best_candidates("hallo", 5, min_confidence=0.5)] == [
+        1.0,
+        2.0,
+    ]
+    assert store.best_candidates("fehlt") == []
+
+
+def test_store_filters_by_segment_and_ignores_deleted_clips(workdir):
+    _record(0, [("hallo", 0.0, 0.5, 0.9)])
+    _record(1, [("hallo", 5.0, 5.5, 0.8)])
+    _insert_clip("hallo", "a.mp4", 0.0, 0.5)
+    link_clips(SOURCE, [("hallo", "a.mp4", "a.mp4", 0.0, 0.5)])
+
+    segment = OccurrenceStore.load(source=SOURCE, segment_id=1)
+    assert len(segment) == 1
+    assert segment.best_candidates("hallo")[0]["start_time"] == 5.0
+
+    store = OccurrenceStore.load()
+    assert store.best_candidates("hallo")[0]["video_id"] is not None
+    assert linked_clips(SOURCE)[0][0] == 0
+
+    get_repository().delete_video("hallo", "a.mp4")
+    store.reload()
+    assert all(c["video_id"] is None for c in store.best_candidates("hallo"))
+
+
+def test_plan_cuts_only_cuts_words_that_need_clips(workdir):
+    _record(
+        0,
+        [
+            ("hallo", 0.0, 0.5, 0.5),
+            ("hallo", 1.0, 1.5, 0.9),
+            ("welt", 2.0, 2.5, 0.8),
+            ("schön", 3.0, 3.5, 0.8),
+        ],
+    )
+    # "welt" hat schon genug nutzbare Clips, der schlecht bewertete von
+    # "schön" und der fehlerhafte von "hallo" zählen nicht
+    _insert_clip("welt", "w.mp4", 9.0, 9.5)
+    _insert_clip("schön", "s.mp4", 9.0, 9.5, rated=0)
+    _insert_clip("hallo", "h.mp4", 8.0, 8.5, verified=0)
+    assert usable_clip_counts(["hallo", "welt", "schön"]) == {"welt": 1}
+
+    planned = plan_cuts(SOURCE, 0, clips_per_word=1)
+    assert sorted(planned) == [("hallo", 1.0, 1.5), ("schön", 3.0, 3.5)]
+
+    # Bereits geschnittene Vorkommen des Segments bleiben im Plan, auch wenn
+    # das Wort inzwischen genug Clips hat
+    _insert_clip("hallo", "h2.mp4", 1.0, 1.5)
+    link_clips(SOURCE, [("hallo", "h2.mp4", "h2.mp4", 1.0, 1.5)])
+    assert ("hallo", 1.0, 1.5) in plan_cuts(SOURCE, 0, clips_per_word=1)
+    assert ("hallo", 0.0, 0.5) not in plan_cuts(SOURCE, 0, clips_per_word=1)
+    assert ("hallo", 0.0, 0.5) in plan_cuts(SOURCE, 0, clips_per_word=2)
+
+
+def test_cut_candidates_cuts_only_missing_clips(workdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "cut_video_by_words", _fake_cut(calls))
+    _record(0, [("hallo", 0.0, 0.5, 0.9), ("hallo", 1.0, 1.5, 0.5)])
+    _record(0, [("hallo", 3.0, 3.5, 0.7)], source="downloads/andere.mp4")
+    store = OccurrenceStore.load()
+
+    candidates = pipeline.cut_candidates("hallo", store, n=2)
+    assert [c["start_time"] for c in candidates] == [0.0, 3.0]
+    assert all(c["video_id"] is not None for c in candidates)
+    assert sorted(source for source, _ in calls) == ["downloads/andere.mp4", SOURCE]
+
+    # Der zweite Aufruf findet die Clips und schneidet nichts mehr
+    calls.clear()
+    assert pipeline.cut_candidates("hallo", store, n=2) == candidates
+    assert calls == []
+
+
+def test_select_clips_cuts_missing_words_on_demand(workdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "cut_video_by_words", _fake_cut(calls))
+    _insert_clip("hallo", "h.mp4", 0.0, 0.5)
+    _record(0, [("welt", 1.0, 1.5, 0.9)])
+    index = VocabularyIndex.load(snapshot_path=None)
+
+    clips, missing = create_video.select_clips("Hallo neue", index, cut_missing=False)
+    assert [word for word, _, _ in clips] == ["hallo"]
+    assert list(missing) == ["neue"]
+
+    clips, missing = create_video.select_clips("hallo welt neue", index)
+    assert [word for word, _, _ in clips] == ["hallo", "welt"]
+    assert os.path.basename(clips[1][2]) == "welt_1.00.mp4"
+    assert list(missing) == ["neue"]
+    assert len(calls) == 1
+    assert "welt" in index.words()
+
+
+def test_faulty_clips_drop_out_of_candidates_and_verification(workdir):
+    _record(0, [("hallo", 0.0, 0.5, 0.9), ("hallo", 1.0, 1.5, 0.5)])
+    _insert_clip("hallo", "a.mp4", 0.0, 0.5, verified=0)
+    _insert_clip("hallo", "b.mp4", 1.0, 1.5)
+    link_clips(
+        SOURCE,
+        [
+            ("hallo", "a.mp4", "a.mp4", 0.0, 0.5),
+            ("hallo", "b.mp4", "b.mp4", 1.0, 1.5),
+        ],
+    )
+
+    store = OccurrenceStore.load()
+    assert [c["start_time"] for c in store.best_candidates("hallo")] == [1.0]
+    assert plan_cuts(SOURCE, 0) == [("hallo", 1.0, 1.5)]
+    assert [name for _, name, _, _, _ in linked_clips(SOURCE)[0][1]] == ["b.mp4"]
+
+    # Die Prüfung setzt nur bei den noch ungeprüften Clips wieder ein
+    assert len(linked_clips(SOURCE, unverified_only=True)[0][1]) == 1
+    get_repository().set_verified([("hallo", "b.mp4", 1)])
+    assert linked_clips(SOURCE, unverified_only=True) == []
@@ -0,0 +1,62 @@
+import os
+import threading
+
+import pytest
+
+from previews import _reserve_atlas, add_to_atlas, list_previews, preview_boxes
+from storage import get_repository
+
+
+def test_reserve_atlas_hands_out_each_file_once(workdir):
+    os.makedirs("previews")
+    open(os.path.join("previews", "hallo_0.jpg"), "wb").close()
+    paths = []
+
+    def reserve():
+        for _ in range(10):
+            paths.append(_reserve_atlas("previews", "hallo"))
+
+    threads = [threading.Thread(target=reserve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(paths)) == 40
+    assert os.path.join("previews", "hallo_0.jpg") not in paths
+    assert os.path.exists(os.path.join("previews", "hallo_40.jpg"))
+
+
+def test_preview_boxes():
+    thumbnail, tiles = preview_boxes(2)
+    assert len(tiles) == 5
+    assert tiles[0] == (0, 180, 160, 270)
+    assert thumbnail == tiles[2]
+
+
+def test_add_to_atlas_writes_one_file_per_batch(workdir):
+    Image = pytest.importorskip("PIL.Image")
+    repository = get_repository()
+    names = [f"clip{i}.mp4" for i in range(3)]
+    repository.insert_videos(
+        [("hallo", name, 500, 0.0, 0.5, 0.0, 0.5, 100) for name in names]
+    )
+    sprites = []
+    for i, name in enumerate(names):
+        sprite_path = f"clip{i}.sprite.jpg"
+        Image.new("RGB", (800, 90), (80 * i, 0, 0)).save(sprite_path)
+        sprites.append((name, sprite_path))
+
+    add_to_atlas("hallo", sprites[:2])
+    first = os.path.getmtime(os.path.join("previews", "hallo_0.jpg"))
+    add_to_atlas("hallo", sprites[2:])
+
+    previews = list_previews("hallo")
+    assert [(p["atlas"], p["tiles"][0][1]) for p in previews] == [
+        (os.path.join("previews", "hallo_0.jpg"), 0),
+        (os.path.join("previews", "hallo_0.jpg"), 90),
+        (os.path.join("previews", "hallo_1.jpg"), 0),
+    ]
+    # Der erste Atlas wird beim zweiten Aufruf nicht neu geschrieben
+    assert os.path.getmtime(os.path.join("previews", "hallo_0.jpg")) == first
+    assert not any(os.path.exists(path) for _, path in sprites)
@@ -0,0 +1,98 @@
+import os
+
+import create_video
+from render_cache import RenderCache, invalidate_clip
+from storage import get_repository
+
+
+def _clips(words):
+    # Ein Clip pro Wort; der Inhalt ist das Wort selbst
+    repository = get_repository()
+    clips = []
+    for word in words:
+        path = f"{word}.mp4"
+        if not os.path.exists(path):
+            with open(path, "wb") as clip_file:
+                clip_file.write(word.encode())
+            repository.insert_videos([(word, path, 500, 0.0, 0.5, 0.0, 0.5, 1)])
+        clip_id = (
+            repository.connection()
+            .execute("SELECT id FROM videos WHERE file_name = ?", (path,))
+            .fetchone()[0]
+        )
+        clips.append((word, clip_id, path))
+    return clips
+
+
+def _fake_render(renders):
+    # Verkettet die Dateien byteweise statt mit ffmpeg
+    def render_clips(video_paths, output_path):
+        renders.append(len(video_paths))
+        with open(output_path, "wb") as output:
+            for video_path in video_paths:
+                with open(video_path, "rb") as part:
+                    output.write(part.read())
+
+    return render_clips
+
+
+def _read(path):
+    with open(path, "rb") as output:
+        return output.read().decode()
+
+
+def test_render_reuses_shifted_fragments(workdir, monkeypatch):
+    renders = []
+    monkeypatch.setattr(create_video, "render_clips", _fake_render(renders))
+    cache = RenderCache()
+
+    cache.render(_clips("abcd"), "eins.mp4")
+    assert _read("eins.mp4") == "abcd"
+    assert cache.stats()["fragment_hits"] == 0
+
+    # "b c d" ist als verschobenes Fenster abgelegt und wird wiederverwendet
+    cache.render(_clips("bcdef"), "zwei.mp4")
+    assert _read("zwei.mp4") == "bcdef"
+    assert cache.stats()["fragment_hits"] == 1
+
+    renders.clear()
+    cache.render(_clips("bcdef"), "drei.mp4")
+    assert _read("drei.mp4") == "bcdef"
+    assert renders == []
+    assert cache.stats()["sentence_hits"] == 1
+
+
+def test_lru_eviction_keeps_cache_under_limit(workdir, monkeypatch):
+    monkeypatch.setattr(create_video, "render_clips", _fake_render([]))
+    cache = RenderCache(max_bytes=5, fragment_size=10)
+
+    cache.render(_clips("ab"), "eins.mp4")
+    cache.render(_clips("cd"), "zwei.mp4")
+    cache.render(_clips("ef"), "drei.mp4")
+
+    rows = (
+        get_repository()
+        .connection()
+        .execute("SELECT tokens, path FROM render_cache ORDER BY last_used")
+        .fetchall()
+    )
+    assert [tokens for tokens, _ in rows] == ["c d", "e f"]
+    assert sorted(os.listdir("render_cache")) == sorted(
+        os.path.basename(path) for _, path in rows
+    )
+
+
+def test_invalidate_clip_drops_entries_without_creating_cache(workdir, monkeypatch):
+    monkeypatch.setattr(create_video, "render_clips", _fake_render([]))
+    clips = _clips("ab")
+
+    invalidate_clip("a", "a.mp4")
+    assert not os.path.exists("render_cache")
+
+    cache = RenderCache()
+    cache.render(clips, "eins.mp4")
+    assert len(os.listdir("render_cache")) == 1
+    invalidate_clip("a", "a.mp4")
+    assert os.listdir("render_cache") == []
+    count = get_repository().connection().execute("SELECT COUNT(*) FROM render_cache")
+    assert count.fetchone()[0] == 0
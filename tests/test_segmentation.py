@@ -0,0 +1,57 @@
+from conftest import SAMPLE_RATE, synthetic_pcm
+from segmentation import find_cut_points, segment_audio, stream_segments
+
+
+# 130 s Rauschen mit zwei Pausen in den Suchfenstern um 50 s und 100 s
+SILENCES = [(48.0, 49.0), (101.0, 102.0)]
+
+
+def _chunks(samples, seconds=1.0):
+    size = int(seconds * SAMPLE_RATE)
+    for start in range(0, len(samples), size):
+        yield samples[start : start + size]
+
+
+def test_cut_points_fall_into_silence():
+    samples = synthetic_pcm(130, SILENCES)
+    cuts = find_cut_points(samples, SAMPLE_RATE, target_length=50.0, search_window=5.0)
+
+    assert cuts[0] == 0.0
+    assert cuts[-1] == 130.0
+    assert len(cuts) == 4
+    for cut, (start, end) in zip(cuts[1:-1], SILENCES):
+        assert start <= cut <= end
+
+
+def test_short_audio_is_not_cut():
+    samples = synthetic_pcm(30)
+    assert find_cut_points(samples, SAMPLE_RATE, target_length=50.0) == [0.0, 30.0]
+
+
+def test_segments_overlap_their_neighbours():
+    samples = synthetic_pcm(130, SILENCES)
+    cuts = find_cut_points(samples, SAMPLE_RATE)
+    segments = list(segment_audio(None, overlap=0.5, samples=samples))
+
+    assert len(segments) == len(cuts) - 1
+    assert segments[0].start == 0.0 and segments[0].overlap_before == 0.0
+    assert segments[-1].end == 130.0 and segments[-1].overlap_after == 0.0
+    for segment, cut in zip(segments[1:], cuts[1:-1]):
+        assert segment.start == cut - 0.5
+        assert segment.overlap_before == 0.5
+
+
+def test_stream_segments_match_segment_audio():
+    samples = synthetic_pcm(130, SILENCES, seed=3)
+    batch = list(segment_audio(None, overlap=0.5, samples=samples))
+    streamed = list(stream_segments(_chunks(samples), overlap=0.5))
+
+    assert len(streamed) == len(batch)
+    for a, b in zip(streamed, batch):
+        assert a.index == b.index
+        assert abs(a.start - b.start) < 1e-9
+        assert abs(a.end - b.end) < 1e-9
+        assert abs(a.overlap_before - b.overlap_before) < 1e-9
+        assert abs(a.overlap_after - b.overlap_after) < 1e-9
+        assert a.content == b.content
+        assert len(a.samples) == int(round((a.end - a.start) * SAMPLE_RATE))
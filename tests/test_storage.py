@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import MIGRATIONS, VideoRepository, _statements, get_repository
+
+
+def _columns(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+
+
+def test_new_database_is_fully_migrated(workdir):
+    repository = get_repository()
+    conn = repository.connection()
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert "verified" in _columns("word_videos.db", "videos")
+
+
+def test_migration_resumes_from_stored_version(workdir):
+    conn = sqlite3.connect("word_videos.db")
+    for statement in _statements(MIGRATIONS[0]):
+        conn.execute(statement)
+    conn.execute("PRAGMA user_version = 1")
+    conn.execute("INSERT INTO videos (word, file_name) VALUES ('hallo', 'a.mp4')")
+    conn.commit()
+    conn.close()
+
+    repository = VideoRepository("word_videos.db")
+    conn = repository.connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert conn.execute("SELECT word, verified FROM videos").fetchall() == [
+        ("hallo", None)
+    ]
+    # Ein zweites Öffnen wendet nichts erneut an
+    VideoRepository("word_videos.db").close()
+    repository.close()
+
+
+def test_concurrent_migrations_apply_each_step_once(workdir):
+    errors = []
+    barrier = threading.Barrier(4)
+
+    def open_repository():
+        barrier.wait()
+        try:
+            VideoRepository("word_videos.db").close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_repository) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert _columns("word_videos.db", "videos").count("verified") == 1
+
+
+def test_trigger_statements_are_kept_whole():
+    script = """
+    CREATE TABLE a (x INTEGER);
+    CREATE TRIGGER t AFTER DELETE ON a BEGIN UPDATE a SET x = 1; END;
+    """
+    statements = [s.strip() for s in _statements(script) if s.strip(" \n;")]
+    assert len(statements) == 2
+    assert statements[1].endswith("END;")
+
+
+def test_path_is_absolute_across_chdir(workdir):
+    repository = get_repository("word_videos.db")
+    os.makedirs("unter")
+    os.chdir("unter")
+    assert get_repository(os.path.join("..", "word_videos.db")) is repository
+    assert repository.db_path == str(workdir / "word_videos.db")
+
+
+def test_thread_connections_are_closed_when_threads_end(workdir):
+    repository = VideoRepository("word_videos.db")
+    for _ in range(20):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(
+                executor.map(
+                    lambda _: repository.connection().execute("SELECT 1").fetchone(),
+                    range(8),
+                )
+            )
+
+    # Nur noch die Verbindung des Hauptthreads (aus migrate) ist offen
+    assert repository.open_connections() == 1
+    repository.close()
+    assert repository.open_connections() == 0
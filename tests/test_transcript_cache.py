@@ -0,0 +1,62 @@
+from conftest import SAMPLE_RATE, synthetic_pcm
+from recognizers import FakeRecognizer
+from segmentation import pcm_to_wav_bytes
+from storage import get_repository
+from transcript_cache import CachingRecognizer, pcm_hash
+
+
+def _audio(seed):
+    return pcm_to_wav_bytes(synthetic_pcm(2.0, seed=seed), SAMPLE_RATE)
+
+
+def _cached_keys():
+    rows = get_repository().connection().execute("SELECT cache_key FROM transcripts")
+    return {row[0] for row in rows}
+
+
+def test_repeated_audio_is_answered_from_the_cache(workdir):
+    recognizer = FakeRecognizer()
+    cache = CachingRecognizer(recognizer)
+
+    first = cache.recognize(_audio(0))
+    assert cache.recognize(_audio(0)) == first
+    assert recognizer.calls == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    # Ein neuer Lauf (neues Objekt) findet den Eintrag in der Datenbank
+    assert CachingRecognizer(FakeRecognizer()).recognize(_audio(0)) == first
+
+    # Andere Konfiguration, anderer Schlüssel
+    other = CachingRecognizer(FakeRecognizer(language_code="en-US"))
+    other.recognize(_audio(0))
+    assert other.stats()["misses"] == 1
+    assert pcm_hash(_audio(0), "a") != pcm_hash(_audio(0), "b")
+
+
+def test_disabled_cache_always_asks_the_recognizer(workdir):
+    recognizer = FakeRecognizer()
+    cache = CachingRecognizer(recognizer, enabled=False)
+    cache.recognize(_audio(0))
+    cache.recognize(_audio(0))
+    assert recognizer.calls == 2
+    assert _cached_keys() == set()
+
+
+def test_least_recently_used_entries_are_evicted(workdir, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("transcript_cache.time.time", lambda: next(clock))
+    recognizer = FakeRecognizer()
+    cache = CachingRecognizer(recognizer)
+    keys = [pcm_hash(_audio(seed), recognizer.config_key()) for seed in range(3)]
+
+    cache.recognize(_audio(0))
+    cache.recognize(_audio(1))
+    sizes = get_repository().connection().execute(
+        "SELECT MAX(size_bytes) FROM transcripts"
+    )
+    # Platz für genau zwei Einträge
+    cache.max_bytes = 2 * sizes.fetchone()[0]
+    cache.recognize(_audio(0))  # Treffer, Eintrag 0 ist jetzt der jüngste
+    cache.recognize(_audio(2))
+
+    assert _cached_keys() == {keys[0], keys[2]}
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from conftest import SAMPLE_RATE, synthetic_pcm
+from recognizers import FakeRecognizer, wav_duration
+from segmentation import pcm_to_wav_bytes
+from transcription import Segment, recognize_with_retry, transcribe_segments
+
+
+class DelayedRecognizer(FakeRecognizer):
+    """Antwortet umso später, je kürzer das Audio ist (spätere Segmente zuerst)."""
+
+    def __init__(self, delays, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = delays
+        self.active = 0
+        self.max_active = 0
+        self._active_lock = threading.Lock()
+
+    def recognize(self, content):
+        with self._active_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays[round(wav_duration(content))])
+            return super().recognize(content)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+
+class FailingRecognizer(FakeRecognizer):
+    def recognize(self, content):
+        with self._lock:
+            self.calls += 1
+        raise RuntimeError("Zeitüberschreitung")
+
+
+def _segments(lengths):
+    segments = []
+    start = 0.0
+    for index, length in enumerate(lengths):
+        content = pcm_to_wav_bytes(synthetic_pcm(length, seed=index), SAMPLE_RATE)
+        segments.append(Segment(index, start, start + length, content=content))
+        start += length
+    return segments
+
+
+def test_results_come_in_segment_order():
+    lengths = [4, 3, 2, 1]
+    recognizer = DelayedRecognizer({4: 0.2, 3: 0.15, 2: 0.1, 1: 0.0})
+    results = list(transcribe_segments(_segments(lengths), recognizer, max_in_flight=4))
+
+    assert [segment.index for segment, _, _ in results] == [0, 1, 2, 3]
+    assert all(error is None for _, _, error in results)
+    assert recognizer.max_active > 1
+
+
+def test_in_flight_requests_are_bounded():
+    recognizer = DelayedRecognizer({1: 0.02})
+    segments = _segments([1] * 10)
+    results = list(transcribe_segments(segments, recognizer, max_in_flight=2))
+
+    assert len(results) == 10
+    assert recognizer.max_active <= 2
+
+
+def test_word_times_are_absolute():
+    segments = _segments([2, 2])
+    expected = FakeRecognizer().recognize(segments[1].content)
+    (_, _, _), (_, words, _) = transcribe_segments(segments, FakeRecognizer())
+
+    assert [w.word for w in words] == [w.word for w in expected]
+    assert words[0].start_time == expected[0].start_time + 2.0
+
+
+def test_transient_failures_are_retried():
+    recognizer = FakeRecognizer(transient_failures=2)
+    words = recognize_with_retry(recognizer, _segments([2])[0].content, backoff=0.0)
+
+    assert recognizer.calls == 3
+    assert words
+
+
+def test_failed_segment_reports_its_error():
+    recognizer = FailingRecognizer()
+    results = list(
+        transcribe_segments(_segments([1, 1]), recognizer, retries=2, backoff=0.0)
+    )
+
+    assert [segment.index for segment, _, _ in results] == [0, 1]
+    for _, words, error in results:
+        assert words == []
+        assert isinstance(error, RuntimeError)
+    assert recognizer.calls == 6
@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import SAMPLE_RATE, synthetic_pcm
+from recognizers import FakeRecognizer, RecognizedWord, wav_duration
+from verification import pack_clips, verify_clips_batched
+
+
+def _clips(spans, words=None):
+    words = words or [f"wort{i}" for i in range(len(spans))]
+    return [
+        (word, f"{word}.mp4", f"clips/{word}.mp4", start, end)
+        for word, (start, end) in zip(words, spans)
+    ]
+
+
+class PackedRecognizer(FakeRecognizer):
+    """Liefert pro Anfrage die vorgegebenen Wörter an den vorgegebenen Zeitpunkten."""
+
+    def __init__(self, heard):
+        super().__init__()
+        self.heard = heard  # Liste pro Anfrage: Liste von (word, mitte)
+
+    def recognize(self, content):
+        with self._lock:
+            request = self.calls
+            self.calls += 1
+        return [
+            RecognizedWord(word, middle - 0.1, middle + 0.1, 0.9)
+            for word, middle in self.heard[request]
+        ]
+
+
+class FailingRecognizer(FakeRecognizer):
+    def recognize(self, content):
+        raise RuntimeError("Zeitüberschreitung")
+
+
+def test_offset_map_places_clips_between_silence():
+    samples = synthetic_pcm(10)
+    clips = _clips([(1.0, 1.5), (3.0, 4.0), (6.0, 6.25)])
+    (content, offset_map), = pack_clips(clips, samples, SAMPLE_RATE, padding=0.5)
+
+    assert [clip for clip, _, _ in offset_map] == clips
+    positions = [(start, end) for _, start, end in offset_map]
+    assert positions == [
+        pytest.approx((0.5, 1.0)),
+        pytest.approx((1.5, 2.5)),
+        pytest.approx((3.0, 3.25)),
+    ]
+    # Stille vor jedem Clip und nach dem letzten
+    assert wav_duration(content) == pytest.approx(3.25 + 0.5)
+
+
+def test_offset_is_subtracted_from_clip_times():
+    samples = synthetic_pcm(2)
+    clips = _clips([(100.5, 101.0)])
+    (content, offset_map), = pack_clips(clips, samples, SAMPLE_RATE, offset=100.0)
+
+    assert offset_map[0][1:] == pytest.approx((0.5, 1.0))
+    assert wav_duration(content) == pytest.approx(1.5)
+
+
+def test_requests_are_split_at_the_limit():
+    samples = synthetic_pcm(60)
+    clips = _clips([(i * 2.0, i * 2.0 + 1.0) for i in range(20)])
+    requests = pack_clips(clips, samples, SAMPLE_RATE, max_request_seconds=10.0)
+
+    packed = [clip for _, offset_map in requests for clip, _, _ in offset_map]
+    assert packed == clips
+    for content, offset_map in requests:
+        assert wav_duration(content) <= 10.0
+        assert offset_map[0][1] == pytest.approx(0.5)
+
+
+def test_batched_verification_assigns_words_to_clips():
+    samples = synthetic_pcm(10)
+    clips = _clips([(1.0, 1.5), (3.0, 4.0), (6.0, 6.5)], ["hallo", "welt", "video"])
+    # Mitten der gepackten Clips: 0.75, 2.0, 3.25; der dritte hört ein anderes Wort
+    recognizer = PackedRecognizer([[("hallo", 0.75), ("welt", 2.0), ("und", 3.25)]])
+    results = verify_clips_batched(clips, samples, SAMPLE_RATE, recognizer)
+
+    assert results == [(clips[0], True), (clips[1], True), (clips[2], False)]
+
+
+def test_failed_request_leaves_clips_unknown(monkeypatch):
+    # Wiederholungen ohne Wartezeit
+    monkeypatch.setattr("transcription.time.sleep", lambda seconds: None)
+    samples = synthetic_pcm(10)
+    clips = _clips([(1.0, 1.5), (3.0, 4.0)])
+    results = verify_clips_batched(
+        clips, samples, SAMPLE_RATE, FailingRecognizer(), max_in_flight=1
+    )
+
+    assert results == [(clips[0], None), (clips[1], None)]
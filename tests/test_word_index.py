@@ -0,0 +1,53 @@
+import json
+
+from storage import get_repository
+from word_index import VocabularyIndex
+
+
+def _insert(word, file_name):
+    get_repository().insert_videos([(word, file_name, 500, 0.0, 0.5, 0.0, 0.5, 1)])
+
+
+def test_lookup_orders_by_rating_and_skips_bad_clips(workdir):
+    for name in ("a.mp4", "b.mp4", "c.mp4", "d.mp4"):
+        _insert("hallo", name)
+    repository = get_repository()
+    repository.save_ratings([("hallo", "b.mp4", 1), ("hallo", "c.mp4", 0)])
+    repository.set_verified([("hallo", "d.mp4", 0)])
+
+    index = VocabularyIndex.load()
+    assert index.lookup("hallo") == ["b.mp4", "a.mp4"]
+    assert index.lookup("fehlt") == []
+    assert index.words() == ["hallo"]
+
+
+def test_snapshot_is_extended_and_rebuilt_after_changes(workdir):
+    _insert("hallo", "a.mp4")
+    VocabularyIndex.load()
+    with open("word_index.json", encoding="utf-8") as snapshot_file:
+        assert json.load(snapshot_file)["last_id"] == 1
+
+    # Neue Zeilen werden ergänzt
+    _insert("welt", "w.mp4")
+    index = VocabularyIndex.load()
+    assert index.words() == ["hallo", "welt"]
+
+    # Geänderte und gelöschte Zeilen erzwingen den Neuaufbau
+    get_repository().set_verified([("hallo", "a.mp4", 0)])
+    index.refresh()
+    assert index.words() == ["welt"]
+    get_repository().delete_video("welt", "w.mp4")
+    assert VocabularyIndex.load().words() == []
+
+
+def test_complete_and_suggest(workdir):
+    for word in ("hallo", "halle", "hals", "welt"):
+        _insert(word, f"{word}.mp4")
+    index = VocabularyIndex.load(snapshot_path=None)
+
+    assert index.complete("hal") == ["halle", "hallo", "hals"]
+    assert index.complete("hal", limit=1) == ["halle"]
+    assert index.complete("x") == []
+    assert index.suggest("hallp") == ["halle", "hallo", "hals"]
+    assert index.suggest("hallp", max_distance=1) == ["halle", "hallo"]
+    assert index.suggest("welf") == ["welt"]
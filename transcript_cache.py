@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import threading
+import time
+import wave
+
+from recognizers import RecognizedWord, Recognizer
+from storage import get_repository
+
+
+def pcm_hash(content, config_key):
+    """
+    Bildet den Cache-Schlüssel aus den PCM-Samples und der Erkenner-Konfiguration.
+    Bei WAV-Daten fließen nur Samples und Format ein, nicht der restliche Header.
+    """
+    digest = hashlib.sha256()
+    try:
+        with wave.open(io.BytesIO(content), "rb") as wav_file:
+            audio_format = (
+                wav_file.getnchannels(),
+                wav_file.getsampwidth(),
+                wav_file.getframerate(),
+            )
+            digest.update(repr(audio_format).encode())
+            digest.update(wav_file.readframes(wav_file.getnframes()))
+    except (wave.Error, EOFError):
+        digest.update(content)
+    digest.update(config_key.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CachingRecognizer(Recognizer):
+    """
+    Legt vor einen Erkenner einen persistenten Transkript-Cache in der
+    SQLite-Datenbank (Tabelle transcripts neben videos). Gleiches Audio mit
+    gleicher Konfiguration wird so nie ein zweites Mal an den Erkenner geschickt.
+    Überschreitet der Cache max_bytes, werden die am längsten nicht benutzten
+    Einträge entfernt.
+    :param enabled: False umgeht den Cache vollständig.
+    """
+
+    def __init__(
+        self, recognizer, db_path="word_videos.db", max_bytes=256 * 1024 * 1024, enabled=True
+    ):
+        self.recognizer = recognizer
+        self.language_code = recognizer.language_code
+        self.price_per_minute = recognizer.price_per_minute
+        self.max_segment_seconds = recognizer.max_segment_seconds
+        self.max_in_flight = recognizer.max_in_flight
+        self.billing_increment = recognizer.billing_increment
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Legt die Tabelle transcripts bei Bedarf an
+        self.repository = get_repository(db_path)
+
+    def config_key(self):
+        return self.recognizer.config_key()
+
+    def stats(self):
+        """Gibt Treffer, Fehlschläge und Trefferquote des Caches zurück."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def recognize(self, content):
+        if not self.enabled:
+            return self.recognizer.recognize(content)
+
+        cache_key = pcm_hash(content, self.config_key())
+        conn = self.repository.connection()
+        row = conn.execute(
+            "SELECT words FROM transcripts WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row is not None:
+            with conn:
+                conn.execute(
+                    "UPDATE transcripts SET last_used = ? WHERE cache_key = ?",
+                    (time.time(), cache_key),
+                )
+            with self._lock:
+                self.hits += 1
+            return [RecognizedWord(*w) for w in json.loads(row[0])]
+
+        with self._lock:
+            self.misses += 1
+        words = self.recognizer.recognize(content)
+
+        payload = json.dumps([list(w) for w in words])
+        with self.repository.transaction() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO transcripts (cache_key, words, size_bytes, last_used)
+                VALUES (?, ?, ?, ?)
+            """,
+                (cache_key, payload, len(payload), time.time()),
+            )
+            self._evict(conn)
+        return words
+
+    def _evict(self, conn):
+        """Entfernt die ältesten Einträge, bis der Cache unter max_bytes liegt."""
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM transcripts"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        evicted = []
+        for cache_key, size_bytes in conn.execute(
+            "SELECT cache_key, size_bytes FROM transcripts ORDER BY last_used"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            evicted.append((cache_key,))
+            freed += size_bytes
+        conn.executemany("DELETE FROM transcripts WHERE cache_key = ?", evicted)
@@ -0,0 +1,142 @@
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from recognizers import RecognizedWord
+
+
+# Ein Audiosegment mit absoluter Startzeit in der Quelle (Sekunden).
+# Entweder path (WAV-Datei) oder content (WAV-Bytes im Speicher) ist gesetzt.
+# overlap_before/overlap_after geben an, wie weit das Segment in seine Nachbarn
+# hineinreicht; nur der Bereich dazwischen "gehört" dem Segment.
+# samples enthält optional die dekodierten PCM-Samples des Segments.
+Segment = namedtuple(
+    "Segment",
+    [
+        "index",
+        "start",
+        "end",
+        "path",
+        "content",
+        "overlap_before",
+        "overlap_after",
+        "samples",
+    ],
+    defaults=(None, None, 0.0, 0.0, None),
+)
+
+
+def segment_content(segment):
+    """Liefert die Audiodaten eines Segments als Bytes."""
+    if segment.content is not None:
+        return segment.content
+    with open(segment.path, "rb") as audio_file:
+        return audio_file.read()
+
+
+def recognize_with_retry(recognizer, content, retries=3, backoff=1.0):
+    """
+    Ruft den Erkenner auf und wiederholt den Aufruf bei Fehlern mit
+    exponentiell wachsender Wartezeit (backoff, 2*backoff, 4*backoff, ...).
+    """
+    for attempt in range(retries + 1):
+        try:
+            return recognizer.recognize(content)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2**attempt)
+            print(
+                f"Erkennung fehlgeschlagen ({e}), neuer Versuch in {delay:.1f} Sekunden."
+            )
+            time.sleep(delay)
+
+
+def deduplicate_overlap_words(segment, words):
+    """
+    Entfernt Wörter, die im Überlappungsbereich liegen und deshalb auch vom
+    Nachbarsegment erkannt werden. Ein Wort gehört dem Segment, in dessen
+    eigenem Bereich seine Mitte liegt. Erwartet absolute Zeitstempel.
+    """
+    if not segment.overlap_before and not segment.overlap_after:
+        return words
+    owned_start = segment.start + segment.overlap_before
+    owned_end = segment.end - segment.overlap_after
+    return [
+        w for w in words if owned_start <= (w.start_time + w.end_time) / 2 < owned_end
+    ]
+
+
+def _recognize_segment(recognizer, segment, retries, backoff):
+    words = recognize_with_retry(
+        recognizer, segment_content(segment), retries=retries, backoff=backoff
+    )
+    # Zeitstempel vom Segment auf die Quelle umrechnen
+    words = [
+        RecognizedWord(
+            w.word, w.start_time + segment.start, w.end_time + segment.start, w.confidence
+        )
+        for w in words
+    ]
+    return deduplicate_overlap_words(segment, words)
+
+
+def segment_length(recognizer, limited=50.0, unlimited=120.0):
+    """
+    Ziellänge der Segmente in Sekunden: knapp unter dem Anfragelimit des
+    Erkenners, bei Erkennern ohne Limit länger (weniger Schnitte).
+    """
+    return limited if recognizer.max_segment_seconds else unlimited
+
+
+def transcribe_segments(segments, recognizer, max_in_flight=4, retries=3, backoff=1.0):
+    """
+    Transkribiert Segmente nebenläufig mit höchstens max_in_flight gleichzeitigen
+    Anfragen und liefert die Ergebnisse in Segmentreihenfolge, sobald das jeweils
+    nächste Segment fertig ist (Generator von (segment, words, error)).
+    Die Zeitstempel der Wörter sind absolut bezogen auf die Quelle.
+    error ist None, wenn die Erkennung gelungen ist. Scheitert ein Segment auch
+    nach allen Wiederholungen, ist words leer und error die letzte Ausnahme;
+    so lässt sich "keine Sprache" von "Anfrage fehlgeschlagen" unterscheiden.
+    """
+    segments = iter(segments)
+    window = 2 * max_in_flight  # Begrenzt die Anzahl gepufferter Ergebnisse
+    submitted = 0
+    next_to_yield = 0
+    in_flight = {}
+    finished = {}
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        exhausted = False
+        while True:
+            while (
+                not exhausted
+                and len(in_flight) < max_in_flight
+                and submitted < next_to_yield + window
+            ):
+                segment = next(segments, None)
+                if segment is None:
+                    exhausted = True
+                    break
+                future = executor.submit(
+                    _recognize_segment, recognizer, segment, retries, backoff
+                )
+                in_flight[future] = (submitted, segment)
+                submitted += 1
+
+            if not in_flight and not finished:
+                return
+
+            if in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position, segment = in_flight.pop(future)
+                    try:
+                        finished[position] = (segment, future.result(), None)
+                    except Exception as e:
+                        print(f"Fehler bei der Erkennung von Segment {segment.index}: {e}")
+                        finished[position] = (segment, [], e)
+
+            while next_to_yield in finished:
+                yield finished.pop(next_to_yield)
+                next_to_yield += 1
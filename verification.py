@@ -0,0 +1,148 @@
+import numpy as np
+
+from instrumentation import timed
+from segmentation import pcm_to_wav_bytes, rms_envelope
+from transcription import Segment, transcribe_segments
+
+
+def pack_clips(
+    clips, samples, sample_rate, max_request_seconds=55.0, padding=0.5, offset=0.0
+):
+    """
+    Packt die Tonspur vieler kurzer Clips, jeweils durch Stille getrennt, in
+    möglichst wenige Anfragen von höchstens max_request_seconds Länge.
+    :param clips: Liste von (word, file_name, path, start_time, end_time).
+    :param offset: Zeitpunkt in der Quelle (Sekunden), an dem samples beginnt.
+    :return: Liste von (wav_bytes, offset_map) mit offset_map als Liste von
+        (clip, packed_start, packed_end) in Sekunden innerhalb der Anfrage.
+    """
+    silence = np.zeros(int(padding * sample_rate), dtype=np.int16)
+    requests = []
+    parts = []
+    offset_map = []
+    position = 0.0
+
+    def flush():
+        if offset_map:
+            parts.append(silence)
+            content = pcm_to_wav_bytes(np.concatenate(parts), sample_rate)
+            requests.append((content, list(offset_map)))
+        parts.clear()
+        offset_map.clear()
+
+    for clip in clips:
+        start_time, end_time = clip[3] - offset, clip[4] - offset
+        clip_samples = samples[
+            int(start_time * sample_rate) : int(end_time * sample_rate)
+        ]
+        clip_length = len(clip_samples) / float(sample_rate)
+        request_length = position + padding + clip_length + padding
+        if offset_map and request_length > max_request_seconds:
+            flush()
+            position = 0.0
+        parts.append(silence)
+        parts.append(clip_samples)
+        offset_map.append((clip, position + padding, position + padding + clip_length))
+        position += padding + clip_length
+    flush()
+    return requests
+
+
+@timed("verify", items=len)
+def verify_clips_batched(
+    clips,
+    samples,
+    sample_rate,
+    recognizer,
+    max_request_seconds=55.0,
+    padding=0.5,
+    max_in_flight=4,
+    offset=0.0,
+):
+    """
+    Überprüft viele Clips mit wenigen Erkennungsanfragen: Die Clips werden
+    mit Stille dazwischen zusammengepackt, die erkannten Wörter werden über
+    die Offset-Tabelle ihren Clips zugeordnet. Ein Clip gilt als bestätigt,
+    wenn ihm sein eigenes Wort zugeordnet wurde.
+    :param samples: Dekodierte Mono-PCM-Samples der Quelle oder eines
+        Ausschnitts, der bei offset Sekunden beginnt.
+    :return: Liste von (clip, bestätigt) mit bestätigt None für die Clips
+        einer Anfrage, die auch nach allen Wiederholungen fehlgeschlagen ist;
+        über diese Clips ist nichts bekannt, sie dürfen nicht entfernt werden.
+    """
+    requests = pack_clips(
+        clips, samples, sample_rate, max_request_seconds, padding, offset
+    )
+    segments = [
+        Segment(i, 0.0, None, content=content) for i, (content, _) in enumerate(requests)
+    ]
+
+    results = []
+    for segment, words, error in transcribe_segments(
+        segments, recognizer, max_in_flight=max_in_flight
+    ):
+        offset_map = requests[segment.index][1]
+        if error is not None:
+            results.extend((clip, None) for clip, _, _ in offset_map)
+            continue
+        heard = {id(clip): set() for clip, _, _ in offset_map}
+        for w in words:
+            middle = (w.start_time + w.end_time) / 2
+            for clip, packed_start, packed_end in offset_map:
+                # Die halbe Stille zählt noch zum Clip, da Zeitstempel unscharf sind
+                if packed_start - padding / 2 <= middle < packed_end + padding / 2:
+                    heard[id(clip)].add(w.word.lower())
+                    break
+        for clip, _, _ in offset_map:
+            results.append((clip, clip[0].lower() in heard[id(clip)]))
+    return results
+
+
+@timed("verify", items=len)
+def verify_clips_locally(
+    clips,
+    words,
+    samples,
+    sample_rate,
+    tolerance=0.15,
+    edge_ratio=0.5,
+    min_level=2.0,
+    window=0.01,
+    offset=0.0,
+):
+    """
+    Überprüft Clips ohne Erkenner anhand der Wortzeiten des Segments und der
+    Energie des Tons:
+    - ein anderes erkanntes Wort darf nicht mehr als tolerance Sekunden im Clip liegen,
+    - der Clip muss hörbar lauter als der Grundpegel der Quelle sein (min_level),
+    - an den Rändern darf die Energie höchstens edge_ratio des Clip-Maximums
+      betragen, sonst ist das Wort vermutlich angeschnitten.
+    :param words: Alle erkannten RecognizedWord des Segments (absolute Zeiten).
+    :param offset: Zeitpunkt in der Quelle (Sekunden), an dem samples beginnt.
+    :return: Liste von (clip, bestätigt).
+    """
+    envelope = rms_envelope(samples, sample_rate, window)
+    noise_floor = float(np.percentile(envelope, 10)) if len(envelope) else 0.0
+
+    results = []
+    for clip in clips:
+        word, start_time, end_time = clip[0], clip[3], clip[4]
+        ok = True
+
+        for w in words:
+            overlap = min(end_time, w.end_time) - max(start_time, w.start_time)
+            if w.word.lower() != word.lower() and overlap > tolerance:
+                ok = False
+                break
+
+        clip_envelope = envelope[
+            int((start_time - offset) / window) : int((end_time - offset) / window) + 1
+        ]
+        if ok and len(clip_envelope):
+            peak = float(clip_envelope.max())
+            if peak < min_level * max(noise_floor, 1.0):
+                ok = False
+            elif max(clip_envelope[0], clip_envelope[-1]) > edge_ratio * peak:
+                ok = False
+        results.append((clip, ok))
+    return results
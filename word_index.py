@@ -0,0 +1,160 @@
+import json
+import os
+
+from storage import get_repository
+
+
+_END = None  # Markiert im Trie das Ende eines Wortes
+_USABLE = "COALESCE(verified, 1) != 0"  # Ungeprüfte und bestätigte Clips
+
+
+class VocabularyIndex:
+    """
+    Verzeichnis aller Wörter mit ihren Clips, aufgebaut aus der Tabelle videos
+    (ohne als fehlerhaft geprüfte Clips).
+    Hält ein Dict Wort -> Clips für Abfragen in O(1) und einen Präfix-Trie für
+    Vorschläge. Der Stand wird als JSON-Schnappschuss gespeichert und beim
+    nächsten Start nur um neue Zeilen ergänzt; wurden Clips seitdem geändert
+    oder gelöscht (Zähler in videos_version), wird er neu aufgebaut.
+    """
+
+    def __init__(self, db_path="word_videos.db", snapshot_path="word_index.json"):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.clips = {}  # word -> Liste von (id, file_name, rated)
+        self.last_id = 0
+        self.changes = None  # Stand von videos_version.changes
+        self.trie = {}
+
+    @classmethod
+    def load(cls, db_path="word_videos.db", snapshot_path="word_index.json"):
+        """Lädt den Schnappschuss (falls vorhanden) und gleicht ihn mit der Datenbank ab."""
+        index = cls(db_path, snapshot_path)
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            index.last_id = snapshot["last_id"]
+            index.changes = snapshot.get("changes")
+            for word, clips in snapshot["clips"].items():
+                index.clips[word] = [tuple(clip) for clip in clips]
+                index._trie_insert(word)
+        index.refresh()
+        return index
+
+    def refresh(self):
+        """
+        Übernimmt neue Zeilen aus der Datenbank. Wurden Zeilen geändert
+        (Bewertung, Prüfung, Dateiname) oder gelöscht, wird das Verzeichnis
+        vollständig neu aufgebaut.
+        """
+        conn = get_repository(self.db_path).connection()
+        changes = conn.execute("SELECT changes FROM videos_version").fetchone()[0]
+        rebuilt = changes != self.changes
+        if rebuilt:
+            self.clips = {}
+            self.trie = {}
+            self.last_id = 0
+            self.changes = changes
+
+        rows = conn.execute(
+            f"SELECT id, word, file_name, rated FROM videos WHERE id > ? AND {_USABLE} "
+            "ORDER BY id",
+            (self.last_id,),
+        ).fetchall()
+        self.add_clips(rows)
+        if rows or rebuilt:
+            self.save()
+
+    def add_clips(self, rows):
+        """
+        Ergänzt das Verzeichnis inkrementell um neue Clips.
+        :param rows: Liste von (id, word, file_name, rated).
+        """
+        for clip_id, word, file_name, rated in rows:
+            if word not in self.clips:
+                self.clips[word] = []
+                self._trie_insert(word)
+            self.clips[word].append((clip_id, file_name, rated))
+            self.last_id = max(self.last_id, clip_id)
+
+    def save(self):
+        """Schreibt den Schnappschuss atomar auf die Festplatte."""
+        if not self.snapshot_path:
+            return
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump(
+                {"last_id": self.last_id, "changes": self.changes, "clips": self.clips},
+                snapshot_file,
+            )
+        os.replace(tmp_path, self.snapshot_path)
+
+    def words(self):
+        """Alle Wörter mit mindestens einem brauchbaren Clip, sortiert."""
+        return sorted(word for word in self.clips if self.lookup(word))
+
+    def lookup_clips(self, word):
+        """
+        Gibt die Clips eines Wortes als (id, file_name) zurück: gut bewertete
+        zuerst, dann unbewertete; schlecht bewertete (0) werden ausgelassen.
+        """
+        clips = [clip for clip in self.clips.get(word, ()) if clip[2] != 0]
+        clips.sort(key=lambda clip: (clip[2] != 1, clip[1]))
+        return [(clip_id, file_name) for clip_id, file_name, _ in clips]
+
+    def lookup(self, word):
+        """Gibt die Dateinamen der Clips eines Wortes in Auswahlreihenfolge zurück."""
+        return [file_name for _, file_name in self.lookup_clips(word)]
+
+    def _trie_insert(self, word):
+        node = self.trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_END] = True
+
+    def complete(self, prefix, limit=10):
+        """Wörter, die mit prefix beginnen (höchstens limit)."""
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        results = []
+        stack = [(node, prefix)]
+        while stack and len(results) < limit:
+            node, word = stack.pop()
+            if _END in node:
+                results.append(word)
+            for char in sorted((c for c in node if c is not _END), reverse=True):
+                stack.append((node[char], word + char))
+        return results
+
+    def suggest(self, word, max_distance=2, limit=5):
+        """
+        Ähnliche Wörter für ein unbekanntes Wort (Levenshtein-Distanz über den
+        Trie, Teilbäume werden verworfen, sobald die Distanz zu groß ist).
+        """
+        results = []
+        first_row = list(range(len(word) + 1))
+
+        def search(node, prefix, previous_row):
+            for char, child in node.items():
+                if char is _END:
+                    continue
+                row = [previous_row[0] + 1]
+                for i in range(1, len(word) + 1):
+                    row.append(
+                        min(
+                            row[i - 1] + 1,
+                            previous_row[i] + 1,
+                            previous_row[i - 1] + (word[i - 1] != char),
+                        )
+                    )
+                if _END in child and row[-1] <= max_distance:
+                    results.append((row[-1], prefix + char))
+                if min(row) <= max_distance:
+                    search(child, prefix + char, row)
+
+        search(self.trie, "", first_row)
+        results.sort()
+        return [candidate for _, candidate in results[:limit]]
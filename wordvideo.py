@@ -0,0 +1,280 @@
+"""
+Kommandozeile für alle Schritte der Wortvideo-Pipeline:
+
+    python wordvideo.py ingest urls.txt --backend whisper
+    python wordvideo.py transcribe downloads/video.mp4
+    python wordvideo.py cut downloads/video.mp4
+    python wordvideo.py verify downloads/video.mp4 --mode batched
+    python wordvideo.py rate
+    python wordvideo.py render "ein kurzer Satz"
+    python wordvideo.py index --complete hal
+    python wordvideo.py migrate-clips
+
+Dieses Modul lädt beim Import nur die Standardbibliothek. Jeder
+Unterbefehl importiert seine Abhängigkeiten erst beim Ausführen, so dass
+z.B. ingest ohne tkinter, cv2 oder pytube startet und die Prozesse im Pool
+(die dieses Modul beim Start erneut importieren) sofort bereit sind.
+"""
+import argparse
+import os
+
+from cli_arguments import (
+    add_backend_arguments,
+    add_ingest_arguments,
+    backend_options_from_args,
+)
+
+
+SAMPLE_RATE = 16000
+
+
+def _recognizer(args):
+    from instrumentation import InstrumentedRecognizer
+    from recognizers import create_recognizer
+    from transcript_cache import CachingRecognizer
+
+    return CachingRecognizer(
+        InstrumentedRecognizer(
+            create_recognizer(args.backend, **backend_options_from_args(args))
+        ),
+        enabled=not args.no_cache,
+    )
+
+
+def _segment_range(words, padding=1.0):
+    """Zeitbereich eines Segments mit etwas Ton davor und danach."""
+    start = max(0.0, min(w.start_time for w in words) - padding)
+    return start, max(w.end_time for w in words) + padding
+
+
+def ingest_command(args):
+    from ingest import run_from_args
+
+    results = run_from_args(args)
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+def transcribe_command(args):
+    import cut_youtube_to_word_video as pipeline
+    from occurrence_store import record_occurrences
+    from segmentation import stream_audio_pcm, stream_segments
+    from transcription import segment_length, transcribe_segments
+
+    pipeline.initialize_db()
+    recognizer = _recognizer(args)
+    segments = stream_segments(
+        stream_audio_pcm(args.video, SAMPLE_RATE),
+        target_length=segment_length(recognizer),
+        overlap=0.5,
+        sample_rate=SAMPLE_RATE,
+    )
+    count = failed = 0
+    for segment, words, error in transcribe_segments(
+        segments, recognizer, max_in_flight=recognizer.max_in_flight
+    ):
+        if error is not None:
+            failed += 1
+            continue
+        record_occurrences(args.video, segment.index, words)
+        count += len(words)
+        print(f"Segment {segment.index + 1}: {len(words)} Wörter")
+    print(f"{count} Wörter in {args.video} erkannt und gespeichert.")
+    if failed:
+        print(f"{failed} Segmente konnten nicht erkannt werden.")
+    pipeline.write_metrics()
+    return 1 if failed else 0
+
+
+def cut_command(args):
+    import cut_youtube_to_word_video as pipeline
+    from boundaries import BoundaryRefiner
+    from jobs import hash_file
+    from occurrence_store import link_clips, load_occurrences, plan_cuts
+    from segmentation import decode_audio_pcm
+
+    pipeline.initialize_db()
+    segments = load_occurrences(args.video)
+    if not segments:
+        print(f"Keine erkannten Wörter für {args.video}; zuerst 'transcribe' ausführen.")
+        return 1
+    source_hash = hash_file(args.video)
+    total = 0
+    for segment_id, words in segments:
+        words_with_timestamps = plan_cuts(args.video, segment_id)
+        if not args.no_refine:
+            start, end = _segment_range(words)
+            samples = decode_audio_pcm(args.video, SAMPLE_RATE, start=start, end=end)
+            words_with_timestamps = BoundaryRefiner(
+                samples, SAMPLE_RATE, offset=start
+            ).refine(words_with_timestamps)
+        clips = pipeline.cut_video_by_words(
+            args.video,
+            words_with_timestamps,
+            smart_cut=args.smart_cut,
+            source_hash=source_hash,
+        )
+        link_clips(args.video, clips)
+        total += len(clips)
+    print(f"{total} Clips aus {args.video} geschnitten.")
+    pipeline.write_metrics()
+
+
+def verify_command(args):
+    import cut_youtube_to_word_video as pipeline
+    from clip_store import mark_verified
+    from occurrence_store import linked_clips, load_occurrences
+    from segmentation import decode_audio_pcm
+    from verification import verify_clips_batched, verify_clips_locally
+
+    pipeline.initialize_db()
+    words_by_segment = dict(load_occurrences(args.video))
+    recognizer = _recognizer(args) if args.mode == "batched" else None
+    confirmed = removed = unknown = 0
+    # Nur ungeprüfte Clips; ein abgebrochener Lauf setzt damit dort wieder ein
+    for segment_id, clips in linked_clips(args.video, unverified_only=True):
+        words = words_by_segment.get(segment_id, [])
+        start, end = _segment_range(words) if words else (0.0, None)
+        samples = decode_audio_pcm(args.video, SAMPLE_RATE, start=start, end=end)
+        if recognizer is None:
+            results = verify_clips_locally(
+                clips, words, samples, SAMPLE_RATE, offset=start
+            )
+        else:
+            results = verify_clips_batched(
+                clips, samples, SAMPLE_RATE, recognizer, offset=start
+            )
+        mark_verified(results)
+        for (word, file_name, _, _, _), verified in results:
+            if verified is None:
+                unknown += 1
+            elif verified:
+                confirmed += 1
+            else:
+                print(f"Video für das Wort '{word}' enthält das Wort nicht. Wird entfernt.")
+                pipeline.discard_faulty_clip(word, file_name)
+                removed += 1
+    print(f"{confirmed} Clips bestätigt, {removed} entfernt.")
+    if unknown:
+        print(f"{unknown} Clips konnten wegen Erkennungsfehlern nicht geprüft werden.")
+    pipeline.write_metrics()
+    return 1 if unknown else 0
+
+
+def rate_command(args):
+    from rating_station import rate_unrated_videos
+
+    rate_unrated_videos()
+
+
+def render_command(args):
+    from create_video import create_video_from_sentence, list_available_words
+    from normalization import NormalizedClipCache
+    from render_cache import RenderCache
+    from word_index import VocabularyIndex
+
+    index = VocabularyIndex.load()
+    sentence = " ".join(args.sentence)
+    if not sentence:
+        list_available_words(index)
+        sentence = input("Geben Sie einen Satz ein: ")
+    output_path = create_video_from_sentence(
+        sentence,
+        index,
+        None if args.no_normalize else NormalizedClipCache(),
+        output_path=args.output,
+        render_cache=None if args.no_cache else RenderCache(),
+    )
+    return 0 if output_path else 1
+
+
+def index_command(args):
+    from create_video import list_available_words
+    from word_index import VocabularyIndex
+
+    if args.rebuild and os.path.exists("word_index.json"):
+        os.remove("word_index.json")
+    index = VocabularyIndex.load()
+    if args.complete is not None:
+        print("\n".join(index.complete(args.complete, limit=args.limit)))
+    elif args.suggest is not None:
+        print("\n".join(index.suggest(args.suggest, limit=args.limit)))
+    else:
+        list_available_words(index)
+        print(f"{len(index.words())} Wörter im Verzeichnis.")
+
+
+def migrate_clips_command(args):
+    from clip_store import migrate_legacy_clips
+
+    counts = migrate_legacy_clips(args.legacy_root)
+    print(
+        f"{counts['moved']} Clips übernommen, {counts['unknown']} ohne Datenbankeintrag, "
+        f"{counts['skipped']} bereits vorhanden."
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="wordvideo", description="Wortvideos aus Videos schneiden und verwenden"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Viele Videos in einem Lauf verarbeiten")
+    add_ingest_arguments(ingest)
+    ingest.set_defaults(handler=ingest_command)
+
+    transcribe = commands.add_parser(
+        "transcribe", help="Wörter eines lokalen Videos erkennen und speichern"
+    )
+    transcribe.add_argument("video")
+    add_backend_arguments(transcribe)
+    transcribe.set_defaults(handler=transcribe_command)
+
+    cut = commands.add_parser("cut", help="Gespeicherte Wörter eines Videos schneiden")
+    cut.add_argument("video")
+    cut.add_argument(
+        "--no-refine", action="store_true", help="Wortgrenzen nicht auf Pausen verschieben"
+    )
+    cut.add_argument(
+        "--smart-cut", action="store_true", help="Lange Wörter ohne Neukodierung kopieren"
+    )
+    cut.set_defaults(handler=cut_command)
+
+    verify = commands.add_parser("verify", help="Geschnittene Clips eines Videos prüfen")
+    verify.add_argument("video")
+    verify.add_argument("--mode", choices=["local", "batched"], default="local")
+    add_backend_arguments(verify)
+    verify.set_defaults(handler=verify_command)
+
+    rate = commands.add_parser("rate", help="Unbewertete Clips in einem Fenster bewerten")
+    rate.set_defaults(handler=rate_command)
+
+    render = commands.add_parser("render", help="Video aus einem Satz erstellen")
+    render.add_argument("sentence", nargs="*", help="Ohne Satz wird nachgefragt")
+    render.add_argument("-o", "--output", default=None)
+    render.add_argument("--no-normalize", action="store_true")
+    render.add_argument("--no-cache", action="store_true")
+    render.set_defaults(handler=render_command)
+
+    index = commands.add_parser("index", help="Wortverzeichnis anzeigen und abfragen")
+    index.add_argument("--rebuild", action="store_true", help="Schnappschuss verwerfen")
+    index.add_argument("--complete", metavar="PRÄFIX", default=None)
+    index.add_argument("--suggest", metavar="WORT", default=None)
+    index.add_argument("--limit", type=int, default=10)
+    index.set_defaults(handler=index_command)
+
+    migrate = commands.add_parser(
+        "migrate-clips", help="Clips aus Wörter/<wort>/ in die neue Ablage übernehmen"
+    )
+    migrate.add_argument("--legacy-root", default="Wörter")
+    migrate.set_defaults(handler=migrate_clips_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())